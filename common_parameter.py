@@ -6,3 +6,70 @@ PDF_PATH = os.getenv("PDF_PATH", "source_doc/Datacenter NVMe SSD Specification v
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output_ocp")
 
 TABLE_DPI = 120  # Table Image DPI
+
+# Step3 이미지 저장 포맷 (section_images)
+#   "png"     : 기존 방식 (RGB PNG)
+#   "auto"    : 무손실 축소 (grayscale -> L, 256색 이하 -> palette, 그 외 optimize PNG)
+#   "palette" : 16색 palette PNG (line-art 테이블용, 약한 손실)
+#   "bilevel" : 1-bit PNG (흑백 line-art 전용, 손실)
+#   "webp"    : lossless WebP
+IMAGE_STORAGE_FORMAT = os.getenv("IMAGE_STORAGE_FORMAT", "auto")
+
+# Step3 이미지를 내용 해시 이름 ({sha256}{ext}) 으로 저장 (같은 crop 은 한 파일, 원래 이름은 image_name 필드)
+IMAGE_CONTENT_ADDRESSED = os.getenv("IMAGE_CONTENT_ADDRESSED", "1") == "1"
+
+# Step4 LLM 동시 요청 수 (테이블 그룹 단위, Ollama OLLAMA_NUM_PARALLEL 에 맞출 것)
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+
+# Step4 table_md 영구 캐시 (이미지 내용 해시 기반, 문서 간 공유)
+TABLE_MD_CACHE_PATH = os.getenv("TABLE_MD_CACHE_PATH", "table_md_cache.db")
+
+# Step4 fitz fast path (단순 격자 테이블은 find_tables() 결과 사용, 복잡한 테이블만 LLM)
+TABLE_FAST_PATH = os.getenv("TABLE_FAST_PATH", "1") == "1"
+
+# Step4 text-layer guided 모드 (PDF 단어/좌표를 이미지와 함께 제공, 모델은 구조만 결정)
+TABLE_TEXT_GUIDED = os.getenv("TABLE_TEXT_GUIDED", "0") == "1"
+
+# Step4 small-model-first cascade (쉼표 구분, 작은 모델 -> 큰 모델 순)
+# 예: "qwen3-vl:8b,qwen3-vl:30b-a3b-instruct-q4_K_M" / 비어 있으면 기본 모델만 사용
+TABLE_CASCADE_MODELS = [m.strip() for m in os.getenv("TABLE_CASCADE_MODELS", "").split(",") if m.strip()]
+
+# Step4 micro-batching: 작은 테이블 (단일 이미지, 높이 이하) 여러 개를 한 요청으로 파싱
+# TABLE_MICRO_BATCH = 요청당 테이블 수 (0 또는 1 이면 사용 안 함)
+TABLE_MICRO_BATCH = int(os.getenv("TABLE_MICRO_BATCH", "0"))
+TABLE_MICRO_BATCH_MAX_HEIGHT = int(os.getenv("TABLE_MICRO_BATCH_MAX_HEIGHT", "300"))  # px
+
+# LLM backend (step4 테이블 / step7 요약)
+#   "ollama" : Ollama /api/generate (기본)
+#   "openai" : OpenAI 호환 /v1/chat/completions (vLLM 등 continuous batching 서버)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "")  # 비어 있으면 backend 기본값 (ollama: 11434, openai: 8000)
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")
+# openai backend 동시 요청 수 (서버가 batching 하므로 Ollama 보다 크게)
+LLM_BACKEND_CONCURRENCY = int(os.getenv("LLM_BACKEND_CONCURRENCY", "32"))
+# Ollama 요청의 모델 상주 시간 (예: "30m", 비어 있으면 서버 기본값), run_batch_pipeline 의 grouped 실행이 지정
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "")
+
+# 모델 이름 (openai backend 는 서버에 등록된 이름 사용, 예: "Qwen/Qwen3-VL-30B-A3B-Instruct")
+TABLE_MODEL = os.getenv("TABLE_MODEL", "qwen3-vl:30b-a3b-instruct-q4_K_M")
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "qwen3-vl:32b-instruct-q4_K_M")
+
+# 요청별 num_ctx / num_predict 동적 결정 (입력 토큰 추정, 기존 고정값은 하한으로 유지)
+LLM_DYNAMIC_CONTEXT = os.getenv("LLM_DYNAMIC_CONTEXT", "1") == "1"
+
+# Step4 payload prefetch: 모델 요청 중 다음 그룹 이미지 병합/인코딩을 미리 준비할 개수
+# 비어 있으면 in-flight x 2, 0 이면 사용 안 함
+TABLE_PREFETCH_DEPTH = int(os.getenv("TABLE_PREFETCH_DEPTH")) if os.getenv("TABLE_PREFETCH_DEPTH") else None
+
+# Step6 공용 library DB (모든 문서가 하나의 DB 에 저장, 여러 파이프라인이 동시에 기록 가능)
+# 문서별 DB 를 쓰려면 LIBRARY_DB_PATH="{OUTPUT_DIR}/library.db" 로 지정 ({OUTPUT_DIR} 은 여기서 치환)
+LIBRARY_DB_PATH = os.getenv("LIBRARY_DB_PATH", "library.db").replace("{OUTPUT_DIR}", OUTPUT_DIR)
+LIBRARY_DB_BUSY_TIMEOUT = float(os.getenv("LIBRARY_DB_BUSY_TIMEOUT", "60"))  # 초, 다른 writer 의 트랜잭션 대기
+
+# Step6b embedding (vector) 인덱스: library DB 의 섹션/테이블 chunk 를 로컬 embedding 모델로 벡터화
+# LLM_BACKEND / LLM_BASE_URL 의 서버 사용 (Ollama /api/embed, OpenAI 호환 /v1/embeddings)
+EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))  # 요청당 chunk 수
+EMBED_CHUNK_CHARS = int(os.getenv("EMBED_CHUNK_CHARS", "2000"))  # chunk 최대 길이 (문자)
+# 벡터 파일 (float32 memmap), 비어 있으면 library DB 옆 "{DB 이름}_vectors.f32"
+EMBED_INDEX_PATH = os.getenv("EMBED_INDEX_PATH", "")
@@ -23,6 +23,7 @@ import json,os,time
 from pathlib import Path
 import logger
 from pdf2image import convert_from_path
+from lib_llm_client import get_http_client
 from PIL import Image
 import io
 
@@ -98,14 +99,16 @@ def deepseek_ocr(image_path, mode="free"):
         }
     }
     
-    response = requests.post(url, json=data)
+    response = get_http_client("http://localhost:11434").post(url, data, timeout=600)
     return response.json()['response']
 
 
 class DeepSeekOCR:
-    def __init__(self, base_url="http://localhost:11434", model="deepseek-ocr:latest"):
+    def __init__(self, base_url="http://localhost:11434", model="deepseek-ocr:latest", timeout=600):
         self.base_url = base_url
         self.model = model
+        self.timeout = timeout  # 페이지당 요청 deadline (초, 재시도 포함)
+        self.http = get_http_client(base_url)
     
     def _encode_image(self, image_path):
         """이미지를 base64로 인코딩"""
@@ -131,9 +134,10 @@ class DeepSeekOCR:
             }
         }
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/api/generate", 
-                json=data, 
+                data, 
+                timeout=self.timeout,
                 stream=stream
             )
         except requests.exceptions.RequestException as e:
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+LLM backend 테스트용 mock 서버
+
+Ollama /api/generate, /api/embed 와 OpenAI 호환 /v1/chat/completions, /v1/embeddings 를 흉내내어
+실제 모델 없이 lib_llm_client backend / step4 / step7 의 요청 흐름을 확인
+
+사용법:
+    python etc/mock_llm_server.py --port 8000 --delay 0.5
+    LLM_BACKEND=openai LLM_BASE_URL=http://localhost:8000 python step4_llm_parser.py
+
+응답:
+    - 프롬프트에 "### TABLE" 마커 지시가 있으면 (micro-batch) 이미지 수만큼 마커 + 테이블
+    - 그 외에는 고정 Markdown 테이블
+    - embedding: 단어 hash 기반 bag-of-words 벡터 (EMBED_DIM 차원, 정규화) - 단어가 겹치면 유사도가 높음
+    - 동시 요청 수 (최대값) 를 /stats 로 확인 가능 (continuous batching 동작 확인용)
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TABLE_MD = "| Field | Value |\n|---|---|\n| A | 1 |\n| B | 2 |"
+EMBED_DIM = 64
+
+_stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0}
+_stats_lock = threading.Lock()
+
+
+def make_response_text(prompt: str, image_count: int) -> str:
+    """프롬프트 종류에 맞는 고정 응답"""
+    match = re.search(r"You are given (\d+) separate table images", prompt)
+    if match:
+        count = int(match.group(1))
+        return "\n\n".join(f"### TABLE {idx}\n{TABLE_MD}" for idx in range(1, count + 1))
+    if image_count:
+        return TABLE_MD
+    return "Mock summary."
+
+
+def make_embedding(text: str):
+    """단어 hash bag-of-words 벡터 (L2 정규화)"""
+    vec = [0.0] * EMBED_DIM
+    for word in re.findall(r"\w+", text.lower()):
+        vec[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % EMBED_DIM] += 1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with _stats_lock:
+                self._send_json(200, dict(_stats))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+
+        with _stats_lock:
+            _stats["requests"] += 1
+            _stats["in_flight"] += 1
+            _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+        try:
+            time.sleep(self.delay)
+            if self.path == "/api/generate":
+                prompt = payload.get("prompt", "")
+                text = make_response_text(prompt, len(payload.get("images", [])))
+                self._send_json(200, {
+                    "model": payload.get("model"),
+                    "response": text,
+                    "done": True,
+                    "done_reason": "stop",
+                    "prompt_eval_count": len(prompt) // 4,
+                    "eval_count": len(text) // 4,
+                    "load_duration": 0,
+                })
+            elif self.path == "/api/embed":
+                texts = payload.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                self._send_json(200, {"model": payload.get("model"),
+                                      "embeddings": [make_embedding(t) for t in texts]})
+            elif self.path == "/v1/embeddings":
+                texts = payload.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                self._send_json(200, {"object": "list", "model": payload.get("model"),
+                                      "data": [{"object": "embedding", "index": idx, "embedding": make_embedding(t)}
+                                               for idx, t in enumerate(texts)]})
+            elif self.path == "/v1/chat/completions":
+                content = payload["messages"][-1]["content"]
+                if isinstance(content, str):
+                    prompt, image_count = content, 0
+                else:
+                    prompt = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+                    image_count = sum(1 for part in content if part.get("type") == "image_url")
+                text = make_response_text(prompt, image_count)
+                self._send_json(200, {
+                    "id": f"mock-{_stats['requests']}",
+                    "object": "chat.completion",
+                    "model": payload.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4},
+                })
+            else:
+                self._send_json(404, {"error": "not found"})
+        finally:
+            with _stats_lock:
+                _stats["in_flight"] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Ollama / OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=float, default=0.0, help="요청당 응답 지연 (초)")
+    args = parser.parse_args()
+
+    MockHandler.delay = args.delay
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    print(f"Mock LLM server on http://{args.host}:{args.port} (delay {args.delay}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
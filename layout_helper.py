@@ -138,21 +138,7 @@ class LayoutHelper:
     
     def _cells_to_markdown(self, cells: List[List[str]]) -> str:
         """2D 셀 배열을 Markdown 테이블로 변환"""
-        if not cells or not cells[0]:
-            return ""
-        
-        lines = []
-        
-        # 헤더
-        header = cells[0]
-        lines.append("| " + " | ".join(str(c) for c in header) + " |")
-        lines.append("|" + "|".join(["---"] * len(header)) + "|")
-        
-        # 데이터 행
-        for row in cells[1:]:
-            lines.append("| " + " | ".join(str(c) for c in row) + " |")
-        
-        return "\n".join(lines)
+        return cells_to_markdown(cells)
     
     def get_pages_by_strategy(self, strategy: str) -> List[int]:
         """특정 전략을 사용하는 페이지 목록 (1-based)"""
@@ -168,6 +154,33 @@ class LayoutHelper:
             self.doc.close()
 
 
+def _format_cell(cell) -> str:
+    """셀 텍스트 정리 (None=병합 셀은 빈 칸, 줄바꿈은 <br>, | 는 escape)"""
+    if cell is None:
+        return ""
+    text = str(cell).strip().replace("|", "\\|")
+    return "<br>".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def cells_to_markdown(cells: List[List[str]]) -> str:
+    """2D 셀 배열 (fitz Table.extract() 결과) 을 Markdown 테이블로 변환"""
+    if not cells or not cells[0]:
+        return ""
+    
+    lines = []
+    
+    # 헤더
+    header = cells[0]
+    lines.append("| " + " | ".join(_format_cell(c) for c in header) + " |")
+    lines.append("|" + "|".join(["---"] * len(header)) + "|")
+    
+    # 데이터 행
+    for row in cells[1:]:
+        lines.append("| " + " | ".join(_format_cell(c) for c in row) + " |")
+    
+    return "\n".join(lines)
+
+
 def create_combined_image(
     helper: LayoutHelper,
     prev_page_num: int,
@@ -0,0 +1,118 @@
+"""
+LLM 테이블 작업 스케줄러 - Longest-Job-First
+
+여러 페이지로 합쳐진 긴 테이블이 마지막에 시작되면 전체 실행 시간이 길게 꼬리를 끌기 때문에
+그룹별 비용 (이미지 면적, part 수, 이전 실행의 실제 latency) 을 추정하여 긴 작업부터 제출
+
+실제 latency 는 history 파일에 저장되어 다음 실행의 추정에 사용됨
+"""
+
+import heapq
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from PIL import Image
+
+
+class TableJobScheduler:
+    """테이블 그룹 비용 추정 및 LJF 정렬"""
+
+    # history 가 없을 때의 기본값
+    DEFAULT_SEC_PER_MPX = 20.0   # 메가픽셀당 초
+    BASE_SECONDS = 5.0           # 요청당 고정 비용 (prefill 등)
+    PART_OVERHEAD = 0.1          # 추가 part 당 비용 가중치
+
+    def __init__(self, history_path: str):
+        """
+        Args:
+            history_path: latency history JSON 경로
+        """
+        self.history_path = Path(history_path)
+        self._lock = threading.Lock()
+        self.history = {"jobs": {}, "sec_per_mpx": self.DEFAULT_SEC_PER_MPX}
+        if self.history_path.exists():
+            try:
+                with open(self.history_path, 'r', encoding='utf-8') as f:
+                    self.history.update(json.load(f))
+            except Exception as e:
+                print(f"    ⚠️  latency history 로드 실패 ({self.history_path}): {e}")
+        self.samples = []  # (estimated, actual)
+
+    @staticmethod
+    def job_key(job: Dict) -> str:
+        """history 키: 이미지 파일명 목록"""
+        return "|".join(Path(p).name for p in job['image_paths'])
+
+    @staticmethod
+    def _megapixels(image_paths: List[str]) -> float:
+        total = 0
+        for path in image_paths:
+            try:
+                # 헤더만 읽음 (디코딩 없음)
+                with Image.open(path) as img:
+                    total += img.width * img.height
+            except Exception:
+                pass
+        return total / 1_000_000
+
+    def estimate(self, job: Dict) -> float:
+        """그룹 예상 latency (초): 이전 실행 기록 우선, 없으면 면적/part 수 기반"""
+        key = self.job_key(job)
+        if key in self.history["jobs"]:
+            return self.history["jobs"][key]
+
+        if 'megapixels' not in job:
+            job['megapixels'] = self._megapixels(job['image_paths'])
+        parts = max(region.get('merged_count', 1) for region in job.get('regions', [{}]))
+        parts = max(parts, len(job['image_paths']))
+        return (self.BASE_SECONDS + job['megapixels'] * self.history["sec_per_mpx"]) * (1 + self.PART_OVERHEAD * (parts - 1))
+
+    def order(self, jobs: List[Dict], workers: int) -> Tuple[List[Dict], float]:
+        """
+        예상 비용 내림차순 정렬 및 worker 수 기준 예상 완료 시각 계산
+
+        Returns:
+            (정렬된 작업 리스트, 예상 전체 소요 시간)
+        """
+        for job in jobs:
+            job['estimated_seconds'] = self.estimate(job)
+        ordered = sorted(jobs, key=lambda j: j['estimated_seconds'], reverse=True)
+
+        # 제출 순서대로 가장 먼저 비는 worker 에 배정 (ThreadPoolExecutor 동작과 동일)
+        free_at = [0.0] * max(1, workers)
+        heapq.heapify(free_at)
+        for job in ordered:
+            start = heapq.heappop(free_at)
+            job['estimated_finish'] = start + job['estimated_seconds']
+            heapq.heappush(free_at, job['estimated_finish'])
+        makespan = max(free_at) if ordered else 0.0
+        return ordered, makespan
+
+    def record(self, job: Dict, seconds: float):
+        """실제 latency 기록 (history 및 메가픽셀당 초 갱신)"""
+        with self._lock:
+            self.samples.append((job.get('estimated_seconds', 0.0), seconds))
+            self.history["jobs"][self.job_key(job)] = round(seconds, 2)
+            mpx = job.get('megapixels') or self._megapixels(job['image_paths'])
+            if mpx > 0:
+                # 지수 이동 평균으로 메가픽셀당 비용 보정
+                rate = max(0.0, seconds - self.BASE_SECONDS) / mpx
+                self.history["sec_per_mpx"] = round(0.8 * self.history["sec_per_mpx"] + 0.2 * rate, 3)
+
+    def report(self, predicted_makespan: float, actual_makespan: float) -> str:
+        """예상 vs 실제 (전체 소요 시간, 그룹별 latency 평균 오차)"""
+        lines = [f"Scheduler: predicted makespan {predicted_makespan:.0f}s, actual {actual_makespan:.0f}s"]
+        if self.samples:
+            errors = [abs(est - act) / act for est, act in self.samples if act > 0]
+            if errors:
+                lines.append(f"  - latency estimate error (MAPE): {sum(errors) / len(errors):.1%} over {len(errors)} groups")
+        lines.append(f"  - sec/Mpx: {self.history['sec_per_mpx']}")
+        return "\n".join(lines)
+
+    def save(self):
+        with self._lock:
+            self.history_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.history_path, 'w', encoding='utf-8') as f:
+                json.dump(self.history, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,130 @@
+"""
+library.db 전문 검색 (FTS5, BM25 순위, snippet/highlight)
+
+step6 이 만든 sections_fts / attachments_fts 를 조회
+- 섹션: 제목 + 본문
+- 첨부: 테이블 Markdown / 그림 설명 (제목 포함)
+
+사용 예:
+    search = LibrarySearch()  # LIBRARY_DB_PATH (모든 문서 공용 DB)
+    for hit in search.search("Get Log Page 0xC0", limit=10):
+        print(hit["document"], hit["section_pid"], hit["title"], hit["snippet"])
+
+    python lib_library_search.py "Get Log Page" --db library.db --document output_tcg.db
+"""
+
+import argparse
+import re
+import sqlite3
+from typing import Dict, List, Optional, Sequence
+
+from common_parameter import LIBRARY_DB_PATH, LIBRARY_DB_BUSY_TIMEOUT
+
+
+class LibrarySearch:
+    """library.db FTS5 검색 API"""
+
+    # bm25 컬럼 가중치 (제목 일치를 본문보다 우선)
+    TITLE_WEIGHT = 10.0
+    BODY_WEIGHT = 1.0
+
+    def __init__(self, db_path: str = LIBRARY_DB_PATH):
+        """
+        Args:
+            db_path: library.db 경로 (읽기 전용으로 열림, WAL 이므로 step6 실행 중에도 조회 가능)
+        """
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False,
+                                    timeout=LIBRARY_DB_BUSY_TIMEOUT)
+        self.conn.row_factory = sqlite3.Row
+
+    @staticmethod
+    def to_fts_query(text: str) -> str:
+        """
+        사용자 입력 -> FTS5 쿼리 (단어별 phrase 로 quoting, 모두 포함 AND)
+
+        "511:508", "0xC0", "Get-Log" 같은 입력이 FTS5 문법 (컬럼 필터, 연산자) 으로 해석되지 않도록 함
+        """
+        terms = [t.replace('"', '""') for t in re.split(r"\s+", text.strip()) if t]
+        return " ".join(f'"{t}"' for t in terms)
+
+    def search(self, query: str, limit: int = 20, document: Optional[str] = None,
+               kinds: Sequence[str] = ("section", "table", "figure"), raw: bool = False) -> List[Dict]:
+        """
+        섹션/테이블/그림 통합 검색 (BM25 점수 순, 낮을수록 관련도 높음)
+
+        Args:
+            query: 검색어 (raw=True 면 FTS5 쿼리 문법 그대로 사용)
+            limit: 최대 결과 수
+            document: 문서 이름으로 제한 (documents.name)
+            kinds: 검색 대상 ("section", "table", "figure")
+            raw: FTS5 문법 사용 여부
+
+        Returns:
+            [{"kind", "id", "document", "section_pid", "section_title", "title", "snippet", "score"}, ...]
+        """
+        fts_query = query if raw else self.to_fts_query(query)
+        if not fts_query:
+            return []
+
+        results = []
+        if "section" in kinds:
+            sql = f"""
+                SELECT 'section' AS kind, s.id, d.name AS document, s.section_pid, s.title AS section_title,
+                       highlight(sections_fts, 0, '<b>', '</b>') AS title,
+                       snippet(sections_fts, 1, '<b>', '</b>', '…', 16) AS snippet,
+                       bm25(sections_fts, {self.TITLE_WEIGHT}, {self.BODY_WEIGHT}) AS score
+                FROM sections_fts
+                JOIN sections s ON s.id = sections_fts.rowid
+                JOIN documents d ON d.id = s.document_id
+                WHERE sections_fts MATCH ? {"AND d.name = ?" if document else ""}
+                ORDER BY score LIMIT ?
+            """
+            params = [fts_query] + ([document] if document else []) + [limit]
+            results.extend(dict(row) for row in self.conn.execute(sql, params))
+
+        attachment_kinds = [k for k in kinds if k in ("table", "figure")]
+        if attachment_kinds:
+            placeholders = ", ".join("?" for _ in attachment_kinds)
+            sql = f"""
+                SELECT a.type AS kind, a.id, d.name AS document, s.section_pid, s.title AS section_title,
+                       highlight(attachments_fts, 0, '<b>', '</b>') AS title,
+                       snippet(attachments_fts, 1, '<b>', '</b>', '…', 16) AS snippet,
+                       bm25(attachments_fts, {self.TITLE_WEIGHT}, {self.BODY_WEIGHT}) AS score
+                FROM attachments_fts
+                JOIN attachments a ON a.id = attachments_fts.rowid
+                JOIN sections s ON s.id = a.section_id
+                JOIN documents d ON d.id = s.document_id
+                WHERE attachments_fts MATCH ? AND a.type IN ({placeholders}) {"AND d.name = ?" if document else ""}
+                ORDER BY score LIMIT ?
+            """
+            params = [fts_query] + attachment_kinds + ([document] if document else []) + [limit]
+            results.extend(dict(row) for row in self.conn.execute(sql, params))
+
+        # 두 FTS 테이블의 bm25 는 같은 척도 (낮을수록 관련도 높음) 이므로 합쳐서 정렬
+        results.sort(key=lambda r: r["score"])
+        return results[:limit]
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="library.db full-text search")
+    parser.add_argument("query")
+    parser.add_argument("--db", default=LIBRARY_DB_PATH, help="library DB 경로")
+    parser.add_argument("--document", default=None, help="문서 이름으로 제한 (documents.name)")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    
+    search = LibrarySearch(args.db)
+    try:
+        for hit in search.search(args.query, limit=args.limit, document=args.document):
+            print(f"[{hit['kind']:7s}] {hit['score']:7.2f}  {hit['document']}  {hit['section_pid'] or '-'}  "
+                  f"{hit['title']}\n          {hit['snippet']}")
+    finally:
+        search.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,133 +2,707 @@
 LLM 테이블 파서 - 테이블 이미지를 Markdown으로 변환
 
 로컬 Ollama의 qwen3-vl 모델을 사용하여 테이블 이미지를 파싱
+LLM_BACKEND=openai 이면 OpenAI 호환 서버 (vLLM 등) 의 /v1/chat/completions 사용
 """
 
 import json
 import base64
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 import requests
+from requests.adapters import HTTPAdapter
 from PIL import Image
 import io
+from table_merger import merge_tables, extract_table_header
+from lib_table_validator import split_markdown_table
+from lib_token_estimator import token_estimator
+from common_parameter import (LLM_BACKEND, LLM_BASE_URL, LLM_MAX_IN_FLIGHT, LLM_API_KEY,
+                              LLM_BACKEND_CONCURRENCY, LLM_KEEP_ALIVE, TABLE_MODEL, LLM_DYNAMIC_CONTEXT)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """모델 서버가 연속 실패하여 circuit breaker 가 열린 상태"""
+
+
+class ModelHTTPClient:
+    """
+    모델 서버 공용 HTTP 클라이언트
+    
+    - keep-alive connection pooling (requests.Session)
+    - 일시적 오류 (연결 실패, timeout, 429/5xx) 는 jitter 포함 지수 backoff 로 재시도
+    - 요청별 deadline (재시도 포함 전체 소요 시간 제한)
+    - circuit breaker: 연속 실패 시 cooldown 동안 즉시 실패 (죽은 서버에서 배치가 멈추지 않도록)
+      cooldown 후 half-open: 시험 요청 (probe) 1건만 허용, 성공하면 닫히고 실패하면 다시 열림
+    """
+    
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    
+    def __init__(self, pool_size: int = 16, max_retries: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 connect_timeout: float = 10.0,
+                 failure_threshold: int = 5, cooldown: float = 60.0,
+                 keep_alive: str = LLM_KEEP_ALIVE):
+        """
+        Args:
+            pool_size: 호스트당 keep-alive 연결 수
+            max_retries: 일시적 오류 재시도 횟수
+            backoff_base: backoff 기본 대기 (초), 시도마다 2배
+            backoff_max: backoff 최대 대기 (초)
+            connect_timeout: 연결 timeout (초)
+            failure_threshold: circuit 을 여는 연속 실패 횟수
+            cooldown: circuit 이 열린 후 다시 시도하기까지 대기 (초)
+            keep_alive: Ollama 모델 상주 시간 (요청 payload 에 추가, 비어 있으면 사용 안 함)
+        """
+        self.session = requests.Session()
+        self._pool_lock = threading.Lock()
+        self.pool_size = 0
+        self.ensure_pool_size(pool_size)
+        
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.keep_alive = keep_alive
+        
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_started = None  # half-open 시험 요청 시작 시각 (진행 중이 아니면 None)
+    
+    def ensure_pool_size(self, pool_size: int):
+        """
+        keep-alive 연결 수를 최소 pool_size 로 확장 (동시 요청 수보다 작으면 초과 연결은 매번 새로 맺고 버려짐)
+        """
+        with self._pool_lock:
+            if pool_size <= self.pool_size:
+                return
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self.pool_size = pool_size
+    
+    def _check_circuit(self, url: str):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.time()
+            if now - self._opened_at < self.cooldown:
+                raise CircuitOpenError(f"Circuit open for model server ({url}) - failing fast")
+            # half-open: probe 1건만 허용, 결과가 나올 때까지 나머지 요청은 즉시 실패
+            # (probe 가 cooldown 이 지나도록 결과를 기록하지 못했으면 새 probe 허용)
+            if self._probe_started is not None and now - self._probe_started < self.cooldown:
+                raise CircuitOpenError(f"Circuit half-open for model server ({url}) - probe in flight")
+            self._probe_started = now
+    
+    def _record(self, success: bool):
+        with self._lock:
+            if success:
+                self._consecutive_failures = 0
+                self._opened_at = None
+                self._probe_started = None
+            else:
+                self._consecutive_failures += 1
+                # probe 실패는 즉시 다시 열림
+                if self._probe_started is not None or self._consecutive_failures >= self.failure_threshold:
+                    self._opened_at = time.time()
+                    self._probe_started = None
+    
+    def post(self, url: str, payload: dict, timeout: float = 600, stream: bool = False,
+             headers: Optional[dict] = None) -> requests.Response:
+        """
+        JSON POST (재시도/backoff/deadline/circuit breaker 적용)
+        
+        Args:
+            url: 요청 URL
+            payload: JSON body
+            timeout: 요청 deadline (초) - 재시도 포함 전체 시간
+            stream: 스트리밍 응답 여부
+            headers: 추가 HTTP 헤더 (인증 등)
+            
+        Returns:
+            성공 응답 (raise_for_status 통과)
+        """
+        self._check_circuit(url)
+        deadline = time.time() + timeout
+        
+        # 모델 상주 시간 (Ollama API 전용)
+        if self.keep_alive and "/api/" in url and "model" in payload and "keep_alive" not in payload:
+            payload = dict(payload, keep_alive=self.keep_alive)
+        attempt = 0
+        
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self._record(False)
+                raise requests.exceptions.Timeout(f"Deadline exceeded ({timeout}s) for {url}")
+            
+            try:
+                response = self.session.post(url, json=payload, stream=stream, headers=headers,
+                                             timeout=(min(self.connect_timeout, remaining), remaining))
+                if response.status_code in self.RETRY_STATUS:
+                    raise requests.exceptions.HTTPError(f"{response.status_code} from {url}", response=response)
+                response.raise_for_status()
+                self._record(True)
+                return response
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                status = e.response.status_code if getattr(e, 'response', None) is not None else None
+                retryable = status is None or status in self.RETRY_STATUS
+                
+                if not retryable:
+                    # 4xx 응답: 서버는 살아 있으므로 circuit 에는 반영하지 않음
+                    self._record(True)
+                    raise
+                
+                attempt += 1
+                if attempt > self.max_retries:
+                    self._record(False)
+                    raise
+                
+                # full jitter exponential backoff (deadline 이내로 제한)
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+                delay = min(delay, max(0.0, deadline - time.time()))
+                print(f"    ⚠️  모델 서버 요청 실패 ({e}) - {delay:.1f}s 후 재시도 {attempt}/{self.max_retries}")
+                time.sleep(delay)
+
+
+_http_clients: Dict[str, ModelHTTPClient] = {}
+_http_clients_lock = threading.Lock()
+
+
+def get_http_client(base_url: str = "http://localhost:11434", pool_size: int = 16) -> ModelHTTPClient:
+    """
+    base_url 별 공용 ModelHTTPClient (연결 풀과 circuit breaker 를 프로세스 내에서 공유)
+    
+    Args:
+        pool_size: 필요한 keep-alive 연결 수 (이미 있는 client 는 더 작으면 확장)
+    """
+    with _http_clients_lock:
+        if base_url not in _http_clients:
+            _http_clients[base_url] = ModelHTTPClient(pool_size=pool_size)
+        client = _http_clients[base_url]
+    client.ensure_pool_size(pool_size)
+    return client
+
+
+class LLMBackend:
+    """
+    모델 서버 backend 인터페이스
+    
+    generate() 는 프롬프트 (+ base64 이미지) 를 보내고 정규화된 결과 dict 반환:
+        {"text": 응답, "prompt_tokens": int|None, "completion_tokens": int|None, "done_reason": str|None}
+    embed() 는 텍스트 리스트의 embedding 벡터 리스트 반환 (입력 순서 유지)
+    """
+    
+    name = "base"
+    # 동시에 보내도 되는 요청 수 (서버 측 batching 여부에 따라 다름)
+    max_concurrency = 1
+    base_url = ""
+    
+    def generate(self, model: str, prompt: str, images: Optional[List[str]] = None,
+                 options: Optional[dict] = None, timeout: float = 600) -> dict:
+        raise NotImplementedError
+    
+    def embed(self, model: str, texts: List[str], timeout: float = 300) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class OllamaBackend(LLMBackend):
+    """Ollama /api/generate"""
+    
+    name = "ollama"
+    
+    def __init__(self, base_url: str = "http://localhost:11434", max_concurrency: int = 4):
+        self.base_url = base_url.rstrip("/")
+        self.api_url = f"{self.base_url}/api/generate"
+        self.embed_url = f"{self.base_url}/api/embed"
+        self.max_concurrency = max_concurrency
+        self.http = get_http_client(self.base_url, max_concurrency)
+    
+    def generate(self, model: str, prompt: str, images: Optional[List[str]] = None,
+                 options: Optional[dict] = None, timeout: float = 600) -> dict:
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if images:
+            payload["images"] = images
+        if options:
+            payload["options"] = options
+        result = self.http.post(self.api_url, payload, timeout=timeout).json()
+        return {
+            "text": result.get("response", "").strip(),
+            "prompt_tokens": result.get("prompt_eval_count"),
+            "completion_tokens": result.get("eval_count"),
+            "done_reason": result.get("done_reason"),
+        }
+    
+    def embed(self, model: str, texts: List[str], timeout: float = 300) -> List[List[float]]:
+        result = self.http.post(self.embed_url, {"model": model, "input": texts}, timeout=timeout).json()
+        return result.get("embeddings", [])
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    OpenAI 호환 /v1/chat/completions (vLLM, SGLang 등)
+    
+    서버가 continuous batching 을 하므로 max_concurrency 만큼 동시에 요청
+    Ollama options 는 대응되는 필드로 변환 (num_predict -> max_tokens, num_ctx 는 서버 설정이므로 무시)
+    """
+    
+    name = "openai"
+    OPTION_MAP = {"temperature": "temperature", "top_p": "top_p", "num_predict": "max_tokens", "seed": "seed"}
+    
+    def __init__(self, base_url: str = "http://localhost:8000", api_key: str = "",
+                 max_concurrency: int = 32):
+        self.base_url = base_url.rstrip("/")
+        self.api_url = f"{self.base_url}/v1/chat/completions"
+        self.embed_url = f"{self.base_url}/v1/embeddings"
+        self.max_concurrency = max_concurrency
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else None
+        self.http = get_http_client(self.base_url, max_concurrency)
+    
+    @staticmethod
+    def _image_url(image_base64: str) -> str:
+        mime = "image/jpeg" if image_base64.startswith("/9j/") else "image/png"
+        return f"data:{mime};base64,{image_base64}"
+    
+    def generate(self, model: str, prompt: str, images: Optional[List[str]] = None,
+                 options: Optional[dict] = None, timeout: float = 600) -> dict:
+        content = [{"type": "image_url", "image_url": {"url": self._image_url(img)}} for img in images or []]
+        content.append({"type": "text", "text": prompt})
+        payload = {"model": model, "messages": [{"role": "user", "content": content}], "stream": False}
+        for key, value in (options or {}).items():
+            if key in self.OPTION_MAP:
+                payload[self.OPTION_MAP[key]] = value
+        
+        result = self.http.post(self.api_url, payload, timeout=timeout, headers=self.headers).json()
+        choice = (result.get("choices") or [{}])[0]
+        usage = result.get("usage") or {}
+        return {
+            "text": ((choice.get("message") or {}).get("content") or "").strip(),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            "done_reason": choice.get("finish_reason"),
+        }
+    
+    def embed(self, model: str, texts: List[str], timeout: float = 300) -> List[List[float]]:
+        result = self.http.post(self.embed_url, {"model": model, "input": texts}, timeout=timeout,
+                                headers=self.headers).json()
+        data = sorted(result.get("data", []), key=lambda item: item.get("index", 0))
+        return [item["embedding"] for item in data]
+
+
+def get_backend(kind: str = LLM_BACKEND, base_url: str = LLM_BASE_URL) -> LLMBackend:
+    """설정 (LLM_BACKEND / LLM_BASE_URL) 에 따른 backend 생성"""
+    if kind == "ollama":
+        return OllamaBackend(base_url or "http://localhost:11434", LLM_MAX_IN_FLIGHT)
+    if kind == "openai":
+        return OpenAICompatibleBackend(base_url or "http://localhost:8000", LLM_API_KEY, LLM_BACKEND_CONCURRENCY)
+    raise ValueError(f"Unknown LLM_BACKEND: {kind} (ollama | openai)")
+
+
+def _strip_code_fence(text: str) -> str:
+    """```markdown ... ``` 로 감싼 응답에서 본문만 추출"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split('\n', 1)[1] if '\n' in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
 
 
 class LLMTableParser:
     """LLM 기반 테이블 파서"""
     
-    def __init__(self, model: str = "qwen3-vl:30b-a3b-instruct-q4_K_M", 
-                 base_url: str = "http://localhost:11434"):
+    # 약 6000px 넘어가면 타일 분할 처리
+    MAX_HEIGHT_LIMIT = 6000
+    # 타일 최대 높이 (헤더 strip 포함)
+    TILE_HEIGHT = 4000
+    # 행의 어두운 픽셀 비율이 이 값 이상이면 가로 ruling line
+    RULING_LINE_RATIO = 0.6
+    
+    # 테이블 프롬프트/옵션 변경 시 버전을 올릴 것 (table_md 캐시 키에 포함)
+    TABLE_PROMPT_VERSION = "v1"
+    # micro-batch 프롬프트 (_batch_prompt / 분리 규칙) 변경 시 버전을 올릴 것
+    BATCH_PROMPT_VERSION = "b1"
+    TABLE_OPTIONS = {
+        "temperature": 0.1,
+        "num_ctx": 8192
+    }
+    # 동적 num_predict 하한: 이미지 토큰은 출력 길이 예측이 부정확 (작은 crop 의 dense hex 레지스터 테이블 등)
+    TABLE_MIN_PREDICT = 2048
+    
+    def __init__(self, model: str = TABLE_MODEL, 
+                 base_url: str = LLM_BASE_URL,
+                 tile_workers: int = 4,
+                 backend: Optional[LLMBackend] = None):
         """
         Args:
-            model: Ollama 모델 이름
-            base_url: Ollama API URL
+            model: 모델 이름 (Ollama 또는 OpenAI 호환 서버에 등록된 이름)
+            base_url: 모델 서버 URL (비어 있으면 backend 기본값)
+            tile_workers: 긴 테이블 타일 병렬 요청 수 (Ollama OLLAMA_NUM_PARALLEL 에 맞출 것)
+            backend: LLMBackend (기본: LLM_BACKEND 설정)
         """
         self.model = model
-        self.base_url = base_url
-        self.api_url = f"{base_url}/api/generate"
+        self.backend = backend or get_backend(base_url=base_url)
+        self.base_url = self.backend.base_url
+        self.tile_workers = tile_workers
+        # 동시 요청 그룹마다 타일 요청이 tile_workers 개씩 -> 연결 풀도 그만큼 확보
+        http = getattr(self.backend, "http", None)
+        if http is not None:
+            http.ensure_pool_size(self.backend.max_concurrency * max(1, tile_workers))
+        # 마지막 요청의 응답 정보 (thread 별, 출력 잘림 검증용)
+        self._local = threading.local()
+    
+    def cache_signature(self, text_guided: bool = False, batch: bool = False) -> dict:
+        """
+        table_md 캐시 키에 들어가는 파싱 설정 (모델, 프롬프트 버전, 옵션)
+        
+        batch: micro-batch 프롬프트 결과 (단일 이미지 프롬프트 결과와 별도 키)
+        """
+        prompt_version = self.TABLE_PROMPT_VERSION
+        if text_guided:
+            prompt_version += "+text"
+        if batch:
+            prompt_version += f"+batch-{self.BATCH_PROMPT_VERSION}"
+        signature = {
+            "model": self.model,
+            "prompt_version": prompt_version,
+            "options": self.TABLE_OPTIONS,
+        }
+        if self.backend.name != "ollama":
+            signature["backend"] = self.backend.name
+        return signature
     
     def encode_image(self, image_path: str) -> str:
-        """이미지를 base64로 인코딩"""
+        """이미지를 base64로 인코딩 (PNG/JPEG 이외 포맷은 PNG로 변환)"""
+        if Path(image_path).suffix.lower() not in ('.png', '.jpg', '.jpeg'):
+            # step3 에서 WebP 등으로 저장된 경우 Ollama 가 디코딩 가능한 PNG로 변환
+            with Image.open(image_path) as img:
+                buffer = io.BytesIO()
+                img.save(buffer, format="PNG")
+                return base64.b64encode(buffer.getvalue()).decode('utf-8')
         with open(image_path, 'rb') as f:
             return base64.b64encode(f.read()).decode('utf-8')
     
-    def parse_table_images(self, image_paths: list, table_title: str = None) -> Optional[str]:
+    def parse_table_images(self, image_paths: list, table_title: str = None,
+                           text_lines: Optional[List[str]] = None) -> Optional[str]:
         """
         여러 테이블 이미지를 하나의 Markdown으로 파싱 (자동 병합)
         
+        매우 긴 테이블은 ruling line 기준 row 경계에서 타일로 나누고,
+        각 타일 상단에 헤더 strip 을 붙여 병렬 파싱 후 merge_tables 로 재조립
+        
         Args:
             image_paths: 테이블 이미지 경로 리스트
             table_title: 테이블 제목
+            text_lines: PDF text layer 라인 (text-layer guided 모드, 타일 분할 시에는 사용 안 함)
+        """
+        return self.parse_prepared(self.prepare_table_request(image_paths, table_title, text_lines))
+
+    def prepare_table_request(self, image_paths: list, table_title: str = None,
+                              text_lines: Optional[List[str]] = None) -> Optional[dict]:
+        """
+        요청 payload 준비 (이미지 디코딩/병합/타일 분할/인코딩) - 모델 호출 없음
+        
+        각 이미지는 한 번만 디코딩하고, 결과에는 base64 문자열과 크기만 남김 (PIL 이미지는 해제)
+        step4 에서는 모델 요청이 진행되는 동안 다음 그룹에 대해 미리 호출 (prefetch)
+        
+        Returns:
+            {"title", "text_lines", "tiled", "images": [base64], "image_sizes": [(w, h)] 또는 None,
+             "ruling_rows": 구조 검증용 행 수 또는 None}
         """
         if not image_paths:
             return None
+        prepared = {"title": table_title, "text_lines": text_lines, "tiled": False, "ruling_rows": None}
 
         # [안전장치] 이미지별 크기 확인 및 과도한 병합 방지
-        # 8192 토큰 제한을 고려하여, 너무 긴 이미지는 나누어서 처리
-        MAX_HEIGHT_LIMIT = 6000 # 약 6000px 넘어가면 안전하게 분할 처리
+        # 8192 토큰 제한을 고려하여, 너무 긴 이미지는 타일로 나누어서 처리
+        try:
+            images = []
+            for path in image_paths:
+                with Image.open(path) as img:
+                    images.append(img.convert('RGB'))
+            # 구조 검증용 ruling line 행 수 (part 마다 반복되는 헤더 행은 한 번만 셈)
+            prepared["ruling_rows"] = self._count_ruling_rows(images)
+            merged_img = self._stitch_loaded(images)
+        except Exception as e:
+            print(f"    ⚠️  이미지 병합 실패 (개별 처리 시도): {e}")
+            prepared.update(images=[self.encode_image(path) for path in image_paths], image_sizes=None)
+            return prepared
 
+        if merged_img.height > self.MAX_HEIGHT_LIMIT:
+            print(f"    ⚠️  총 높이({merged_img.height}px)가 너무 큽니다. 타일 분할 처리합니다.")
+            tiles = self._tile_table_image(merged_img)
+            prepared.update(tiled=True, images=[self._encode_pil_image(tile) for tile in tiles],
+                            image_sizes=[tile.size for tile in tiles])
+        elif len(image_paths) == 1 and Path(image_paths[0]).suffix.lower() in ('.png', '.jpg', '.jpeg'):
+            # 단일 이미지: 원본 파일 그대로 전송 (재인코딩 없음)
+            prepared.update(images=[self.encode_image(image_paths[0])], image_sizes=[merged_img.size])
+        else:
+            if len(image_paths) > 1:
+                print(f"    ℹ️  {len(image_paths)}개 이미지 병합 완료 ({merged_img.width}x{merged_img.height})")
+            prepared.update(images=[self._encode_pil_image(merged_img)], image_sizes=[merged_img.size])
+        return prepared
+
+    def parse_prepared(self, prepared: Optional[dict]) -> Optional[str]:
+        """prepare_table_request() 결과로 모델 요청 (타일이면 병렬 요청 후 병합)"""
+        if not prepared:
+            return None
+        self._local.truncated = False
+        if prepared["tiled"]:
+            return self._parse_tiled(prepared["images"], prepared["title"], prepared["image_sizes"])
+        return self._request_markdown(prepared["images"], prepared["title"], prepared["text_lines"],
+                                      image_sizes=prepared["image_sizes"])
+
+    def last_batch_info(self) -> List[Dict]:
+        """현재 thread 의 마지막 parse_table_batch 항목별 정보 ({"batched": 배치 프롬프트 결과 여부, "truncated": 잘림 여부})"""
+        return getattr(self._local, 'batch_info', [])
+
+    def last_truncated(self) -> bool:
+        """현재 thread 의 마지막 parse_table_images 출력이 num_predict 에 도달해 잘렸는지"""
+        return getattr(self._local, 'truncated', False)
+
+    def count_ruling_rows(self, image_paths: list) -> Optional[int]:
+        """
+        이미지 가로 ruling line 으로 센 테이블 행 수 (헤더 포함, 구조 검증용)
+        
+        여러 part 로 나뉜 테이블은 part 마다 반복되는 헤더 행을 한 번만 셈
+        """
+        images = []
         try:
-            images = [Image.open(p) for p in image_paths]
-            total_height = sum(img.height for img in images)
+            for path in image_paths:
+                with Image.open(path) as img:
+                    images.append(img.convert('L'))
+        except Exception:
+            return None
+        return self._count_ruling_rows(images)
+
+    def _count_ruling_rows(self, images: List[Image.Image]) -> int:
+        total = sum(max(0, len(self._find_row_boundaries(img)) - 1) for img in images)
+        return max(0, total - (len(images) - 1))
+
+    def _stitch_loaded(self, images: List[Image.Image]) -> Image.Image:
+        """디코딩된 이미지들을 세로로 이어 붙인 RGB 이미지 반환 (단일 이미지면 그대로)"""
+        if len(images) == 1:
+            return images[0]
+        
+        total_width = max(img.width for img in images)
+        total_height = sum(img.height for img in images)
+        
+        # 새 이미지 생성 (흰색 배경), 왼쪽 정렬로 이어 붙이기
+        merged_img = Image.new('RGB', (total_width, total_height), (255, 255, 255))
+        y_offset = 0
+        for img in images:
+            merged_img.paste(img, (0, y_offset))
+            y_offset += img.height
+        return merged_img
+
+    def _find_row_boundaries(self, img: Image.Image) -> List[int]:
+        """
+        가로 ruling line 의 y 좌표 목록 (row 경계)
+        
+        각 행의 어두운 픽셀 비율이 RULING_LINE_RATIO 이상이면 ruling line 으로 간주.
+        여러 픽셀 두께의 선은 하나의 경계(중앙값)로 합침.
+        """
+        # 어두운 픽셀 -> 255, 밝은 픽셀 -> 0 후, 가로 방향 BOX 평균 = 행별 어두운 비율
+        dark = img.convert('L').point(lambda v: 255 if v < 160 else 0)
+        row_means = list(dark.resize((1, img.height), Image.Resampling.BOX).getdata())
+        
+        threshold = 255 * self.RULING_LINE_RATIO
+        boundaries = []
+        run_start = None
+        for y, mean in enumerate(row_means + [0]):
+            if mean >= threshold:
+                if run_start is None:
+                    run_start = y
+            elif run_start is not None:
+                boundaries.append((run_start + y - 1) // 2)
+                run_start = None
+        return boundaries
+
+    def _tile_table_image(self, img: Image.Image) -> List[Image.Image]:
+        """
+        긴 테이블 이미지를 row 경계에서 잘라 타일 생성 (각 타일에 헤더 strip 추가)
+        
+        Returns:
+            타일 이미지 리스트 (첫 타일은 원본 헤더 포함)
+        """
+        boundaries = self._find_row_boundaries(img)
+        
+        # 헤더 strip: 상단 테두리 다음의 첫 번째 row 경계까지
+        header_bottom = 0
+        if len(boundaries) >= 2 and boundaries[1] < self.TILE_HEIGHT // 2:
+            header_bottom = boundaries[1] + 1
+        header = img.crop((0, 0, img.width, header_bottom)) if header_bottom else None
+        
+        body_limit = self.TILE_HEIGHT - header_bottom
+        tiles = []
+        top = 0
+        while top < img.height:
+            limit = top + (self.TILE_HEIGHT if top == 0 else body_limit)
+            if limit >= img.height:
+                bottom = img.height
+            else:
+                # limit 이전의 마지막 row 경계에서 자름 (없으면 limit 에서 강제 절단)
+                candidates = [b for b in boundaries if top < b <= limit]
+                bottom = candidates[-1] + 1 if candidates else limit
             
-            if len(images) > 1 and total_height > MAX_HEIGHT_LIMIT:
-                print(f"    ⚠️  총 높이({total_height}px)가 너무 큽니다. 분할 처리합니다.")
-                
-                # 이미지를 적절히 그룹화 (예: 2개씩)
-                # 여기서는 간단히 개별 처리 후 합치는 방식으로 변경
-                full_markdown = []
-                
-                # 청크 단위로 처리 (2개씩 묶거나, 4000px 단위로)
-                current_chunk = []
-                current_height = 0
-                
-                for img_path in image_paths:
-                    with Image.open(img_path) as img:
-                        h = img.height
-                    
-                    if current_height + h > 4000 and current_chunk:
-                         # 청크 처리 실행
-                         print(f"      🔹 청크 처리 중 ({len(current_chunk)}장)...")
-                         chunk_md = self._parse_images_internal(current_chunk, table_title + " (Part)")
-                         if chunk_md: full_markdown.append(chunk_md)
-                         current_chunk = []
-                         current_height = 0
-                    
-                    current_chunk.append(img_path)
-                    current_height += h
-                
-                # 남은 청크 처리
-                if current_chunk:
-                    print(f"      🔹 마지막 청크 처리 중 ({len(current_chunk)}장)...")
-                    chunk_md = self._parse_images_internal(current_chunk, table_title + " (Part)")
-                    if chunk_md: full_markdown.append(chunk_md)
-                
-                return "\n".join(full_markdown)
+            body = img.crop((0, top, img.width, bottom))
+            if top > 0 and header is not None:
+                tile = Image.new('RGB', (img.width, header.height + body.height), (255, 255, 255))
+                tile.paste(header, (0, 0))
+                tile.paste(body, (0, header.height))
+            else:
+                tile = body
+            tiles.append(tile)
+            top = bottom
+        
+        return tiles
 
-        except Exception as e:
-             print(f"    ⚠️  이미지 크기 확인 중 오류: {e}")
+    def _parse_tiled(self, tiles: List[str], table_title: str,
+                     tile_sizes: Optional[List[tuple]] = None) -> Optional[str]:
+        """타일 (base64) 병렬 파싱 후 merge_tables 로 하나의 Markdown 테이블로 재조립"""
+        title = table_title if table_title else 'N/A'
+        print(f"      🔹 {len(tiles)}개 타일 병렬 처리 중 (workers={self.tile_workers})...")
+        
+        def parse_tile(idx_tile):
+            idx, tile = idx_tile
+            part_title = f"{title} (Part {idx + 1}/{len(tiles)})"
+            markdown = self._request_markdown([tile], part_title,
+                                              image_sizes=[tile_sizes[idx]] if tile_sizes else None)
+            return markdown, self.last_truncated()
+        
+        with ThreadPoolExecutor(max_workers=self.tile_workers) as executor:
+            outputs = list(executor.map(parse_tile, enumerate(tiles)))
+        results = [markdown for markdown, _ in outputs]
+        # 타일 하나라도 잘렸으면 전체를 잘린 출력으로 표시
+        self._local.truncated = any(truncated for _, truncated in outputs)
+        
+        # 타일 하나라도 실패하면 행이 빠지므로 전체를 실패로 처리 (부분 결과를 캐시/기록하지 않음)
+        failed = [idx + 1 for idx, chunk_md in enumerate(results) if not chunk_md]
+        if failed:
+            print(f"      ⚠️  타일 {failed}/{len(tiles)} 파싱 실패 - 테이블 전체 실패 처리")
+            return None
+        
+        full_markdown = None
+        for chunk_md in results:
+            chunk_md = _strip_code_fence(chunk_md)
+            if full_markdown is None:
+                full_markdown = chunk_md
+                continue
+            
+            merged = merge_tables(full_markdown, chunk_md)
+            if merged is None:
+                # 헤더 텍스트가 다르게 인식된 경우: 컬럼 수가 같으면 데이터 행만 이어 붙임
+                prev_header = extract_table_header(full_markdown)
+                curr_header = extract_table_header(chunk_md)
+                if prev_header and curr_header and len(prev_header) == len(curr_header):
+                    merged = full_markdown + "\n" + "\n".join(chunk_md.strip().split('\n')[2:])
+                else:
+                    merged = full_markdown + "\n\n" + chunk_md
+            full_markdown = merged
+        
+        return full_markdown
 
-        # 일반 처리 (병합 가능한 경우)
-        return self._parse_images_internal(image_paths, table_title)
+    def _encode_pil_image(self, img: Image.Image) -> str:
+        """PIL 이미지를 PNG base64로 인코딩"""
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
 
-    def _parse_images_internal(self, image_paths: list, table_title: str) -> Optional[str]:
-        """실제 API 호출 로직 (기존 parse_table_images 내용 이동)"""
-        # 1. 이미지 로드 및 병합 (여러 장일 경우)
-        if len(image_paths) > 1:
-            try:
-                images = [Image.open(p) for p in image_paths]
-                
-                # 전체 크기 계산
-                total_width = max(img.width for img in images)
-                total_height = sum(img.height for img in images)
-                
-                # 새 이미지 생성 (흰색 배경)
-                merged_img = Image.new('RGB', (total_width, total_height), (255, 255, 255))
-                
-                # 이어 붙이기
-                y_offset = 0
-                for img in images:
-                    # 중앙 정렬 또는 왼쪽 정렬 (여기선 왼쪽)
-                    merged_img.paste(img, (0, y_offset))
-                    y_offset += img.height
-                
-                print(f"    ℹ️  {len(images)}개 이미지 병합 완료 ({total_width}x{total_height})")
-                
-                # Base64 인코딩
-                buffer = io.BytesIO()
-                merged_img.save(buffer, format="PNG")
-                img_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                images_base64 = [img_str]
-                
-            except Exception as e:
-                print(f"    ⚠️  이미지 병합 실패 (개별 처리 시도): {e}")
-                images_base64 = [self.encode_image(path) for path in image_paths]
-        else:
-            # 단일 이미지
-            images_base64 = [self.encode_image(image_paths[0])]
+    @staticmethod
+    def _image_size(image_base64: str) -> tuple:
+        """base64 이미지 크기 (헤더만 읽음)"""
+        with Image.open(io.BytesIO(base64.b64decode(image_base64))) as img:
+            return img.size
+
+    def parse_table_batch(self, items: List[tuple]) -> List[Optional[str]]:
+        """
+        작은 테이블 여러 개를 한 번의 요청으로 파싱 (micro-batching)
+        
+        이미지마다 번호를 붙여 함께 보내고, 응답을 "### TABLE k" 마커로 다시 분리
+        분리 결과가 검증 (마커 누락, 테이블 없음, 컬럼 수 불일치) 을 통과하지 못한
+        테이블만 개별 요청으로 재시도
+        
+        Args:
+            items: [(image_path, table_title), ...]
+            
+        Returns:
+            items 순서의 Markdown 리스트 (실패 시 None)
+            항목별 출처 (배치 / 개별 재시도) 와 잘림 여부는 last_batch_info() 로 확인
+        """
+        info = [{"batched": False, "truncated": False} for _ in items]
+        self._local.batch_info = info
+        if not items:
+            return []
+        if len(items) == 1:
+            markdown = self.parse_table_images([items[0][0]], items[0][1])
+            info[0]["truncated"] = self.last_truncated()
+            return [markdown]
         
-        # 2. 프롬프트 생성 (항상 단일 이미지 처리)
-        prompt = f"""Please convert this table image to Markdown format.
+        results = [None] * len(items)
+        try:
+            images_base64 = [self.encode_image(path) for path, _ in items]
+            response = self._request_markdown(images_base64, None, batch_titles=[title for _, title in items])
+            parts = self._split_batch_response(response or "", len(items))
+            if parts and self.last_truncated():
+                # num_predict 도달: 마지막 테이블만 잘릴 수 있음 (앞 테이블은 다음 마커가 나왔으므로 완결)
+                # -> 마지막 테이블은 개별 요청으로 재시도
+                parts.pop(max(parts))
+        except Exception as e:
+            print(f"    ⚠️  배치 요청 실패 (개별 처리): {e}")
+            parts = {}
+        
+        for idx, markdown in parts.items():
+            header, rows = split_markdown_table(markdown)
+            if header and rows and all(len(row) == len(header) for row in rows):
+                results[idx] = markdown
+                info[idx]["batched"] = True
+        
+        failed = [idx for idx, markdown in enumerate(results) if markdown is None]
+        if failed:
+            print(f"    ⚠️  배치 분리 실패 {len(failed)}/{len(items)}개 -> 개별 요청")
+            for idx in failed:
+                path, title = items[idx]
+                results[idx] = self.parse_table_images([path], title)
+                info[idx]["truncated"] = self.last_truncated()
+        return results
+    
+    def _split_batch_response(self, response: str, count: int) -> Dict[int, str]:
+        """배치 응답을 "### TABLE k" 마커 기준으로 분리 ({0-based index: markdown})"""
+        parts = {}
+        chunks = re.split(r"^[ \t]*#+[ \t]*TABLE[ \t]+(\d+)[^\n]*$", _strip_code_fence(response), flags=re.MULTILINE)
+        # chunks = [앞부분, 번호1, 내용1, 번호2, 내용2, ...]
+        for number, body in zip(chunks[1::2], chunks[2::2]):
+            idx = int(number) - 1
+            body = _strip_code_fence(body.strip())
+            if 0 <= idx < count and idx not in parts and body:
+                parts[idx] = body
+        return parts
+    
+    def _request_markdown(self, images_base64: list, table_title: str,
+                          text_lines: Optional[List[str]] = None,
+                          batch_titles: Optional[List[str]] = None,
+                          image_sizes: Optional[List[tuple]] = None) -> Optional[str]:
+        """
+        테이블 이미지(base64) -> Markdown API 호출
+        
+        text_lines 가 있으면 text-layer guided 프롬프트,
+        batch_titles 가 있으면 이미지마다 별도 테이블인 micro-batch 프롬프트
+        """
+        # 2. 프롬프트 생성 (배치가 아니면 항상 단일 이미지 처리)
+        if batch_titles:
+            prompt = self._batch_prompt(batch_titles)
+        elif text_lines:
+            prompt = self._text_guided_prompt(table_title, text_lines)
+        else:
+            prompt = f"""Please convert this table image to Markdown format.
 
 Table Title: {table_title if table_title else 'N/A'}
 
@@ -145,32 +719,82 @@ Requirements:
 
 Output the Markdown table directly."""
         
-        # API 요청
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "images": images_base64,
-            "stream": False,
-            "options": {
-                "temperature": 0.1,
-                "num_ctx": 8192
-            }
-        }
+        self._local.truncated = False
+        options = dict(self.TABLE_OPTIONS)
+        plan = None
+        if LLM_DYNAMIC_CONTEXT:
+            # 입력 토큰 추정으로 context / 출력 상한 결정 (기존 num_ctx 는 하한)
+            expected_output = int(token_estimator.text_tokens("\n".join(text_lines)) * 1.5) if text_lines else None
+            plan = token_estimator.plan(prompt, image_sizes or [self._image_size(b) for b in images_base64],
+                                        expected_output=expected_output, min_ctx=self.TABLE_OPTIONS["num_ctx"],
+                                        min_predict=self.TABLE_MIN_PREDICT)
+            options.update(num_ctx=plan["num_ctx"], num_predict=plan["num_predict"])
         
         try:
             # 타임아웃을 10분으로 증가 (병합된 대형 테이블 이미지 처리용)
-            response = requests.post(self.api_url, json=payload, timeout=600)
-            response.raise_for_status()
-            
-            result = response.json()
-            markdown = result.get('response', '').strip()
-            
-            return markdown
+            result = self.backend.generate(self.model, prompt, images_base64, options, timeout=600)
+            if plan:
+                token_estimator.record(plan, result["prompt_tokens"])
+                if result["done_reason"] == "length":
+                    # 추정 출력 상한에 걸림 -> 상한 없이 (기존 방식) 한 번 재시도
+                    print(f"      ↻ num_predict {options['num_predict']} 도달 - 출력 상한 없이 재시도")
+                    options.pop("num_predict")
+                    result = self.backend.generate(self.model, prompt, images_base64, options, timeout=600)
+            self._local.truncated = result["done_reason"] == "length"
+            return result["text"]
             
         except Exception as e:
             print(f"❌ Error parsing images: {e}")
             return None
     
+    def _text_guided_prompt(self, table_title: str, text_lines: List[str]) -> str:
+        """
+        PDF text layer 를 함께 제공하는 프롬프트
+        
+        셀 텍스트는 PDF 단어를 그대로 쓰고, 모델은 row/column 배치만 결정하도록 유도
+        """
+        text_block = "\n".join(text_lines)
+        return f"""Please convert this table image to Markdown format.
+
+Table Title: {table_title if table_title else 'N/A'}
+
+The exact text of this table, taken from the PDF text layer, is listed below.
+Each line is one visual text line: [y=...] followed by text runs with their x position (pixels from the left edge of the image).
+
+PDF TEXT:
+{text_block}
+
+Requirements:
+1. Use ONLY the PDF TEXT above for cell content. Copy it exactly; do NOT re-read values from the image.
+2. Use the image only to decide the table structure: which text belongs to which row and column.
+3. Use standard Markdown table syntax with | and -.
+4. Text lines wrapped inside one cell belong to the same cell; join them with <br>. Use only the internal horizontal lines of the table to distinguish rows.
+5. Every PDF TEXT run must appear in exactly one cell. Do not drop or invent text.
+6. Do NOT add any explanations, just output the Markdown table.
+
+Output the Markdown table directly."""
+    
+    def _batch_prompt(self, titles: List[Optional[str]]) -> str:
+        """micro-batch 프롬프트: 이미지 순서대로 번호를 붙인 독립 테이블들"""
+        title_block = "\n".join(f"TABLE {idx}: {title if title else 'N/A'}"
+                                 for idx, title in enumerate(titles, 1))
+        return f"""You are given {len(titles)} separate table images. Convert EACH image to its own Markdown table.
+
+Images in order, with their titles:
+{title_block}
+
+Requirements:
+1. Process the images in the given order. Image 1 is TABLE 1, image 2 is TABLE 2, and so on.
+2. Before each table output a marker line exactly like: ### TABLE 1
+3. Output exactly {len(titles)} tables. Never merge tables from different images.
+4. Extract ALL text from each table accurately and preserve its rows and columns.
+5. Use standard Markdown table syntax with | and -.
+6. Do NOT split multi-line cell content into separate rows. Keep them in a single row using <br> if necessary.
+7. Keep all numerical values and special characters exactly as shown.
+8. Do NOT add any explanations, just output the markers and the Markdown tables.
+
+Output the marked Markdown tables directly."""
+    
     def parse_figure_image(self, image_path: str) -> Optional[str]:
         """
         그림 이미지를 설명으로 변환
@@ -195,26 +819,18 @@ Requirements:
 
 Provide a clear description of the figure."""
         
-        # API 요청
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "images": [image_base64],
-            "stream": False,
-            "options": {
-                "temperature": 0.3,
-                "num_ctx": 4096
-            }
-        }
+        options = {"temperature": 0.3, "num_ctx": 4096}
+        plan = None
+        if LLM_DYNAMIC_CONTEXT:
+            plan = token_estimator.plan(prompt, [self._image_size(image_base64)],
+                                        expected_output=1024, min_ctx=options["num_ctx"])
+            options.update(num_ctx=plan["num_ctx"], num_predict=plan["num_predict"])
         
         try:
-            response = requests.post(self.api_url, json=payload, timeout=300)
-            response.raise_for_status()
-            
-            result = response.json()
-            description = result.get('response', '').strip()
-            
-            return description
+            result = self.backend.generate(self.model, prompt, [image_base64], options, timeout=300)
+            if plan:
+                token_estimator.record(plan, result["prompt_tokens"])
+            return result["text"]
             
         except Exception as e:
             print(f"❌ Error parsing {image_path}: {e}")
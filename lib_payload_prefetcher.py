@@ -0,0 +1,99 @@
+"""
+테이블 요청 payload 백그라운드 준비 (producer/consumer)
+
+이미지 로드/병합/타일 분할/PNG·base64 인코딩이 모델 요청 직전에 worker 에서 실행되면
+그동안 GPU 가 놀게 되므로, producer thread 가 제출 순서대로 다음 그룹의 payload 를 미리 준비
+
+- 각 이미지는 LLMTableParser.prepare_table_request() 에서 한 번만 디코딩
+- 준비된 payload 수는 depth 개로 제한 (semaphore, worker 가 요청을 끝내면 반환) -> 메모리 상한
+- worker 가 payload 를 기다린 시간 (= 준비가 늦어 모델이 기다린 시간) 을 집계
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class TablePayloadPrefetcher:
+    """step4 테이블 그룹 payload prefetch"""
+
+    def __init__(self, parser, depth: int = 8, skip: Optional[Callable[[Dict], bool]] = None):
+        """
+        Args:
+            parser: LLMTableParser (prepare_table_request 제공)
+            depth: 미리 준비해 둘 최대 payload 수
+            skip: True 를 반환하는 작업은 준비하지 않음 (캐시 hit 등)
+        """
+        self.parser = parser
+        self.depth = max(1, depth)
+        self.skip = skip
+        self._slots = threading.Semaphore(self.depth)
+        self._events: Dict[int, threading.Event] = {}
+        self._prepared: Dict[int, Optional[dict]] = {}
+        self._holding = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.prepare_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.prepared_count = 0
+
+    def start(self, jobs: List[Dict]):
+        """jobs 는 worker 가 가져가는 순서 (제출 순서) 와 같아야 함"""
+        for job in jobs:
+            self._events[id(job)] = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(jobs,), name="table-prefetch", daemon=True)
+        self._thread.start()
+
+    def _produce(self, jobs: List[Dict]):
+        for job in jobs:
+            key = id(job)
+            try:
+                if self._stop.is_set():
+                    return
+                if self.skip is not None and self.skip(job):
+                    continue
+                self._slots.acquire()
+                with self._lock:
+                    self._holding.add(key)
+                start = time.time()
+                prepared = self.parser.prepare_table_request(job['image_paths'], job['group_title'],
+                                                             job.get('text_lines'))
+                self.prepare_seconds += time.time() - start
+                self.prepared_count += 1
+                self._prepared[key] = prepared
+            except Exception as e:
+                print(f"    ⚠️  payload 준비 실패 ({job.get('group_title')}): {e}")
+            finally:
+                self._events[key].set()
+
+    def take(self, job: Dict) -> Optional[dict]:
+        """작업의 payload 반환 (준비될 때까지 대기, 준비하지 않은 작업은 None)"""
+        event = self._events.get(id(job))
+        if event is None:
+            return None
+        start = time.time()
+        event.wait()
+        with self._lock:
+            self.wait_seconds += time.time() - start
+        return self._prepared.pop(id(job), None)
+
+    def release(self, job: Dict):
+        """요청 완료 후 slot 반환 (다음 payload 준비 허용)"""
+        with self._lock:
+            if id(job) not in self._holding:
+                return
+            self._holding.discard(id(job))
+        self._prepared.pop(id(job), None)
+        self._slots.release()
+
+    def stop(self):
+        self._stop.set()
+        # producer 가 slot 대기 중이면 깨움
+        self._slots.release()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def report(self) -> str:
+        return (f"Prefetch: {self.prepared_count} payloads prepared in background ({self.prepare_seconds:.1f}s CPU), "
+                f"workers waited {self.wait_seconds:.1f}s for payloads (depth={self.depth})")
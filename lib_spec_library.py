@@ -0,0 +1,220 @@
+"""
+library DB 읽기 전용 조회 API (SpecLibrary)
+
+server.py, step7, 임시 스크립트가 각자 JSON/Markdown 파일을 다시 읽는 대신
+step6 이 만든 library DB 를 공통 경로로 조회
+
+- 읽기 전용 connection pool (WAL 이므로 step6 실행 중에도 일관된 snapshot 조회)
+- 고정 SQL 문 -> connection 별 prepared statement cache 재사용
+- 자주 조회되는 섹션은 LRU cache, DB 내용이 바뀌면 (PRAGMA data_version) 전체 무효화
+
+사용 예:
+    lib = SpecLibrary()
+    section = lib.section("output_tcg", "4.2")          # 섹션 + 첨부
+    children = lib.children("output_tcg", "4.2")         # 바로 아래 하위 섹션
+    tables = lib.tables("%Log Page%")                    # 제목 패턴 (LIKE)
+    figures = lib.attachments_by_pages("output_tcg", 10, 12, kind="figure")
+"""
+
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from common_parameter import LIBRARY_DB_PATH, LIBRARY_DB_BUSY_TIMEOUT
+
+SQL_DOCUMENTS = "SELECT id, name, description, pdf_path, pdf_hash, page_count, parsed_at, synced_at FROM documents ORDER BY name"
+SQL_SECTION = '''
+SELECT id, document_id, section_index, section_pid, title, level, start_page, end_page, page_range, text_content
+FROM sections WHERE document_id = ? AND section_pid = ?
+ORDER BY section_index LIMIT 1
+'''
+# "4.2" 의 하위 섹션: "4.2." <= pid < "4.2/" 범위 (ux_sections_natural 인덱스 범위 검색)
+SQL_DESCENDANTS = '''
+SELECT id, document_id, section_index, section_pid, title, level, start_page, end_page, page_range
+FROM sections WHERE document_id = ? AND section_pid >= ? AND section_pid < ?
+ORDER BY section_index
+'''
+SQL_SECTION_ATTACHMENTS = '''
+SELECT id, section_id, type, unique_id, title, page_num, bbox, image_path, markdown_content
+FROM attachments WHERE section_id = ?
+ORDER BY id
+'''
+SQL_TABLES_BY_TITLE = '''
+SELECT a.id, a.section_id, a.type, a.unique_id, a.title, a.page_num, a.image_path, a.markdown_content,
+       s.section_pid, d.name AS document
+FROM attachments a
+JOIN sections s ON s.id = a.section_id
+JOIN documents d ON d.id = s.document_id
+WHERE a.type = 'table' AND a.title LIKE ? AND (? IS NULL OR d.id = ?)
+ORDER BY d.name, s.section_index, a.id
+LIMIT ?
+'''
+SQL_ATTACHMENTS_BY_PAGES = '''
+SELECT a.id, a.section_id, a.type, a.unique_id, a.title, a.page_num, a.bbox, a.image_path, a.markdown_content,
+       s.section_pid
+FROM sections s
+JOIN attachments a ON a.section_id = s.id
+WHERE s.document_id = ? AND s.start_page <= ? AND s.end_page >= ?
+  AND a.page_num BETWEEN ? AND ? AND (? IS NULL OR a.type = ?)
+ORDER BY a.page_num, a.id
+'''
+
+
+class SpecLibrary:
+    """library DB 조회 (thread-safe, connection pool + LRU cache)"""
+
+    def __init__(self, db_path: str = LIBRARY_DB_PATH, pool_size: int = 4, cache_size: int = 256):
+        """
+        Args:
+            db_path: library DB 경로 (읽기 전용으로 열림)
+            pool_size: 동시에 사용할 수 있는 connection 수
+            cache_size: LRU cache 에 보관할 섹션 수
+        """
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._pool = queue.Queue()
+        self._versions = {}  # id(conn) -> 마지막으로 본 data_version
+        for _ in range(max(1, pool_size)):
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False,
+                                   timeout=LIBRARY_DB_BUSY_TIMEOUT, cached_statements=64)
+            conn.row_factory = sqlite3.Row
+            self._versions[id(conn)] = conn.execute("PRAGMA data_version").fetchone()[0]
+            self._pool.put(conn)
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._generation = 0  # invalidate() 마다 증가 (무효화 전에 읽은 값은 cache 에 넣지 않음)
+        self._doc_ids = {}
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def _conn(self):
+        """pool 에서 connection 대여 (DB 가 바뀌었으면 cache 무효화)"""
+        conn = self._pool.get()
+        try:
+            # data_version 은 다른 connection 이 commit 하면 바뀜 (step6 / step6b 실행)
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._versions[id(conn)]:
+                self._versions[id(conn)] = version
+                self.invalidate()
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def invalidate(self):
+        """cache 전체 비우기"""
+        with self._cache_lock:
+            self._cache.clear()
+            self._doc_ids.clear()
+            self._generation += 1
+
+    def _cache_get(self, key):
+        """(cached 값 또는 None, 현재 generation) - generation 은 _cache_put 에 전달"""
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key], self._generation
+            self.misses += 1
+            return None, self._generation
+
+    def _cache_put(self, key, value, generation):
+        """조회 이후 다른 thread 가 무효화했으면 (generation 변경) 이전 snapshot 값이므로 저장 안 함"""
+        with self._cache_lock:
+            if generation != self._generation:
+                return
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # 조회
+    # ------------------------------------------------------------------
+    def documents(self) -> List[Dict]:
+        """등록된 문서 목록 (메타데이터 포함)"""
+        with self._conn() as conn:
+            return [dict(row) for row in conn.execute(SQL_DOCUMENTS)]
+
+    def document_id(self, document: str) -> Optional[int]:
+        """
+        문서 이름 -> id
+
+        step6 의 문서 이름은 "{OUTPUT_DIR}.db" 이므로 OUTPUT_DIR ("output_tcg") 로도 조회 가능
+        """
+        with self._conn() as conn:
+            with self._cache_lock:
+                if document in self._doc_ids:
+                    return self._doc_ids[document]
+                generation = self._generation
+            row = conn.execute("SELECT id FROM documents WHERE name IN (?, ?) ORDER BY name = ? DESC LIMIT 1",
+                               (document, f"{document}.db", document)).fetchone()
+            doc_id = row[0] if row else None
+            if doc_id is not None:
+                with self._cache_lock:
+                    if generation == self._generation:
+                        self._doc_ids[document] = doc_id
+        return doc_id
+
+    def section(self, document: str, section_pid: str) -> Optional[Dict]:
+        """섹션 (본문 + attachments 목록), 없으면 None"""
+        key = ("section", document, section_pid)
+        doc_id = self.document_id(document)
+        if doc_id is None:
+            return None
+        # cache 조회도 connection 대여 후 (data_version 확인 -> 바뀌었으면 무효화된 뒤 조회)
+        with self._conn() as conn:
+            cached, generation = self._cache_get(key)
+            if cached is not None:
+                return cached
+            row = conn.execute(SQL_SECTION, (doc_id, section_pid)).fetchone()
+            if row is None:
+                return None
+            section = dict(row)
+            section["attachments"] = [dict(a) for a in conn.execute(SQL_SECTION_ATTACHMENTS, (section["id"],))]
+            self._cache_put(key, section, generation)
+        return section
+
+    def children(self, document: str, section_pid: str) -> List[Dict]:
+        """바로 아래 하위 섹션 ("4.2" -> "4.2.1", "4.2.2", ... / 빈 pid 는 최상위 섹션)"""
+        doc_id = self.document_id(document)
+        if doc_id is None:
+            return []
+        prefix = f"{section_pid}." if section_pid else ""
+        with self._conn() as conn:
+            if prefix:
+                rows = conn.execute(SQL_DESCENDANTS, (doc_id, prefix, f"{section_pid}/")).fetchall()
+            else:
+                rows = conn.execute(SQL_DESCENDANTS, (doc_id, "", "\uffff")).fetchall()
+        return [dict(row) for row in rows
+                if row["section_pid"] and "." not in row["section_pid"][len(prefix):]]
+
+    def tables(self, title_pattern: str, document: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """제목 패턴 (SQL LIKE, 예: "%Log Page%") 으로 테이블 조회 (document 없으면 전체 문서)"""
+        doc_id = self.document_id(document) if document else None
+        if document and doc_id is None:
+            return []
+        with self._conn() as conn:
+            return [dict(row) for row in conn.execute(SQL_TABLES_BY_TITLE, (title_pattern, doc_id, doc_id, limit))]
+
+    def attachments_by_pages(self, document: str, start_page: int, end_page: int,
+                             kind: Optional[str] = None) -> List[Dict]:
+        """페이지 범위 내 attachments (kind: "table" | "figure" | None=전체)"""
+        doc_id = self.document_id(document)
+        if doc_id is None:
+            return []
+        with self._conn() as conn:
+            return [dict(row) for row in conn.execute(
+                SQL_ATTACHMENTS_BY_PAGES, (doc_id, end_page, start_page, start_page, end_page, kind, kind))]
+
+    def cache_info(self) -> Dict:
+        with self._cache_lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "max_size": self.cache_size}
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
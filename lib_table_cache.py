@@ -0,0 +1,93 @@
+"""
+테이블 Markdown 캐시 - 이미지 내용 해시 기반 영구 캐시
+
+step3 가 이미지를 다시 생성하거나 step2 가 JSON 을 다시 써도
+픽셀이 같은 테이블은 LLM 을 다시 호출하지 않도록 table_md 를 보관
+
+키: sha256(이미지 바이트들 + 모델 + 프롬프트 버전 + 옵션)
+파일명/경로는 키에 포함하지 않으므로 이름이 바뀌거나 다른 문서로 옮겨져도 재사용됨
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+
+class TableMarkdownCache:
+    """content-addressed table_md 캐시 (SQLite)"""
+    
+    def __init__(self, db_path: str = "table_md_cache.db"):
+        """
+        Args:
+            db_path: 캐시 DB 경로 (여러 문서가 공유 가능)
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # step4 의 여러 worker thread 가 공유하므로 lock 으로 직렬화
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_md_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT,
+            prompt_version TEXT,
+            markdown TEXT NOT NULL,
+            source_name TEXT,       -- 마지막으로 저장한 이미지 파일명 (참고용)
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        self.conn.commit()
+        
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(image_paths: List[str], signature: dict) -> str:
+        """
+        이미지 바이트 해시 + 파싱 설정으로 캐시 키 생성
+        
+        Args:
+            image_paths: 그룹 이미지 경로 (순서 유지)
+            signature: LLMTableParser.cache_signature() 결과
+        """
+        h = hashlib.sha256()
+        for path in image_paths:
+            with open(path, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        h.update(json.dumps(signature, sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """캐시 조회 (없으면 None)"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT markdown FROM table_md_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+        if row:
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        return None
+    
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM table_md_cache WHERE cache_key = ?", (key,)
+            ).fetchone() is not None
+    
+    def put(self, key: str, markdown: str, signature: dict, source_name: str = None):
+        """캐시 저장 (같은 키는 덮어씀)"""
+        with self._lock:
+            self.conn.execute('''
+            INSERT OR REPLACE INTO table_md_cache (cache_key, model, prompt_version, markdown, source_name)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (key, signature.get('model'), signature.get('prompt_version'), markdown, source_name))
+            self.conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,96 @@
+"""
+테이블 Markdown -> 행/셀 relation (step6 table_rows / table_cells)
+
+"Bytes 511:508 에 있는 필드", "0xC0 을 가지는 행" 같은 질의를 SQL 인덱스로 처리하기 위해
+테이블 Markdown 을 한 번 파싱하여 셀 단위로 저장
+
+정규화:
+- hex_value: 셀 안의 첫 hex 값 (0xC0, C0h, "00 00 00 0B<br>00 00 00 01" UID 형식)
+  -> 소문자, 0x/h/공백/_ 제거, 앞쪽 0 제거 ("0x00C0" == "C0h" == "c0")
+- byte_start / byte_end: Byte/Offset 컬럼의 "511:508", "8 - 15", "4" -> (작은 값, 큰 값)
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from lib_table_validator import split_markdown_table
+
+_HEX_PREFIX = re.compile(r"\b0x([0-9a-f][0-9a-f_]*)\b", re.IGNORECASE)
+_HEX_SUFFIX = re.compile(r"\b((?=[0-9a-f]*\d)[0-9a-f]+)h\b", re.IGNORECASE)  # 숫자 포함 필수 ("each" 제외)
+_HEX_BYTES = re.compile(r"^(?:[0-9a-f]{2}\s+){3,}[0-9a-f]{2}$", re.IGNORECASE)  # UID "00 00 00 0B 00 00 00 01"
+_BYTE_RANGE = re.compile(r"^(\d+)(?:\s*(?::|-|–|to)\s*(\d+))?$", re.IGNORECASE)
+_BYTE_HEADER = re.compile(r"\b(bytes?|offset)\b", re.IGNORECASE)
+
+
+def clean_cell(text: str) -> str:
+    """Markdown 서식 제거 (굵게, <br>)"""
+    text = re.sub(r"<br\s*/?>", " ", text, flags=re.IGNORECASE)
+    text = text.replace("**", "").replace("__", "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def normalize_hex(text: str) -> Optional[str]:
+    """셀의 첫 hex 값 정규화 (없으면 None)"""
+    if _HEX_BYTES.match(text):
+        digits = text.replace(" ", "")
+    else:
+        match = _HEX_PREFIX.search(text) or _HEX_SUFFIX.search(text)
+        if not match:
+            return None
+        digits = match.group(1).replace("_", "")
+    return digits.lower().lstrip("0") or "0"
+
+
+def normalize_byte_range(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """Byte 범위 정규화 ("511:508" -> (508, 511))"""
+    match = _BYTE_RANGE.match(text)
+    if not match:
+        return None, None
+    first = int(match.group(1))
+    second = int(match.group(2)) if match.group(2) else first
+    return min(first, second), max(first, second)
+
+
+def parse_table_cells(markdown: str) -> List[Tuple[str, List[Dict]]]:
+    """
+    테이블 Markdown -> 행 리스트
+
+    Returns:
+        [(row_text, [{"col_index", "header", "text", "hex_value", "byte_start", "byte_end"}, ...]), ...]
+        row_text 는 셀을 " | " 로 연결한 문자열, 빈 행은 제외하지 않음 (row_index 유지)
+    """
+    if not markdown:
+        return []
+    header, rows = split_markdown_table(markdown)
+    if header is None:
+        return []
+    header = [clean_cell(h) for h in header]
+    rows = [[clean_cell(c) for c in row] for row in rows]
+
+    # 헤더가 "Byte(s)"/"Offset" 인 컬럼, 또는 bit-layout 테이블 ("| **Byte** | | ..." 행) 의 첫 컬럼
+    byte_columns = {idx for idx, h in enumerate(header) if _BYTE_HEADER.search(h)}
+    byte_row = next((idx for idx, row in enumerate(rows) if row and row[0].lower() in ("byte", "bytes")), None)
+    if byte_row is not None:
+        byte_columns.add(0)
+        # bit-layout: "Byte" 행 바로 위의 bit 번호 행 (| | 7 | 6 | ...) 을 셀 헤더로 사용
+        # "Byte" 행이 첫 데이터 행이면 Markdown 헤더 자체가 bit 번호 행 (| Bit | 7 | 6 | ...)
+        bits = rows[byte_row - 1] if byte_row > 0 else header
+        header = [f"Bit {bits[idx]}" if idx < len(bits) and bits[idx].isdigit() else h
+                  for idx, h in enumerate(header)]
+        header[0] = rows[byte_row][0]
+
+    parsed = []
+    for row in rows:
+        cells = []
+        for col_index, text in enumerate(row):
+            byte_start, byte_end = normalize_byte_range(text) if col_index in byte_columns else (None, None)
+            cells.append({
+                "col_index": col_index,
+                "header": header[col_index] if col_index < len(header) else None,
+                "text": text,
+                "hex_value": normalize_hex(text),
+                "byte_start": byte_start,
+                "byte_end": byte_end,
+            })
+        parsed.append((" | ".join(row), cells))
+    return parsed
@@ -0,0 +1,219 @@
+"""
+테이블 파싱 라우터 - fitz fast path / LLM escalation 결정
+
+단순한 테두리 격자 테이블은 PyMuPDF find_tables() 결과가 정확하므로
+품질 점수를 계산해 기준을 통과하면 바로 Markdown 으로 사용하고,
+복잡한 테이블 (병합 셀, 중첩 테이블, 그림 포함, 여러 페이지) 만 LLM 으로 보냄
+
+주의: fitz Document 는 thread-safe 하지 않으므로 route() 는 한 thread 에서만 호출할 것
+"""
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+
+from layout_helper import cells_to_markdown
+
+
+class FitzTableRouter:
+    """fitz 추출 결과 점수화 및 accept/escalate 판정"""
+
+    # 판정 기준
+    MIN_FILL_RATIO = 0.5         # 비어있지 않은 셀 비율
+    MIN_COLUMN_CONSISTENCY = 0.6 # 컬럼 절반 이상이 채워진 데이터 행 비율
+    MIN_TEXT_COVERAGE = 0.9      # bbox 내 PDF 단어 중 셀 텍스트에 포함된 비율
+    MIN_AREA_COVERAGE = 0.7      # 검출된 테이블 bbox / 요청 bbox 면적 비율
+
+    def __init__(self, pdf_path: str):
+        """
+        Args:
+            pdf_path: 원본 PDF 경로
+        """
+        self.doc = fitz.open(str(pdf_path))
+        self.stats = Counter()
+
+    def _to_pdf_rect(self, page: fitz.Page, bbox: List[float]) -> fitz.Rect:
+        """JSON bbox (DeepSeek 1000-based) -> PDF 좌표 (step3 와 동일한 변환)"""
+        scale_x = page.rect.width / 1000.0
+        scale_y = page.rect.height / 1000.0
+        rect = fitz.Rect(bbox[0] * scale_x, bbox[1] * scale_y, bbox[2] * scale_x, bbox[3] * scale_y)
+        # step3 테이블 이미지 여백과 동일하게 약간 확장
+        rect.x0 = max(0, rect.x0 - 2)
+        rect.y0 = max(0, rect.y0 - 2)
+        rect.x1 = min(page.rect.width, rect.x1 + 2)
+        rect.y1 = min(page.rect.height, rect.y1 + 5)
+        return rect
+
+    def score_table(self, page_num: int, bbox: List[float]) -> Tuple[Optional[List[List[str]]], Dict]:
+        """
+        bbox 영역의 fitz 테이블 추출 및 품질 점수 계산
+
+        Args:
+            page_num: 페이지 번호 (1-based)
+            bbox: JSON bbox (1000-based)
+
+        Returns:
+            (cells 또는 None, 점수 dict - 'reason' 이 있으면 escalate 사유)
+        """
+        if page_num < 1 or page_num > len(self.doc):
+            return None, {"reason": "invalid_page"}
+
+        page = self.doc[page_num - 1]
+        rect = self._to_pdf_rect(page, bbox)
+        if rect.is_empty:
+            return None, {"reason": "invalid_bbox"}
+
+        tables = list(page.find_tables(clip=rect))
+        if not tables:
+            return None, {"reason": "no_table"}
+        if len(tables) > 1:
+            # 테이블 안의 테이블 또는 여러 테이블이 하나로 잡힌 경우
+            return None, {"reason": "nested_tables"}
+
+        table = tables[0]
+        cells = table.extract()
+        scores = {"rows": len(cells), "cols": len(cells[0]) if cells else 0}
+        if scores["rows"] < 2 or scores["cols"] < 2:
+            return None, dict(scores, reason="too_small")
+
+        # 검출 범위: 일부 ruling line 만 잡혀 테이블이 잘린 경우 방지
+        table_rect = fitz.Rect(table.bbox)
+        scores["area_coverage"] = round(table_rect.get_area() / rect.get_area(), 3) if rect.get_area() else 0.0
+
+        # 병합 셀 (rowspan/colspan): fitz 는 None 으로 표시
+        merged = sum(1 for row in cells for c in row if c is None)
+        scores["merged_cells"] = merged
+
+        # 셀 채움 비율
+        total = sum(len(row) for row in cells)
+        filled = sum(1 for row in cells for c in row if c and c.strip())
+        scores["fill_ratio"] = round(filled / total, 3) if total else 0.0
+
+        # 컬럼 일관성: 데이터 행마다 절반 이상의 컬럼이 채워져 있는지
+        half = (scores["cols"] + 1) // 2
+        data_rows = cells[1:]
+        consistent = sum(1 for row in data_rows if sum(1 for c in row if c and c.strip()) >= half)
+        scores["column_consistency"] = round(consistent / len(data_rows), 3) if data_rows else 0.0
+
+        # 페이지 텍스트와 일치도: 테이블 영역의 PDF 단어가 셀 텍스트에 얼마나 포함되는지
+        page_words = Counter(w[4] for w in page.get_text("words", clip=table_rect))
+        cell_words = Counter(word for row in cells for c in row if c for word in c.split())
+        matched = sum((page_words & cell_words).values())
+        scores["text_coverage"] = round(matched / sum(page_words.values()), 3) if page_words else 0.0
+
+        # 테이블 내부 이미지 (그림이 있는 row)
+        scores["embedded_images"] = sum(
+            1 for info in page.get_image_info() if fitz.Rect(info["bbox"]).intersects(table_rect)
+        )
+
+        if scores["embedded_images"]:
+            scores["reason"] = "embedded_image"
+        elif merged:
+            scores["reason"] = "merged_cells"
+        elif scores["area_coverage"] < self.MIN_AREA_COVERAGE:
+            scores["reason"] = "partial_detection"
+        elif scores["fill_ratio"] < self.MIN_FILL_RATIO:
+            scores["reason"] = "low_fill"
+        elif scores["column_consistency"] < self.MIN_COLUMN_CONSISTENCY:
+            scores["reason"] = "column_mismatch"
+        elif scores["text_coverage"] < self.MIN_TEXT_COVERAGE:
+            scores["reason"] = "text_mismatch"
+
+        return cells, scores
+
+    def extract_text_layer(self, page_num: int, bbox: List[float], dpi: int = 120,
+                           gap: float = 6.0) -> Tuple[List[str], List[str]]:
+        """
+        테이블 영역의 PDF 단어를 좌표와 함께 추출 (text-layer guided 프롬프트용)
+
+        Args:
+            page_num: 페이지 번호 (1-based)
+            bbox: JSON bbox (1000-based)
+            dpi: 테이블 이미지 DPI (좌표를 이미지 픽셀로 변환)
+            gap: 같은 줄에서 이 간격(pt) 이상 떨어진 단어는 별도 text run 으로 분리
+
+        Returns:
+            (프롬프트용 라인 리스트 "[y=..] (x=..) text | (x=..) text", 단어 리스트)
+        """
+        page = self.doc[page_num - 1]
+        rect = self._to_pdf_rect(page, bbox)
+        scale = dpi / 72
+
+        # (x0, y0, x1, y1, word, block_no, line_no, word_no)
+        words = page.get_text("words", clip=rect)
+        lines = {}
+        for w in words:
+            lines.setdefault((w[5], w[6]), []).append(w)
+
+        text_lines = []
+        for line_words in sorted(lines.values(), key=lambda ws: (round(ws[0][1]), ws[0][0])):
+            line_words.sort(key=lambda w: w[0])
+            runs = []
+            for w in line_words:
+                if runs and w[0] - runs[-1]["x1"] < gap:
+                    runs[-1]["text"] += " " + w[4]
+                    runs[-1]["x1"] = w[2]
+                else:
+                    runs.append({"x0": w[0], "x1": w[2], "text": w[4]})
+            y = int((line_words[0][1] - rect.y0) * scale)
+            text_lines.append(f"[y={y}] " + " | ".join(
+                f"(x={int((r['x0'] - rect.x0) * scale)}) {r['text']}" for r in runs))
+
+        return text_lines, [w[4] for w in words]
+
+    def detect_header(self, page_num: int, bbox: List[float]) -> Optional[List[str]]:
+        """bbox 영역에서 fitz 가 검출한 테이블의 첫 행 (헤더) - 검증용"""
+        page = self.doc[page_num - 1]
+        tables = list(page.find_tables(clip=self._to_pdf_rect(page, bbox)))
+        if not tables:
+            return None
+        cells = tables[0].extract()
+        return [c or "" for c in cells[0]] if cells else None
+
+    def route(self, regions: List[Dict]) -> Tuple[Optional[str], Dict]:
+        """
+        테이블 그룹 라우팅
+
+        Args:
+            regions: 그룹 내 테이블 영역 [{"page": int, "bbox": [...], "merged_count": int}, ...]
+
+        Returns:
+            (accept 시 Markdown / escalate 시 None, 점수 dict)
+        """
+        if len(regions) != 1 or regions[0].get("merged_count", 1) > 1:
+            # 여러 페이지에 걸친 테이블은 step3 에서 이미지로만 합쳐지므로 LLM 으로
+            scores = {"reason": "multi_part"}
+        else:
+            try:
+                cells, scores = self.score_table(regions[0]["page"], regions[0]["bbox"])
+            except Exception as e:
+                cells, scores = None, {"reason": f"error: {e}"}
+
+            if cells is not None and "reason" not in scores:
+                self.stats["accepted"] += 1
+                return cells_to_markdown(cells), scores
+
+        self.stats["escalated"] += 1
+        self.stats[f"escalated:{scores['reason'].split(':')[0]}"] += 1
+        return None, scores
+
+    def report(self) -> str:
+        """accept/escalate 비율 요약"""
+        accepted = self.stats["accepted"]
+        escalated = self.stats["escalated"]
+        total = accepted + escalated
+        if not total:
+            return "Fast path: no tables routed"
+
+        lines = [f"Fast path: accepted {accepted}/{total} ({accepted / total:.1%}), "
+                 f"escalated {escalated}/{total} ({escalated / total:.1%})"]
+        for key, count in sorted(self.stats.items()):
+            if key.startswith("escalated:"):
+                lines.append(f"  - {key.split(':', 1)[1]}: {count}")
+        return "\n".join(lines)
+
+    def close(self):
+        if self.doc:
+            self.doc.close()
+
@@ -0,0 +1,174 @@
+"""
+테이블 Markdown 검증 유틸리티
+
+LLM 이 만든 table_md 를 자동 검증
+1. 컬럼 수 일관성
+2. fitz 로 검출한 헤더와 일치 여부
+3. bbox 내 PDF 단어 포함률 (누락/환각)
+4. 구조 검증: 헤더 중복 (병합되지 않은 continuation), 이미지 ruling line 대비 행 수,
+   num_predict 도달로 잘린 출력
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+
+def split_markdown_table(markdown: str) -> Tuple[Optional[List[str]], List[List[str]]]:
+    """
+    Markdown 에서 첫 번째 테이블의 헤더와 데이터 행 추출
+
+    Returns:
+        (헤더 셀 리스트 또는 None, 데이터 행 리스트)
+    """
+    header = None
+    rows = []
+    for line in markdown.splitlines():
+        line = line.strip()
+        if not line.startswith("|"):
+            if header is not None and rows:
+                break  # 첫 테이블 끝
+            continue
+        # 구분선 (|---|:---|) 제외
+        if set(line) <= set("|-: "):
+            continue
+        cells = [c.strip() for c in line.strip().strip("|").split("|")]
+        if header is None:
+            header = cells
+        else:
+            rows.append(cells)
+    return header, rows
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^0-9a-z]+", "", text.replace("<br>", " ").lower())
+
+
+def text_agreement(markdown: str, pdf_words: List[str]) -> Dict:
+    """
+    Markdown 테이블 셀 텍스트와 PDF 단어 비교
+
+    Returns:
+        {"precision": 출력 단어 중 PDF 에 있는 비율 (환각 검출),
+         "recall": PDF 단어 중 출력에 있는 비율 (누락 검출)}
+    """
+    out_words = Counter()
+    for line in markdown.splitlines():
+        line = line.strip()
+        if not line.startswith("|") or set(line) <= set("|-: "):
+            continue
+        for cell in line.strip("|").split("|"):
+            out_words.update(cell.replace("<br>", " ").split())
+
+    pdf_counter = Counter(pdf_words)
+    matched = sum((out_words & pdf_counter).values())
+    out_total = sum(out_words.values())
+    pdf_total = sum(pdf_counter.values())
+    return {
+        "precision": round(matched / out_total, 3) if out_total else 0.0,
+        "recall": round(matched / pdf_total, 3) if pdf_total else 0.0,
+    }
+
+
+def verify_table_markdown(markdown: str,
+                          fitz_header: Optional[List[str]] = None,
+                          pdf_words: Optional[List[str]] = None,
+                          min_header_match: float = 0.8,
+                          min_recall: float = 0.9) -> Tuple[bool, Dict]:
+    """
+    LLM 테이블 출력 자동 검증 (cascade 의 tier 통과 기준)
+
+    Args:
+        markdown: LLM 출력
+        fitz_header: fitz find_tables() 로 검출한 헤더 셀 (없으면 검사 생략)
+        pdf_words: bbox 내 PDF 단어 (없으면 검사 생략)
+        min_header_match: 헤더 셀 일치 비율 기준
+        min_recall: PDF 단어 포함률 기준
+
+    Returns:
+        (통과 여부, 검사 결과 dict - 실패 시 'reason' 포함)
+    """
+    header, rows = split_markdown_table(markdown or "")
+    checks = {}
+    if not header or not rows:
+        return False, {"reason": "no_table"}
+
+    # 1. 컬럼 수 일관성
+    bad_rows = sum(1 for row in rows if len(row) != len(header))
+    checks["cols"] = len(header)
+    checks["rows"] = len(rows)
+    checks["bad_rows"] = bad_rows
+    if bad_rows:
+        return False, dict(checks, reason="column_mismatch")
+
+    # 2. fitz 헤더 일치
+    if fitz_header:
+        expected = [_normalize(c) for c in fitz_header if c and _normalize(c)]
+        actual = {_normalize(c) for c in header}
+        if expected:
+            checks["header_match"] = round(sum(1 for c in expected if c in actual) / len(expected), 3)
+            if checks["header_match"] < min_header_match:
+                return False, dict(checks, reason="header_mismatch")
+
+    # 3. PDF 단어 포함률
+    if pdf_words:
+        agreement = text_agreement(markdown, pdf_words)
+        checks.update(agreement)
+        if agreement["recall"] < min_recall:
+            return False, dict(checks, reason="low_text_coverage")
+
+    return True, checks
+
+
+def validate_table_structure(markdown: str,
+                             ruling_rows: Optional[int] = None,
+                             truncated: bool = False,
+                             min_row_ratio: float = 0.8,
+                             max_row_ratio: float = 1.5) -> Tuple[bool, Dict]:
+    """
+    LLM 테이블 출력 구조 검증 (이미지/응답 정보만 사용, PDF 불필요)
+
+    Args:
+        markdown: LLM 출력
+        ruling_rows: 이미지 가로 ruling line 으로 센 행 수 (헤더 포함, 없으면 검사 생략)
+        truncated: 응답이 num_predict 에 도달해 잘렸는지 (done_reason == "length")
+        min_row_ratio: 행 수 / ruling_rows 하한 (행 누락)
+        max_row_ratio: 행 수 / ruling_rows 상한 (여러 줄 셀이 행으로 분리됨)
+
+    Returns:
+        (통과 여부, 검사 결과 dict - 실패 시 'reason' 과 전체 'reasons' 포함)
+    """
+    header, rows = split_markdown_table(markdown or "")
+    if not header or not rows:
+        return False, {"reason": "no_table", "reasons": ["no_table"]}
+
+    reasons = []
+    checks = {"cols": len(header), "rows": len(rows)}
+
+    # 1. 출력 잘림
+    if truncated:
+        reasons.append("truncated")
+
+    # 2. 컬럼 수 일관성
+    checks["bad_rows"] = sum(1 for row in rows if len(row) != len(header))
+    if checks["bad_rows"]:
+        reasons.append("column_mismatch")
+
+    # 3. 헤더 중복 (페이지마다 반복된 헤더가 데이터 행으로 남은 경우)
+    header_key = [_normalize(c) for c in header]
+    checks["header_repeats"] = sum(1 for row in rows if [_normalize(c) for c in row] == header_key)
+    if checks["header_repeats"]:
+        reasons.append("header_duplicated")
+
+    # 4. 이미지 ruling line 대비 행 수 (선이 너무 적으면 신뢰할 수 없으므로 생략)
+    if ruling_rows and ruling_rows >= 3:
+        checks["ruling_rows"] = ruling_rows
+        total_rows = len(rows) + 1
+        if total_rows < ruling_rows * min_row_ratio:
+            reasons.append("missing_rows")
+        elif total_rows > ruling_rows * max_row_ratio:
+            reasons.append("extra_rows")
+
+    if reasons:
+        return False, dict(checks, reason=reasons[0], reasons=reasons)
+    return True, checks
@@ -0,0 +1,130 @@
+"""
+요청별 입력 토큰 추정 및 num_ctx / num_predict 결정
+
+고정 num_ctx (8192) 는 작은 테이블에서는 KV cache 를 낭비하고 prefill 이 느려지며,
+큰 테이블에서는 입력이 잘려도 알 수 없음
+-> 이미지 patch 수 + 텍스트 길이로 prompt 토큰을 추정하여 요청마다 context 크기 결정
+
+- 이미지: Qwen-VL 계열은 patch 16px, 2x2 merge -> 32x32px 당 1 토큰
+- 텍스트: 토크나이저 없이 문자 수 기반 (영문 약 3.5자/토큰, CJK 1자/토큰)
+- 실제 prompt_eval_count 와 비교하여 보정 계수를 지수 이동 평균으로 갱신
+
+주의: Ollama 는 num_ctx 가 바뀌면 모델 runner 를 다시 로드하므로
+num_ctx 는 호출부의 기존 고정값을 하한으로 2의 거듭제곱 bucket 으로만 올림
+(대부분의 요청은 기존 크기 그대로, 큰 입력만 확장 / num_predict 는 reload 없음)
+"""
+
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-鿿가-힯]")
+
+
+class TokenEstimator:
+    """prompt 토큰 추정 + context 크기 계획 + 실제값 기반 보정"""
+
+    IMAGE_TOKEN_PX = 32        # patch 16px x merge 2
+    IMAGE_OVERHEAD = 4         # 이미지당 vision start/end 등 특수 토큰
+    CHARS_PER_TOKEN = 3.5      # 영문/기호 텍스트
+    TEMPLATE_OVERHEAD = 32     # chat template 토큰
+
+    MIN_CTX = 4096
+    MAX_CTX = 32768
+    MIN_PREDICT = 512
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.scale = 1.0  # 실제 / 추정 보정 계수
+        self.samples = []  # (예측, 실제)
+
+    def text_tokens(self, text: str) -> int:
+        """텍스트 토큰 수 추정 (CJK 는 글자당 1 토큰)"""
+        if not text:
+            return 0
+        cjk = len(_CJK_PATTERN.findall(text))
+        return int(math.ceil(cjk + (len(text) - cjk) / self.CHARS_PER_TOKEN))
+
+    def image_tokens(self, width: int, height: int) -> int:
+        """이미지 토큰 수 추정 (32x32px 당 1 토큰)"""
+        return (math.ceil(width / self.IMAGE_TOKEN_PX) * math.ceil(height / self.IMAGE_TOKEN_PX)
+                + self.IMAGE_OVERHEAD)
+
+    def prompt_tokens(self, prompt: str, image_sizes: Optional[List[Tuple[int, int]]] = None) -> int:
+        """보정 계수를 적용한 prompt 토큰 추정"""
+        raw = self.text_tokens(prompt) + self.TEMPLATE_OVERHEAD
+        raw += sum(self.image_tokens(w, h) for w, h in image_sizes or [])
+        return int(raw * self.scale)
+
+    def _bucket(self, tokens: int, min_ctx: int) -> int:
+        ctx = min_ctx
+        while ctx < tokens and ctx < self.MAX_CTX:
+            ctx *= 2
+        return ctx
+
+    def plan(self, prompt: str, image_sizes: Optional[List[Tuple[int, int]]] = None,
+             expected_output: Optional[int] = None, max_output: int = 8192,
+             min_ctx: int = MIN_CTX, min_predict: int = MIN_PREDICT) -> Dict:
+        """
+        요청 context 계획
+
+        Args:
+            prompt: 프롬프트 텍스트
+            image_sizes: 이미지 (width, height) 리스트
+            expected_output: 예상 출력 토큰 (없으면 입력 토큰과 동일하게 가정 - 테이블 전사)
+            max_output: num_predict 상한
+            min_ctx: num_ctx 하한 (기존 고정값을 주면 작은 요청에서 runner reload 없음)
+            min_predict: num_predict 하한 (max_output 을 넘지 않음)
+
+        Returns:
+            {"prompt_tokens": 추정 입력, "num_ctx": context 크기, "num_predict": 출력 상한,
+             "scale": 추정에 사용한 보정 계수}
+        """
+        prompt_tokens = self.prompt_tokens(prompt, image_sizes)
+        if expected_output is None:
+            # 테이블 전사: 출력 텍스트 ~ 이미지 내용 (+ Markdown 구분자 여유)
+            content = sum(self.image_tokens(w, h) for w, h in image_sizes or []) or prompt_tokens
+            expected_output = int(content * 1.2)
+        min_predict = min(min_predict, max_output)
+        num_predict = min(max_output, max(min_predict, expected_output))
+        num_ctx = self._bucket(prompt_tokens + num_predict, min_ctx)
+        # bucket 상한에 걸리면 출력 상한을 남은 공간으로 줄임
+        num_predict = max(min_predict, min(num_predict, num_ctx - prompt_tokens))
+        return {"prompt_tokens": prompt_tokens, "num_ctx": num_ctx, "num_predict": num_predict,
+                "scale": self.scale}
+
+    def fit_text(self, text: str, budget_tokens: int) -> str:
+        """텍스트를 토큰 예산 이내로 자름 (문자 수 기준 고정 cut 대체)"""
+        if self.text_tokens(text) * self.scale <= budget_tokens:
+            return text
+        # 비율로 자른 뒤 예산 이내가 될 때까지 줄임
+        cut = int(len(text) * budget_tokens / max(1.0, self.text_tokens(text) * self.scale))
+        while cut > 0 and self.text_tokens(text[:cut]) * self.scale > budget_tokens:
+            cut = int(cut * 0.95)
+        return text[:cut]
+
+    def record(self, plan: Dict, actual: Optional[int]):
+        """실제 prompt_eval_count 기록 및 보정 계수 갱신 (plan: plan() 결과)"""
+        predicted = plan.get("prompt_tokens")
+        if not actual or not predicted:
+            return
+        with self._lock:
+            self.samples.append((predicted, actual))
+            raw = predicted / plan.get("scale", 1.0)
+            # 이상값 (이미지 resize 등) 에 끌려가지 않도록 범위 제한
+            ratio = min(2.0, max(0.5, actual / raw))
+            self.scale = round(0.8 * self.scale + 0.2 * ratio, 4)
+
+    def report(self) -> str:
+        """예측 vs 실제 prompt 토큰 요약"""
+        if not self.samples:
+            return "Token estimator: no samples (backend did not report prompt tokens)"
+        errors = [abs(p - a) / a for p, a in self.samples]
+        under = sum(1 for p, a in self.samples if p < a)
+        return (f"Token estimator: {len(self.samples)} requests, MAPE {sum(errors) / len(errors):.1%}, "
+                f"under-estimated {under}, scale {self.scale}")
+
+
+# 프로세스 공용 estimator (보정 계수 공유)
+token_estimator = TokenEstimator()
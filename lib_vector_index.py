@@ -0,0 +1,400 @@
+"""
+library DB 섹션/테이블 semantic 검색용 로컬 벡터 인덱스
+
+키워드 검색 (lib_library_search, FTS5) 이 놓치는 다른 표현의 질의를 위해
+섹션/테이블 chunk 를 로컬 embedding 모델로 벡터화하여 cosine top-k 검색
+
+- chunk: 섹션 (제목 + 문단 묶음) / 테이블 (제목 + 헤더 + 행 묶음), EMBED_CHUNK_CHARS 이하
+- 벡터: float32 memmap 행렬 (L2 정규화 -> cosine = 내적), library DB 옆 파일
+- 메타데이터: library DB 의 embedding_chunks (slot = 행렬 행 번호)
+- 증분 갱신: sections / attachments.content_hash 가 바뀐 행만 다시 embedding,
+  사라진 행의 slot 은 비워 두고 다음 chunk 에 재사용
+- 검색: NumPy 행렬-벡터 곱 + argpartition (CPU, 수만 chunk 에서 수 ms)
+
+사용 예:
+    index = VectorIndex()
+    index.update()  # step6b_vector_index.py
+    for hit in index.search("how to erase all user data", k=5):
+        print(hit["score"], hit["document"], hit["section_pid"], hit["title"])
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from common_parameter import (LIBRARY_DB_PATH, LIBRARY_DB_BUSY_TIMEOUT, EMBED_MODEL, EMBED_BATCH_SIZE,
+                              EMBED_CHUNK_CHARS, EMBED_INDEX_PATH)
+from lib_llm_client import get_backend
+
+KINDS = ("section", "table")
+
+
+def chunk_section(title: str, text: str, max_chars: int = EMBED_CHUNK_CHARS) -> List[str]:
+    """섹션 본문을 문단 단위로 묶어 chunk 생성 (각 chunk 앞에 제목)"""
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text or "") if p.strip()]
+    pieces = []
+    for para in paragraphs:
+        # 긴 문단은 고정 길이로 자름
+        pieces.extend(para[i:i + max_chars] for i in range(0, len(para), max_chars))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+
+    title = (title or "").strip()
+    if not chunks:
+        return [title] if title else []
+    return [f"{title}\n\n{chunk}" if title else chunk for chunk in chunks]
+
+
+def chunk_table(title: str, markdown: str, max_chars: int = EMBED_CHUNK_CHARS) -> List[str]:
+    """테이블 Markdown 을 행 묶음으로 나눠 chunk 생성 (각 chunk 에 제목 + 헤더 행 반복)"""
+    table_lines = [line for line in (markdown or "").splitlines() if line.strip().startswith("|")]
+    if len(table_lines) < 3:
+        return chunk_section(title, markdown, max_chars)
+
+    head = "\n".join([(title or "").strip()] + table_lines[:2]).strip()
+    chunks, rows = [], []
+    size = len(head)
+    for line in table_lines[2:]:
+        if rows and size + len(line) + 1 > max_chars:
+            chunks.append("\n".join([head] + rows))
+            rows, size = [], len(head)
+        rows.append(line[:max_chars])
+        size += len(line) + 1
+    if rows:
+        chunks.append("\n".join([head] + rows))
+    return chunks
+
+
+class VectorIndex:
+    """float32 memmap 벡터 인덱스 (메타데이터는 library DB)"""
+
+    GROW_SLOTS = 1024  # 행렬 최소 증가 단위
+
+    def __init__(self, db_path: str = LIBRARY_DB_PATH, vector_path: Optional[str] = None,
+                 model: str = EMBED_MODEL, backend=None, batch_size: int = EMBED_BATCH_SIZE):
+        """
+        Args:
+            db_path: library DB 경로
+            vector_path: 벡터 파일 경로 (없으면 EMBED_INDEX_PATH 또는 "{DB 이름}_vectors.f32")
+            model: embedding 모델
+            backend: LLMBackend (없으면 설정의 backend, 검색만 할 때도 질의 embedding 에 사용)
+            batch_size: 요청당 chunk 수
+        """
+        self.db_path = db_path
+        self.vector_path = vector_path or EMBED_INDEX_PATH or f"{os.path.splitext(db_path)[0]}_vectors.f32"
+        self.model = model
+        self.backend = backend or get_backend()
+        self.batch_size = max(1, batch_size)
+
+        # 검색용 캐시 (DB data_version / 벡터 파일이 바뀌면 다시 로드)
+        self._read_conn = None
+        self._loaded_key = None
+        self._matrix = None
+        self._kind_codes = None
+        self._masks = {}
+        self.last_query_ms = 0.0
+
+    # ------------------------------------------------------------------
+    # 저장소
+    # ------------------------------------------------------------------
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False,
+                                   timeout=LIBRARY_DB_BUSY_TIMEOUT)
+        conn = sqlite3.connect(self.db_path, timeout=LIBRARY_DB_BUSY_TIMEOUT)
+        conn.isolation_level = None  # explicit transaction control
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    @staticmethod
+    def _ensure_schema(cursor):
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS embedding_chunks (
+            slot INTEGER PRIMARY KEY,  -- 벡터 행렬의 행 번호
+            kind TEXT,                 -- 'section' | 'table' (NULL: 빈 slot)
+            ref_id INTEGER,            -- sections.id / attachments.id
+            chunk_index INTEGER,
+            content_hash TEXT,         -- embedding 당시 원본 행의 content_hash
+            text TEXT
+        )
+        ''')
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_embedding_chunks ON embedding_chunks (kind, ref_id, chunk_index)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS embedding_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _open_matrix(self, slots: int, dim: int) -> np.memmap:
+        """slots 행 이상을 담는 벡터 파일을 쓰기 모드로 열기 (부족하면 파일 확장)"""
+        row_bytes = dim * 4
+        size = os.path.getsize(self.vector_path) if os.path.exists(self.vector_path) else 0
+        capacity = size // row_bytes
+        if capacity < slots:
+            capacity = max(slots, capacity * 2, self.GROW_SLOTS)
+            with open(self.vector_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        return np.memmap(self.vector_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+
+    # ------------------------------------------------------------------
+    # embedding
+    # ------------------------------------------------------------------
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """텍스트 리스트 -> L2 정규화된 float32 행렬"""
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        workers = min(len(batches), max(1, self.backend.max_concurrency)) or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda batch: self.backend.embed(self.model, batch), batches))
+        vectors = np.asarray([vec for batch in results for vec in batch], dtype=np.float32)
+        if len(vectors) != len(texts):
+            raise ValueError(f"Embedding count mismatch: {len(vectors)} vectors for {len(texts)} texts")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    @staticmethod
+    def _source_hashes(cursor) -> Dict[Tuple[str, int], Optional[str]]:
+        hashes = {("section", row_id): digest for row_id, digest in cursor.execute(
+            "SELECT id, content_hash FROM sections")}
+        hashes.update({("table", row_id): digest for row_id, digest in cursor.execute(
+            "SELECT id, content_hash FROM attachments WHERE type = 'table'")})
+        return hashes
+
+    @staticmethod
+    def _chunk_sources(cursor, keys: List[Tuple[str, int]]) -> List[Tuple[str, int, int, Optional[str], str]]:
+        """변경된 원본 행 -> [(kind, ref_id, chunk_index, content_hash, text), ...]"""
+        queries = {
+            "section": "SELECT id, content_hash, title, text_content FROM sections WHERE id IN ({})",
+            "table": "SELECT id, content_hash, title, markdown_content FROM attachments WHERE id IN ({})",
+        }
+        chunkers = {"section": chunk_section, "table": chunk_table}
+        chunks = []
+        for kind in KINDS:
+            ids = [ref_id for k, ref_id in keys if k == kind]
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                sql = queries[kind].format(", ".join("?" for _ in part))
+                for ref_id, digest, title, body in cursor.execute(sql, part).fetchall():
+                    for idx, text in enumerate(chunkers[kind](title, body)):
+                        chunks.append((kind, ref_id, idx, digest, text))
+        return chunks
+
+    def update(self) -> Dict:
+        """
+        변경된 섹션/테이블만 다시 embedding
+
+        embedding 요청은 DB 잠금 없이 수행하고, slot 할당/벡터 기록/메타데이터 갱신만
+        짧은 쓰기 트랜잭션에서 수행 (그동안 다시 바뀐 행은 다음 실행에서 처리)
+        새 벡터는 commit 된 빈 slot 또는 새 slot 에만 기록 (ROLLBACK 되어도 기존 벡터 유지)
+
+        Returns:
+            {"embedded_rows", "chunks", "removed_rows", "total_chunks", "embed_seconds"}
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        self._ensure_schema(cursor)
+        meta = dict(cursor.execute("SELECT key, value FROM embedding_meta").fetchall())
+        if meta.get("model") not in (None, self.model):
+            # 모델이 바뀌면 벡터 공간이 달라지므로 전체 재생성
+            cursor.execute("DELETE FROM embedding_chunks")
+            cursor.execute("DELETE FROM embedding_meta")
+            if os.path.exists(self.vector_path):
+                os.remove(self.vector_path)
+            meta = {}
+        cursor.execute("COMMIT")
+
+        # 1. 변경 계획 (읽기)
+        sources = self._source_hashes(cursor)
+        embedded = {(kind, ref_id): digest for kind, ref_id, digest in cursor.execute(
+            "SELECT DISTINCT kind, ref_id, content_hash FROM embedding_chunks WHERE kind IS NOT NULL")}
+        changed = [key for key, digest in sources.items() if key not in embedded or embedded[key] != digest]
+        chunks = self._chunk_sources(cursor, changed)
+
+        # 2. embedding (잠금 없음)
+        start = time.time()
+        vectors = self._embed([text for *_, text in chunks]) if chunks else None
+        embed_seconds = time.time() - start
+
+        # 3. 기록 (쓰기 트랜잭션)
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            sources = self._source_hashes(cursor)
+            embedded = {(kind, ref_id): digest for kind, ref_id, digest in cursor.execute(
+                "SELECT DISTINCT kind, ref_id, content_hash FROM embedding_chunks WHERE kind IS NOT NULL")}
+            # 벡터는 COMMIT 전에 memmap 에 기록되므로 이미 commit 된 빈 slot / 끝에 추가되는 slot 만 사용
+            # (이 트랜잭션에서 비우는 slot 을 재사용하면 ROLLBACK 시 기존 행의 벡터가 덮어써진 채 남음)
+            free = [slot for (slot,) in cursor.execute(
+                "SELECT slot FROM embedding_chunks WHERE kind IS NULL ORDER BY slot")]
+            next_slot = cursor.execute("SELECT COALESCE(MAX(slot), -1) + 1 FROM embedding_chunks").fetchone()[0]
+
+            # 원본이 바뀌었거나 사라진 행의 chunk -> 빈 slot (다음 실행부터 재사용)
+            stale = [key for key, digest in embedded.items() if key not in sources or sources[key] != digest]
+            cursor.executemany('''
+            UPDATE embedding_chunks SET kind = NULL, ref_id = NULL, chunk_index = NULL, content_hash = NULL, text = NULL
+            WHERE kind = ? AND ref_id = ?
+            ''', stale)
+            removed = sum(1 for key in stale if key not in sources)
+
+            # 그동안 원본이 다시 바뀐 행, 다른 실행이 이미 기록한 행은 제외
+            keep = [idx for idx, (kind, ref_id, _, digest, _) in enumerate(chunks)
+                    if (kind, ref_id) in sources and sources[(kind, ref_id)] == digest
+                    and ((kind, ref_id) not in embedded or embedded[(kind, ref_id)] != digest)]
+            if keep:
+                dim = vectors.shape[1]
+                if int(meta.get("dim", dim)) != dim:
+                    raise ValueError(f"Embedding dimension changed ({meta['dim']} -> {dim}) without a model change")
+                slots = free[:len(keep)]
+                slots += list(range(next_slot, next_slot + len(keep) - len(slots)))
+
+                matrix = self._open_matrix(max(slots) + 1, dim)
+                matrix[slots] = vectors[keep]
+                matrix.flush()
+                del matrix
+
+                cursor.executemany('''
+                INSERT OR REPLACE INTO embedding_chunks (slot, kind, ref_id, chunk_index, content_hash, text)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(slot,) + chunks[idx] for slot, idx in zip(slots, keep)])
+                cursor.executemany("INSERT OR REPLACE INTO embedding_meta (key, value) VALUES (?, ?)",
+                                   [("model", self.model), ("dim", str(dim))])
+            total = cursor.execute("SELECT COUNT(*) FROM embedding_chunks WHERE kind IS NOT NULL").fetchone()[0]
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            conn.close()
+            raise
+        conn.close()
+
+        return {
+            "embedded_rows": len({(chunks[idx][0], chunks[idx][1]) for idx in keep}),
+            "chunks": len(keep),
+            "removed_rows": removed,
+            "total_chunks": total,
+            "embed_seconds": round(embed_seconds, 2),
+        }
+
+    # ------------------------------------------------------------------
+    # 검색
+    # ------------------------------------------------------------------
+    def _load(self):
+        """벡터 행렬 + slot 별 kind 코드 로드 (DB 가 바뀐 경우에만 다시 로드)"""
+        if self._read_conn is None:
+            self._read_conn = self._connect(readonly=True)
+        cursor = self._read_conn.cursor()
+        data_version = cursor.execute("PRAGMA data_version").fetchone()[0]
+        mtime = os.path.getmtime(self.vector_path) if os.path.exists(self.vector_path) else None
+        if self._loaded_key == (data_version, mtime):
+            return
+
+        meta = dict(cursor.execute("SELECT key, value FROM embedding_meta").fetchall())
+        rows = cursor.execute("SELECT slot, kind FROM embedding_chunks").fetchall()
+        if not rows or "dim" not in meta or mtime is None:
+            self._matrix, self._kind_codes = None, None
+        else:
+            dim = int(meta["dim"])
+            used = max(slot for slot, _ in rows) + 1
+            capacity = os.path.getsize(self.vector_path) // (dim * 4)
+            self._matrix = np.memmap(self.vector_path, dtype=np.float32, mode="r", shape=(capacity, dim))[:used]
+            # 0: 빈 slot, 1..: KINDS 순서
+            codes = np.zeros(used, dtype=np.int8)
+            for slot, kind in rows:
+                if kind in KINDS:
+                    codes[slot] = KINDS.index(kind) + 1
+            self._kind_codes = codes
+        self._masks = {}
+        self._loaded_key = (data_version, mtime)
+
+    def search_vector(self, query_vector: np.ndarray, k: int = 10,
+                      kinds: Sequence[str] = KINDS) -> List[Tuple[int, float]]:
+        """정규화된 질의 벡터 -> [(slot, cosine), ...] (점수 내림차순)"""
+        self._load()
+        if self._matrix is None:
+            return []
+        start = time.perf_counter()
+        # 허용 slot mask 는 kinds 별로 캐시 (모든 slot 이 허용되면 mask 생략)
+        key = tuple(sorted(kinds))
+        if key not in self._masks:
+            allowed = np.isin(self._kind_codes, [KINDS.index(kind) + 1 for kind in kinds])
+            self._masks[key] = (None if allowed.all() else ~allowed, int(allowed.sum()))
+        blocked, allowed_count = self._masks[key]
+        k = min(k, allowed_count)
+        if k <= 0:
+            return []
+
+        scores = self._matrix @ np.asarray(query_vector, dtype=np.float32)
+        if blocked is not None:
+            scores[blocked] = -np.inf
+        top = np.argpartition(scores, len(scores) - k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        self.last_query_ms = (time.perf_counter() - start) * 1000
+        return [(int(slot), float(scores[slot])) for slot in top]
+
+    def search(self, query: str, k: int = 10, kinds: Sequence[str] = KINDS) -> List[Dict]:
+        """
+        semantic 검색 (cosine 유사도 내림차순)
+
+        Returns:
+            [{"kind", "ref_id", "chunk_index", "document", "section_pid", "title", "text", "score"}, ...]
+        """
+        hits = self.search_vector(self._embed([query])[0], k, kinds)
+        if not hits:
+            return []
+        placeholders = ", ".join("?" for _ in hits)
+        rows = self._read_conn.execute(f'''
+        SELECT e.slot, e.kind, e.ref_id, e.chunk_index, d.name, s.section_pid,
+               CASE WHEN e.kind = 'section' THEN s.title ELSE a.title END, e.text
+        FROM embedding_chunks e
+        LEFT JOIN attachments a ON e.kind = 'table' AND a.id = e.ref_id
+        LEFT JOIN sections s ON s.id = CASE WHEN e.kind = 'section' THEN e.ref_id ELSE a.section_id END
+        LEFT JOIN documents d ON d.id = s.document_id
+        WHERE e.slot IN ({placeholders})
+        ''', [slot for slot, _ in hits]).fetchall()
+        by_slot = {row[0]: row for row in rows}
+
+        results = []
+        for slot, score in hits:
+            if slot not in by_slot:
+                continue
+            _, kind, ref_id, chunk_index, document, section_pid, title, text = by_slot[slot]
+            results.append({"kind": kind, "ref_id": ref_id, "chunk_index": chunk_index, "document": document,
+                            "section_pid": section_pid, "title": title, "text": text, "score": round(score, 4)})
+        return results
+
+    def close(self):
+        if self._read_conn is not None:
+            self._read_conn.close()
+            self._read_conn = None
+        self._matrix = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="library DB semantic search")
+    parser.add_argument("query")
+    parser.add_argument("--db", default=LIBRARY_DB_PATH, help="library DB 경로")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kind", choices=KINDS, action="append", help="검색 대상 (반복 지정 가능)")
+    args = parser.parse_args()
+
+    index = VectorIndex(args.db)
+    try:
+        for hit in index.search(args.query, k=args.k, kinds=args.kind or KINDS):
+            preview = hit["text"].replace("\n", " ")[:100]
+            print(f"[{hit['kind']:7s}] {hit['score']:.3f}  {hit['document']}  {hit['section_pid'] or '-'}  "
+                  f"{hit['title']}\n          {preview}")
+        print(f"(vector search {index.last_query_ms:.1f} ms)")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
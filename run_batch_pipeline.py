@@ -2,6 +2,8 @@ import os
 import subprocess
 import sys
 
+import requests
+
 # ==============================================================================
 # Common Parameters (Merged from common_parameter.py)
 # ==============================================================================
@@ -42,12 +44,138 @@ STEPS = [
     # "step4_llm_parser.py",
     # "step5_markdown_converter.py",
     # "step6_db_migration.py",
+    # "step6b_vector_index.py",
     "step7_summary_generator.py",
     "step8_web_viewer_generator.py"
 ]
 
+# ==============================================================================
+# Model Residency (모델별 그룹 실행)
+# ==============================================================================
+# True: step 단위로 모든 문서를 처리 (같은 모델을 쓰는 작업을 모아서 실행)
+# False: 기존 방식 (문서별로 모든 step 실행 -> 문서마다 모델 재로딩)
+GROUP_BY_MODEL = True
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+KEEP_ALIVE = "30m"  # phase 동안 모델 상주 시간 (요청마다 갱신됨)
+
+# 스텝별 사용 모델 (모델이 없는 스텝은 생략)
+STEP_MODELS = {
+    "step1_layout_analyzer.py": ["deepseek-ocr:latest"],
+    "step4_llm_parser.py": [m.strip() for m in os.getenv("TABLE_CASCADE_MODELS", "").split(",") if m.strip()]
+                           or [os.getenv("TABLE_MODEL", "qwen3-vl:30b-a3b-instruct-q4_K_M")],
+    "step7_summary_generator.py": [os.getenv("SUMMARY_MODEL", "qwen3-vl:32b-instruct-q4_K_M")],
+}
+if os.getenv("LLM_BACKEND", "ollama") != "ollama":
+    # OpenAI 호환 서버 (vLLM 등) 는 모델 상주를 서버가 관리
+    STEP_MODELS.pop("step4_llm_parser.py")
+    STEP_MODELS.pop("step7_summary_generator.py")
+
+
+def ollama_load(model, keep_alive=KEEP_ALIVE):
+    """모델 warm-up (빈 프롬프트로 로드) 후 load_duration(초) 반환, 실패 시 None"""
+    try:
+        resp = requests.post(f"{OLLAMA_URL}/api/generate",
+                             json={"model": model, "prompt": "", "stream": False, "keep_alive": keep_alive},
+                             timeout=600)
+        resp.raise_for_status()
+        return resp.json().get("load_duration", 0) / 1e9
+    except Exception as e:
+        print(f"[WARN] Model warm-up failed ({model}): {e}")
+        return None
+
+
+def ollama_unload(model):
+    """모델 즉시 해제 (keep_alive=0)"""
+    try:
+        requests.post(f"{OLLAMA_URL}/api/generate",
+                      json={"model": model, "prompt": "", "stream": False, "keep_alive": 0},
+                      timeout=60)
+    except Exception as e:
+        print(f"[WARN] Model release failed ({model}): {e}")
+
+
+def run_step(step, config, env_base):
+    """단일 문서에 대해 스텝 실행 (성공 여부 반환)"""
+    env = env_base.copy()
+    env["PDF_PATH"] = config["PDF_PATH"]
+    env["OUTPUT_DIR"] = config["OUTPUT_DIR"]
+    
+    print(f"\n >> Running {step} for {config['OUTPUT_DIR']} ...")
+    try:
+        subprocess.run([sys.executable, step], env=env, check=True)
+        print(f" >> {step} Completed.")
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"\n[ERROR] Failed to run {step} for config: {config}")
+        print(f"Error details: {e}")
+        return False
+
+
+def run_pipeline_grouped():
+    """
+    모델별 그룹 실행: 스텝 단위로 모든 문서를 처리
+    
+    - 각 문서의 스텝 순서는 유지 (step1 -> step2 -> ...)
+    - 모델을 쓰는 스텝은 시작 전에 warm-up, 모든 문서 처리 후 해제
+    - warm-up 의 load_duration 을 측정하여 출력 (문서별 실행 대비 절감량은 추정치)
+    """
+    env_base = os.environ.copy()
+    env_base["PYTHONUNBUFFERED"] = "1"  # Force unbuffered output for real-time logs
+    env_base["LLM_KEEP_ALIVE"] = KEEP_ALIVE
+    
+    failed = set()  # 실패한 문서는 이후 스텝 생략
+    load_report = []  # (step, model, load_seconds)
+    
+    for step in STEPS:
+        models = STEP_MODELS.get(step, [])
+        targets = [c for c in CONFIGS if c["OUTPUT_DIR"] not in failed]
+        if not targets:
+            break
+        
+        print(f"\n{'='*60}")
+        print(f"Phase: {step} ({len(targets)} documents){' / model: ' + ', '.join(models) if models else ''}")
+        print(f"{'='*60}")
+        
+        # Warm-up (cascade 는 마지막 모델이 가장 크므로 앞 모델부터 로드)
+        for model in models:
+            load_sec = ollama_load(model)
+            if load_sec is not None:
+                load_report.append((step, model, load_sec))
+                print(f" >> Model ready: {model} (load_duration {load_sec:.1f}s)")
+        
+        for config in targets:
+            if not run_step(step, config, env_base):
+                print(f"[WARN] Skipping remaining steps for {config['OUTPUT_DIR']}.")
+                failed.add(config["OUTPUT_DIR"])
+        
+        # Release
+        for model in models:
+            ollama_unload(model)
+    
+    # 로딩 시간 리포트: 측정값은 grouped 실행의 warm-up 뿐
+    # 절감량은 문서별 실행이 문서마다 같은 시간으로 다시 로딩한다고 가정한 추정치 (측정 아님)
+    if load_report:
+        print(f"\n{'='*60}")
+        print("Model Residency Report")
+        total_load = sum(sec for _, _, sec in load_report)
+        docs = len(CONFIGS)
+        for step, model, sec in load_report:
+            print(f"  {step:30s} {model:40s} load {sec:6.1f}s")
+        print(f"  Loads: {len(load_report)} (grouped) vs ~{len(load_report) * docs} (per-document)")
+        print(f"  Load time (measured, grouped): {total_load:.1f}s")
+        print(f"  Reload time avoided (ESTIMATE, load x {docs - 1} extra documents, not measured): "
+              f"{total_load * (docs - 1):.1f}s")
+        print(f"{'='*60}")
+    
+    print("\nAll batch jobs finished.")
+
+
 def run_pipeline():
     """정의된 설정에 따라 파이프라인을 순차적으로 실행합니다."""
+    if GROUP_BY_MODEL:
+        return run_pipeline_grouped()
+    
     
     python_executable = sys.executable
 
@@ -1,11 +1,18 @@
 import os
+import re
 import sys
-from flask import Flask, send_from_directory, render_template_string, abort, redirect
+from flask import Flask, send_from_directory, render_template_string, abort, redirect, jsonify, request
 from pathlib import Path
 
+from common_parameter import LIBRARY_DB_PATH
+from lib_spec_library import SpecLibrary
+
 # Configuration
 DOC_ROOT = Path(".").absolute() # Server is running INSIDE the SSD_DOC root
 PORT = 8000
+# Step3 content-addressed images ({sha256}{ext}) never change -> cache forever
+HASHED_IMAGE_NAME = re.compile(r"[0-9a-f]{64}\.[a-z]+")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
 
 app = Flask(__name__, static_folder=None)
 
@@ -108,7 +115,13 @@ def serve_markdown(doc_name, filename):
 @app.route('/doc/<doc_name>/section_images/<path:filename>')
 def serve_images(doc_name, filename):
     path = DOC_ROOT / doc_name / "section_images"
-    return send_from_directory(path, filename)
+    response = send_from_directory(path, filename)
+    if HASHED_IMAGE_NAME.fullmatch(filename):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
     
 # 6. Serving Original Output Assets (in case they are referenced differently)
 @app.route('/doc/<doc_name>/output/<path:filename>')
@@ -118,6 +131,45 @@ def serve_output_alias(doc_name, filename):
     return send_from_directory(path, filename)
 
 
+# -----------------------------------------------------------------------------
+# Library API (library.db via SpecLibrary)
+# -----------------------------------------------------------------------------
+_library = None
+
+def get_library():
+    """Shared read-only SpecLibrary (created on first use)"""
+    global _library
+    if _library is None:
+        if not Path(LIBRARY_DB_PATH).exists():
+            abort(404, description=f"Library database not found: {LIBRARY_DB_PATH}")
+        _library = SpecLibrary(LIBRARY_DB_PATH)
+    return _library
+
+@app.route('/api/documents')
+def api_documents():
+    return jsonify(get_library().documents())
+
+@app.route('/api/doc/<doc_name>/section/<path:section_pid>')
+def api_section(doc_name, section_pid):
+    library = get_library()
+    section = library.section(doc_name, section_pid)
+    if section is None:
+        abort(404)
+    return jsonify(dict(section, children=library.children(doc_name, section_pid)))
+
+@app.route('/api/tables')
+def api_tables():
+    # e.g. /api/tables?title=%25Log%20Page%25&doc=output_ocp
+    title = request.args.get('title', '%')
+    return jsonify(get_library().tables(title, document=request.args.get('doc'),
+                                        limit=request.args.get('limit', 100, type=int)))
+
+@app.route('/api/doc/<doc_name>/pages/<int:start_page>-<int:end_page>')
+def api_pages(doc_name, start_page, end_page):
+    return jsonify(get_library().attachments_by_pages(doc_name, start_page, end_page,
+                                                      kind=request.args.get('kind')))
+
+
 if __name__ == '__main__':
     if not DOC_ROOT.exists():
         print(f"Creating missing root directory: {DOC_ROOT}")
@@ -1,28 +1,96 @@
 import fitz
+import hashlib
+import io
 import json
+import re
 from pathlib import Path
 from typing import Dict, List
 from PIL import Image
-from common_parameter import PDF_PATH, OUTPUT_DIR, TABLE_DPI
+from common_parameter import PDF_PATH, OUTPUT_DIR, TABLE_DPI, IMAGE_STORAGE_FORMAT, IMAGE_CONTENT_ADDRESSED
 from logger import setup_advanced_logger # error 시 Archive/logger.py 사용할 것 
 import logging
 
 logger = setup_advanced_logger(name="step3_image_generator", log_dir=OUTPUT_DIR, log_level=logging.INFO)
 
+# 저장 포맷별 확장자 (step4/step5/server 모두 image_path 를 그대로 사용)
+STORAGE_EXTENSIONS = {
+    "png": ".png",
+    "auto": ".png",
+    "palette": ".png",
+    "bilevel": ".png",
+    "webp": ".webp",
+}
+
+# content-addressed 이미지 파일 이름 ({sha256}{ext})
+HASHED_IMAGE_NAME = re.compile(r"[0-9a-f]{64}\.[a-z]+")
+
 
 class TableImageGenerator:
     """테이블/그림 이미지 생성기"""
     
-    def __init__(self, pdf_path: str, section_data_dir: str = "output/section_data"):
+    def __init__(self, pdf_path: str, section_data_dir: str = "output/section_data",
+                 storage_format: str = IMAGE_STORAGE_FORMAT,
+                 content_addressed: bool = IMAGE_CONTENT_ADDRESSED):
         """
         Args:
             pdf_path: PDF 파일 경로
             section_data_dir: 섹션 데이터 JSON 디렉토리
+            storage_format: 이미지 저장 포맷 (common_parameter.IMAGE_STORAGE_FORMAT 참고)
+            content_addressed: True 면 이미지를 내용 해시 이름 ({sha256}{ext}) 으로 저장
         """
         self.pdf_path = Path(pdf_path)
         self.doc = fitz.open(str(pdf_path))
         self.section_data_dir = Path(section_data_dir)
         
+        if storage_format not in STORAGE_EXTENSIONS:
+            logger.warning(f"  ⚠️ Unknown storage format '{storage_format}' - falling back to 'png'")
+            storage_format = "png"
+        self.storage_format = storage_format
+        
+        # 저장 크기 리포트용 (원본 RGB PNG 대비)
+        self.size_stats = {"count": 0, "raw_bytes": 0, "stored_bytes": 0, "upload_bytes": 0}
+        
+        # content-addressed 저장: 이번 실행에서 참조된 파일 이름 / 중복 통계
+        self.content_addressed = content_addressed
+        self.stored_names = set()
+        self.dedup_stats = {"images": 0, "duplicates": 0, "saved_bytes": 0}
+        
+    def _save_storage_image(self, img: Image.Image, output_path: Path) -> int:
+        """
+        설정된 저장 포맷으로 이미지 저장
+        
+        Args:
+            img: 저장할 PIL 이미지 (RGB)
+            output_path: 출력 파일 경로 (확장자는 STORAGE_EXTENSIONS 기준)
+            
+        Returns:
+            저장된 파일 크기 (bytes)
+        """
+        fmt = self.storage_format
+        
+        if fmt == "webp":
+            img.save(output_path, format="WEBP", lossless=True, method=6)
+        elif fmt == "bilevel":
+            # 흑백 line-art: 중간값 기준 1-bit 변환 (anti-aliasing 은 손실됨)
+            img.convert("L").point(lambda v: 255 if v >= 160 else 0).convert("1").save(output_path, format="PNG", optimize=True)
+        elif fmt == "palette":
+            img.convert("RGB").quantize(colors=16).save(output_path, format="PNG", optimize=True)
+        elif fmt == "auto":
+            rgb = img.convert("RGB")
+            r, g, b = rgb.split()
+            if r.tobytes() == g.tobytes() == b.tobytes():
+                # 회색조 이미지 -> 8-bit grayscale (무손실)
+                r.save(output_path, format="PNG", optimize=True)
+            elif rgb.getcolors(256) is not None:
+                # 256색 이하 -> palette (무손실)
+                rgb.convert("P", palette=Image.Palette.ADAPTIVE, colors=256).save(output_path, format="PNG", optimize=True)
+            else:
+                rgb.save(output_path, format="PNG", optimize=True)
+        else:
+            img.save(output_path, format="PNG")
+            
+        return output_path.stat().st_size
+        
     def generate_table_image(self, page_num: int, bbox: List[float], 
                             output_path: Path, 
                             margin_top: int = 2, margin_bottom: int = 5, 
@@ -124,7 +192,42 @@ class TableImageGenerator:
                                        margin_top=margin_top, margin_bottom=margin_bottom,
                                        margin_left=margin_left, margin_right=margin_right,
                                        dpi=TABLE_DPI)
-    
+
+    def _store_by_hash(self, image_path: Path):
+        """
+        저장된 이미지를 content-addressed 이름 ({sha256}{ext}) 으로 이동
+
+        같은 내용의 파일이 이미 있으면 새 파일은 지우고 기존 파일을 공유
+        (반복되는 범례/그림, 개정판 간 바뀌지 않은 테이블은 한 번만 저장)
+
+        Returns:
+            (저장된 파일 이름, sha256 hex)
+        """
+        digest = hashlib.sha256(image_path.read_bytes()).hexdigest()
+        stored_path = image_path.with_name(f"{digest}{image_path.suffix}")
+
+        self.dedup_stats["images"] += 1
+        if stored_path.name in self.stored_names:
+            self.dedup_stats["duplicates"] += 1
+            self.dedup_stats["saved_bytes"] += stored_path.stat().st_size
+
+        if stored_path.exists():
+            # 같은 이름 = 같은 내용이므로 기존 파일 유지 (mtime / 서버 캐시 키 불변)
+            image_path.unlink()
+        else:
+            image_path.replace(stored_path)
+        self.stored_names.add(stored_path.name)
+        return stored_path.name, digest
+
+    def _remove_unreferenced(self, output_dir: Path) -> int:
+        """이번 실행에서 참조되지 않은 content-addressed 이미지 삭제 (이전 실행의 잔여 파일)"""
+        removed = 0
+        for path in output_dir.iterdir():
+            if path.is_file() and HASHED_IMAGE_NAME.fullmatch(path.name) and path.name not in self.stored_names:
+                path.unlink()
+                removed += 1
+        return removed
+
     def _process_item_list(self, items: List[Dict], item_type: str, safe_id: str, safe_title: str, output_dir: Path, bbox_overrides: Dict = {}) -> List[Dict]:
         """
         아이템 리스트를 그룹화하고 이미지를 생성하는 공통 로직
@@ -178,7 +281,7 @@ class TableImageGenerator:
             
             # Naming: Table_ID_TITLE_Suffix
             base_name = f"{item_type}_{safe_id}_{safe_title}{group_suffix}"
-            final_image_name = f"{base_name}.png"
+            final_image_name = f"{base_name}{STORAGE_EXTENSIONS[self.storage_format]}"
             final_image_path = output_dir / final_image_name
             
             # Generate Parts
@@ -218,14 +321,28 @@ class TableImageGenerator:
                         for img in images:
                             merged_img.paste(img, (0, y))
                             y += img.height
-                        merged_img.save(final_image_path)
+                        raw_bytes = sum(p.stat().st_size for p in temp_images if p.exists())
+                        self._record_size(raw_bytes, self._save_storage_image(merged_img, final_image_path), final_image_path)
                     else:
                         logger.warning(f"  ⚠️ No images to merge for {base_name}")
                 except Exception as e:
                     logger.error(f"  ❌ Merge failed: {e}")
             else:
                 if temp_images[0].exists():
-                    temp_images[0].replace(final_image_path)
+                    if self.storage_format == "png":
+                        raw_bytes = temp_images[0].stat().st_size
+                        temp_images[0].replace(final_image_path)
+                        self._record_size(raw_bytes, raw_bytes)
+                    else:
+                        try:
+                            raw_bytes = temp_images[0].stat().st_size
+                            with Image.open(temp_images[0]) as img:
+                                stored_bytes = self._save_storage_image(img, final_image_path)
+                            self._record_size(raw_bytes, stored_bytes, final_image_path)
+                        except Exception as e:
+                            logger.error(f"  ❌ Storage encoding failed ({self.storage_format}): {e}")
+                            temp_images[0].replace(final_image_path.with_suffix(".png"))
+                            final_image_name = final_image_path.with_suffix(".png").name
             
             # Cleanup
             for p in temp_images:
@@ -233,6 +350,14 @@ class TableImageGenerator:
                 
             # Update JSON
             primary = group[0]
+            stored_path = output_dir / final_image_name
+            if self.content_addressed and stored_path.exists():
+                # image_name: 사람이 읽는 이름, image_path: 실제 파일 ({sha256}{ext})
+                primary['image_name'] = final_image_name
+                final_image_name, primary['image_hash'] = self._store_by_hash(stored_path)
+            else:
+                primary.pop('image_name', None)
+                primary.pop('image_hash', None)
             primary['image_path'] = final_image_name
             # If we detected a title, use it. Else use the generated base_name 
             # (but base_name is based on Section Title usually, which is generic).
@@ -341,6 +466,55 @@ class TableImageGenerator:
         logger.info(f"\n✅ 완료!")
         logger.info(f"총 테이블 이미지: {total_tables}개")
         logger.info(f"총 그림 이미지: {total_figures}개")
+        self.report_storage_size()
+        
+        if self.content_addressed:
+            removed = self._remove_unreferenced(output_path)
+            stats = self.dedup_stats
+            logger.info("\n=== Content-addressed Store ===")
+            logger.info(f"  Images       : {stats['images']}개 -> 파일 {len(self.stored_names)}개")
+            logger.info(f"  Duplicates   : {stats['duplicates']}개 ({stats['saved_bytes'] / 1024:.1f} KB 절약)")
+            logger.info(f"  Removed      : 참조되지 않는 이전 파일 {removed}개")
+    
+    def _record_size(self, raw_bytes: int, stored_bytes: int, stored_path: Path = None):
+        """저장 크기 통계 누적 (stored_path: LLM 전송 크기 계산용, 없으면 저장 크기 그대로)"""
+        self.size_stats["count"] += 1
+        self.size_stats["raw_bytes"] += raw_bytes
+        self.size_stats["stored_bytes"] += stored_bytes
+        self.size_stats["upload_bytes"] += self._upload_size(stored_path, stored_bytes) if stored_path else stored_bytes
+    
+    @staticmethod
+    def _upload_size(image_path: Path, stored_bytes: int) -> int:
+        """
+        LLM 으로 실제 전송되는 이미지 크기
+        
+        LLMTableParser.encode_image 는 PNG/JPEG 이외 포맷 (webp) 을 PNG 로 다시 인코딩하므로
+        webp 는 디스크 크기만 줄고 전송 크기는 줄지 않음
+        """
+        if image_path.suffix.lower() in ('.png', '.jpg', '.jpeg'):
+            return stored_bytes
+        with Image.open(image_path) as img:
+            buffer = io.BytesIO()
+            img.save(buffer, format="PNG")
+            return buffer.tell()
+    
+    def report_storage_size(self):
+        """저장 포맷 크기 리포트 (디스크 / base64 전송 크기)"""
+        stats = self.size_stats
+        if not stats["count"]:
+            return
+        
+        raw_mb = stats["raw_bytes"] / (1024 * 1024)
+        stored_mb = stats["stored_bytes"] / (1024 * 1024)
+        ratio = stats["stored_bytes"] / stats["raw_bytes"] if stats["raw_bytes"] else 1.0
+        # 전송 크기 (webp 는 PNG 재인코딩 후), base64 는 4/3 배
+        b64_mb = stats["upload_bytes"] / (1024 * 1024) * 4 / 3
+        
+        logger.info(f"\n=== Image Storage Report ({self.storage_format}) ===")
+        logger.info(f"  Images       : {stats['count']}개")
+        logger.info(f"  RGB PNG      : {raw_mb:.2f} MB")
+        logger.info(f"  Stored       : {stored_mb:.2f} MB ({ratio:.1%})")
+        logger.info(f"  Base64 (LLM) : {b64_mb:.2f} MB")
     
     def close(self):
         """문서 닫기"""
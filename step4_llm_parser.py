@@ -2,13 +2,32 @@
 섹션별 테이블 그룹화 및 LLM 파싱
 
 같은 제목의 연속된 테이블들을 그룹화하여 LLM에 한번에 전달
+여러 섹션의 테이블 그룹을 동시에 요청하고 (LLM_MAX_IN_FLIGHT),
+결과는 섹션 JSON 파일별 lock 으로 보호하여 해당 파일에 기록
+
+모든 LLM 결과는 구조 검증 (lib_table_validator.validate_table_structure) 결과를
+table_md_check 로 함께 기록하며, --reparse-failed 로 실패한 그룹만 다시 파싱 가능
 """
 
 from lib_llm_client import LLMTableParser
+from lib_table_cache import TableMarkdownCache
+from lib_table_router import FitzTableRouter
+from lib_table_validator import text_agreement, verify_table_markdown, validate_table_structure
+from lib_job_scheduler import TableJobScheduler
+from lib_token_estimator import token_estimator
+from lib_payload_prefetcher import TablePayloadPrefetcher
+import argparse
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict
-from common_parameter import PDF_PATH,OUTPUT_DIR
+from PIL import Image
+from typing import List, Dict, Optional, Tuple
+from tqdm import tqdm
+from common_parameter import (PDF_PATH, OUTPUT_DIR, TABLE_DPI, LLM_MAX_IN_FLIGHT, TABLE_MD_CACHE_PATH,
+                              TABLE_FAST_PATH, TABLE_TEXT_GUIDED, TABLE_CASCADE_MODELS,
+                              TABLE_MICRO_BATCH, TABLE_MICRO_BATCH_MAX_HEIGHT, TABLE_PREFETCH_DEPTH)
 from logger import setup_advanced_logger
 import logging
 
@@ -52,14 +71,46 @@ def group_tables_by_title(tables: List[Dict]) -> List[List[Dict]]:
     return groups
 
 
-def parse_section_tables(section_file: Path, image_dir: Path, parser: LLMTableParser):
+def _collect_group_images(group: List[Dict], image_dir: Path, verbose: bool = True) -> List[str]:
+    """그룹 테이블들의 이미지 경로 수집 (section_images -> section_images_recovery 순)"""
+    image_paths = []
+    for table in group:
+        if 'image_path' in table:
+            image_name = table['image_path']
+        else:
+            image_name = f"{table['id']}.png"
+            
+        image_path = image_dir / image_name
+        if image_path.exists():
+            image_paths.append(str(image_path))
+        else:
+            # Recovery 폴더 확인
+            recovery_path = image_dir.parent / "section_images_recovery" / image_name
+            if recovery_path.exists():
+                image_paths.append(str(recovery_path))
+            elif verbose:
+                logger.info(f"    ⚠️  이미지 없음: {image_name}")
+    return image_paths
+
+
+def collect_table_jobs(section_file: Path, image_dir: Path,
+                       cache: Optional[TableMarkdownCache] = None,
+                       reparse_failed: bool = False) -> List[Dict]:
     """
-    섹션의 모든 테이블을 그룹화하여 파싱
+    섹션의 테이블을 그룹화하여 아직 파싱되지 않은 그룹의 작업 목록 생성
+    
+    이미 table_md 가 있는 그룹은 캐시에 없으면 캐시에 등록 (이후 이미지 재생성 대비)
+    단, LLM 결과만 실제로 생성한 설정 (table_md_signature: 모델/프롬프트) 으로 등록하고
+    구조 검증 (table_md_check) 에 실패한 결과, fitz fast path 결과는 등록하지 않음
     
     Args:
         section_file: 섹션 JSON 파일
         image_dir: 이미지 디렉토리
-        parser: LLMTableParser 인스턴스
+        cache: table_md 캐시 (None 이면 사용 안 함)
+        reparse_failed: True 면 구조 검증 실패로 표시된 그룹만 작업으로 생성
+        
+    Returns:
+        작업 리스트 (section_file, 그룹 내 테이블 위치/ID, 이미지 경로, 제목)
     """
     # 섹션 데이터 로드
     try:
@@ -67,99 +118,598 @@ def parse_section_tables(section_file: Path, image_dir: Path, parser: LLMTablePa
             section_data = json.load(f)
     except Exception as e:
         logger.info(f"❌ 파일 읽기 실패: {section_file.name} - {e}")
-        return
+        return []
     
     section_id = section_data['section_id']
-    title = section_data['title']
     tables = section_data['content']['tables']
     
     if not tables:
-        return
-    
-    logger.info(f"\n{'-'*60}")
-    logger.info(f"섹션: {section_id} - {title}")
-    logger.info(f"테이블 수: {len(tables)}")
-    
-    # 이미 처리된 마크다운이 있는지 확인 (중복 파싱 방지)
-    # 단, 사용자 요청에 따라 덮어쓰거나 할 수도 있음. 여기서는 일단 진행.
+        return []
     
     # 테이블 그룹화
     table_groups = group_tables_by_title(tables)
-    logger.info(f"테이블 그룹: {len(table_groups)}개")
-    
-    updated_count = 0
     
-    # 각 그룹 처리
+    jobs = []
+    table_pos = 0
     for group_idx, group in enumerate(table_groups, 1):
-        if group[0].get('table_md') and len(group[0]['table_md']) > 10:
+        positions = list(range(table_pos, table_pos + len(group)))
+        table_pos += len(group)
+        
+        check = group[0].get('table_md_check')
+        failed = check is not None and not check.get('ok', True)
+        if reparse_failed:
+            if not failed:
+                continue
+            logger.info(f"  🔁 재파싱 대상 ({check.get('reason')}): {group[0].get('title', 'Untitled')}")
+        elif group[0].get('table_md') and len(group[0]['table_md']) > 10:
             logger.info(f"  ⏭️  이미 파싱됨 (Skip): {group[0].get('title', 'Untitled')}")
+            signature = group[0].get('table_md_signature')
+            llm_result = group[0].get('table_md_source', 'llm') == 'llm'
+            if cache is not None and not failed and llm_result and signature:
+                image_paths = _collect_group_images(group, image_dir, verbose=False)
+                if len(image_paths) == len(group):
+                    key = cache.make_key(image_paths, signature)
+                    if not cache.contains(key):
+                        cache.put(key, group[0]['table_md'], signature, Path(image_paths[0]).name)
             continue
 
         group_title = group[0].get('title')
         if not group_title:
              group_title = "Untitled Table"
-             
-        logger.info(f"\n[그룹 {group_idx}/{len(table_groups)}] {group_title}")
         
         # 이미지 경로 수집
-        image_paths = []
-        for table in group:
-            if 'image_path' in table:
-                image_name = table['image_path']
-            else:
-                image_name = f"{table['id']}.png"
-                
-            image_path = image_dir / image_name
-            if image_path.exists():
-                image_paths.append(str(image_path))
-            else:
-                # Recovery 폴더 확인
-                recovery_path = image_dir.parent / "section_images_recovery" / image_name
-                if recovery_path.exists():
-                    image_paths.append(str(recovery_path))
-                else:
-                    logger.info(f"    ⚠️  이미지 없음: {image_name}")
+        image_paths = _collect_group_images(group, image_dir)
         
         if not image_paths:
-            logger.info(f"  ❌ 파싱할 이미지 없음")
+            logger.info(f"  ❌ 파싱할 이미지 없음: {section_id} - {group_title}")
             continue
+        
+        jobs.append({
+            "section_file": section_file,
+            "section_id": section_id,
+            "group_idx": group_idx,
+            "group_count": len(table_groups),
+            "group_title": group_title,
+            "table_positions": positions,
+            "table_ids": [t.get('id') for t in group],
+            "regions": [{"page": t.get('page'), "bbox": t.get('bbox'), "merged_count": t.get('merged_count', 1)}
+                        for t in group],
+            "image_paths": image_paths,
+        })
+    
+    return jobs
+
+
+# 섹션 JSON 파일별 write-back lock
+_file_locks: Dict[str, threading.Lock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def _get_file_lock(section_file: Path) -> threading.Lock:
+    with _file_locks_guard:
+        return _file_locks.setdefault(str(section_file), threading.Lock())
 
-        logger.info(f"  이미지 {len(image_paths)}개: {[Path(p).name for p in image_paths]}")
+
+def write_back_markdown(job: Dict, markdown: Optional[str], source: str = "llm") -> bool:
+    """
+    파싱 결과를 해당 섹션 JSON에 기록 (파일별 lock, 최신 내용 재로드 후 갱신)
+    
+    Args:
+        job: collect_table_jobs 작업
+        markdown: 테이블 Markdown (None 이면 파싱 실패로 table_md_check 만 기록)
+        source: 결과 출처 ("llm" / "fitz") - table_md_source 필드로 저장
+    
+    Returns:
+        기록 성공 여부
+    """
+    section_file = job['section_file']
+    group_title = job['group_title']
+    
+    with _get_file_lock(section_file):
+        with open(section_file, 'r', encoding='utf-8') as f:
+            section_data = json.load(f)
+        tables = section_data['content']['tables']
         
-        # LLM 파싱
-        logger.info(f"  🔄 LLM 파싱 중...")
-        try:
-            markdown = parser.parse_table_images(image_paths, group_title)
+        for i, pos in enumerate(job['table_positions']):
+            if pos >= len(tables) or tables[pos].get('id') != job['table_ids'][i]:
+                logger.info(f"  ⚠️  테이블 구조 변경됨 (write-back 생략): {section_file.name} - {group_title}")
+                return False
+        
+        if markdown is None:
+            # 파싱 실패: 기존 table_md 는 유지하고 실패 표시만 (--reparse-failed 대상)
+            tables[job['table_positions'][0]]['table_md_check'] = {"ok": False, "reason": "empty_response"}
+        
+        for i, pos in enumerate(job['table_positions'] if markdown is not None else []):
+            # 원본 텍스트는 건드리지 않고, 별도 필드에 마크다운 저장
+            if i == 0: # 그룹의 첫 번째 테이블에만 전체 마크다운 저장
+                tables[pos]['table_md'] = markdown
+                tables[pos]['table_md_source'] = source
+                if job.get('model'):
+                    tables[pos]['table_md_model'] = job['model']
+                # 결과를 만든 캐시 설정 (모델/프롬프트 모드) - 기존 결과 캐시 등록 시 사용
+                if job.get('signature') and source == 'llm':
+                    tables[pos]['table_md_signature'] = job['signature']
+                else:
+                    tables[pos].pop('table_md_signature', None)
+                if job.get('text_check'):
+                    tables[pos]['table_md_text_check'] = job['text_check']
+                else:
+                    tables[pos].pop('table_md_text_check', None)
+                if job.get('structure_check'):
+                    tables[pos]['table_md_check'] = job['structure_check']
+                else:
+                    tables[pos].pop('table_md_check', None)
+            else: # 나머지 테이블들은 참조 표시
+                tables[pos]['table_md'] = f"(Continuation of {group_title} - see first part)"
+        
+        with open(section_file, 'w', encoding='utf-8') as f:
+            json.dump(section_data, f, ensure_ascii=False, indent=2)
+    
+    return True
+
+
+class CascadeStats:
+    """cascade tier 별 통과율 / 소요 시간 집계 (thread-safe)"""
+    
+    def __init__(self, models: List[str]):
+        self.models = models
+        self._lock = threading.Lock()
+        self.attempts = [0] * len(models)
+        self.accepted = [0] * len(models)
+        self.seconds = [0.0] * len(models)
+        self.timed = [0] * len(models)
+    
+    def record(self, tier: int, accepted: bool, seconds: Optional[float]):
+        with self._lock:
+            self.attempts[tier] += 1
+            self.accepted[tier] += int(accepted)
+            if seconds is not None:
+                self.seconds[tier] += seconds
+                self.timed[tier] += 1
+    
+    def report(self) -> str:
+        """tier 별 acceptance 와 예상 절감 시간 (마지막 tier 평균 시간 기준)"""
+        lines = ["Cascade report:"]
+        for tier, model in enumerate(self.models):
+            attempts = self.attempts[tier]
+            rate = self.accepted[tier] / attempts if attempts else 0.0
+            avg = self.seconds[tier] / self.timed[tier] if self.timed[tier] else 0.0
+            lines.append(f"  - tier {tier + 1} {model}: accepted {self.accepted[tier]}/{attempts} ({rate:.1%}), avg {avg:.1f}s")
+        
+        last = len(self.models) - 1
+        if last > 0 and self.timed[last]:
+            avg_last = self.seconds[last] / self.timed[last]
+            early_accepted = sum(self.accepted[:last])
+            # 앞 tier 에서 통과한 그룹은 마지막 tier 시간을 절약, 앞 tier 에서 쓴 시간은 비용
+            saved = early_accepted * avg_last - sum(self.seconds[:last])
+            lines.append(f"  - estimated time saved vs. {self.models[last]} only: {saved:.0f}s")
+        return "\n".join(lines)
+
+
+def check_structure(job: Dict, parser: LLMTableParser, markdown: Optional[str],
+                    truncated: bool = False, ruling_rows: Optional[int] = None) -> bool:
+    """LLM 출력 구조 검증 결과를 job['structure_check'] 에 저장 (table_md_check 로 기록됨)"""
+    if ruling_rows is None:
+        ruling_rows = parser.count_ruling_rows(job['image_paths'])
+    ok, checks = validate_table_structure(markdown, ruling_rows, truncated)
+    job['structure_check'] = dict(checks, ok=ok)
+    if not ok:
+        logger.info(f"  ⚠️  구조 검증 실패 ({', '.join(checks['reasons'])}): {job['section_id']} - {job['group_title']}")
+    return ok
+
+
+def _run_job(job: Dict, parsers: List[LLMTableParser], cache: Optional[TableMarkdownCache] = None,
+             stats: Optional[CascadeStats] = None,
+             prefetcher: Optional[TablePayloadPrefetcher] = None) -> Optional[str]:
+    """
+    단일 테이블 그룹 LLM 파싱 (캐시 우선 조회)
+    
+    parsers 가 여러 개면 small-model-first cascade: 앞 tier 결과가 자동 검증을
+    통과하지 못한 경우에만 다음 (더 큰) 모델로 재시도
+    prefetcher 가 있으면 미리 준비된 payload 사용 (cascade tier 간에도 재사용)
+    """
+    try:
+        prepared = prefetcher.take(job) if prefetcher is not None else None
+        text_lines = job.get('text_lines')
+        for tier, parser in enumerate(parsers):
+            is_last = tier == len(parsers) - 1
+            key = None
+            markdown = None
+            elapsed = None
+            if cache is not None:
+                signature = parser.cache_signature(text_guided=bool(text_lines))
+                key = cache.make_key(job['image_paths'], signature)
+                markdown = cache.get(key)
+                if markdown:
+                    job['cached'] = True
+                    logger.info(f"  💾 캐시 사용: {job['section_id']} - {job['group_title']} ({parser.model})")
+            
+            truncated = False
+            if not markdown:
+                job['cached'] = False
+                start = time.time()
+                if prepared is None:
+                    prepared = parser.prepare_table_request(job['image_paths'], job['group_title'], text_lines)
+                markdown = parser.parse_prepared(prepared)
+                elapsed = time.time() - start
+                truncated = parser.last_truncated()
+            
+            ruling_rows = prepared.get('ruling_rows') if prepared else None
+            structure_ok = check_structure(job, parser, markdown, truncated, ruling_rows) if markdown else False
             
+            if not is_last:
+                ok, checks = verify_table_markdown(markdown, job.get('fitz_header'), job.get('pdf_words'))
+                if ok and not structure_ok:
+                    ok, checks = False, job['structure_check']
+                if stats is not None:
+                    stats.record(tier, ok, elapsed)
+                if not ok:
+                    logger.info(f"  ↗️  tier {tier + 1} 검증 실패 ({checks.get('reason')}) -> 다음 모델: "
+                                f"{job['section_id']} - {job['group_title']}")
+                    continue
+            elif stats is not None:
+                stats.record(tier, bool(markdown), elapsed)
+            
+            if markdown and job.get('pdf_words'):
+                # 셀 텍스트를 PDF 단어와 대조 (환각/누락 확인)
+                job['text_check'] = text_agreement(markdown, job['pdf_words'])
+                if job['text_check']['precision'] < 0.95 or job['text_check']['recall'] < 0.95:
+                    logger.info(f"  ⚠️  PDF 텍스트 불일치 {job['text_check']}: {job['section_id']} - {job['group_title']}")
+            
+            # 구조 검증 실패 결과는 캐시하지 않음 (--reparse-failed 로 다시 파싱)
+            if markdown and key is not None and elapsed is not None and structure_ok:
+                cache.put(key, markdown, signature, Path(job['image_paths'][0]).name)
             if markdown:
-                logger.info(f"  ✅ 완료! ({len(markdown)} 문자)")
-                
-                # JSON 데이터 업데이트
-                for i, table in enumerate(group):
-                    # 원본 텍스트는 건드리지 않고, 별도 필드에 마크다운 저장
-                    if i == 0: # 그룹의 첫 번째 테이블에만 전체 마크다운 저장
-                        table['table_md'] = markdown
-                    else: # 나머지 테이블들은 참조 표시
-                        table['table_md'] = f"(Continuation of {group_title} - see first part)"
-                
-                updated_count += 1
-            else:
-                logger.info(f"  ❌ 파싱 결과 없음 (Empty response)")
-                
+                job['model'] = parser.model
+                job['signature'] = parser.cache_signature(text_guided=bool(text_lines))
+            return markdown
+    except Exception as e:
+        logger.info(f"  ❌ 파싱 중 오류 발생: {job['section_id']} - {job['group_title']}: {e}")
+        return None
+    finally:
+        if prefetcher is not None:
+            prefetcher.release(job)
+
+
+def _run_job_timed(job: Dict, *args) -> Tuple[Optional[str], float]:
+    """_run_job + 실제 소요 시간"""
+    start = time.time()
+    markdown = _run_job(job, *args)
+    return markdown, time.time() - start
+
+
+def _run_batch_timed(batch: List[Dict], parser: LLMTableParser,
+                     cache: Optional[TableMarkdownCache] = None) -> List[Tuple[Optional[str], float]]:
+    """
+    작은 테이블 묶음을 한 요청으로 파싱 (분리 실패 테이블은 parser 내부에서 개별 재시도)
+    
+    배치 프롬프트 결과는 별도 캐시 설정 (cache_signature(batch=True)) 으로 조회/저장
+    """
+    start = time.time()
+    batch_signature = parser.cache_signature(batch=True)
+    single_signature = parser.cache_signature()
+    
+    results = [None] * len(batch)
+    pending = []
+    for idx, job in enumerate(batch):
+        job['cached'] = False
+        job['batched'] = True
+        if cache is not None:
+            results[idx] = cache.get(cache.make_key(job['image_paths'], batch_signature))
+        if results[idx]:
+            job['cached'] = True
+            job['model'] = parser.model
+            job['signature'] = batch_signature
+            logger.info(f"  💾 캐시 사용 (batch): {job['section_id']} - {job['group_title']} ({parser.model})")
+        else:
+            pending.append(idx)
+    
+    if pending:
+        try:
+            parsed = parser.parse_table_batch([(batch[idx]['image_paths'][0], batch[idx]['group_title'])
+                                               for idx in pending])
+            info = parser.last_batch_info()
         except Exception as e:
-            logger.info(f"  ❌ 파싱 중 오류 발생: {e}")
-            
-    # 변경사항이 있으면 JSON 저장
-    if updated_count > 0:
-        with open(section_file, 'w', encoding='utf-8') as f:
-            json.dump(section_data, f, ensure_ascii=False, indent=2)
-        logger.info(f"💾 섹션 파일 업데이트 완료")
+            logger.info(f"  ❌ 배치 파싱 중 오류 발생 ({len(pending)}개): {e}")
+            parsed, info = [None] * len(pending), []
+        latency = (time.time() - start) / len(pending)
+        
+        for pos, (idx, markdown) in enumerate(zip(pending, parsed)):
+            results[idx] = markdown
+            if not markdown:
+                continue
+            job = batch[idx]
+            # 분리 실패로 개별 재시도된 항목은 단일 이미지 프롬프트 결과
+            batched = pos < len(info) and info[pos].get("batched")
+            truncated = pos < len(info) and info[pos].get("truncated")
+            signature = batch_signature if batched else single_signature
+            job['model'] = parser.model
+            job['signature'] = signature
+            # num_predict 에 도달해 잘린 결과는 검증 실패로 기록하고 캐시하지 않음
+            if check_structure(job, parser, markdown, truncated) and not truncated and cache is not None:
+                cache.put(cache.make_key(job['image_paths'], signature), markdown, signature,
+                          Path(job['image_paths'][0]).name)
+    else:
+        latency = time.time() - start
+    return [(markdown, latency) for markdown in results]
+
+
+# 파싱 결과와 함께 write_back_markdown 에 기록되는 작업 필드 (중복 작업에 복사)
+RESULT_FIELDS = ("model", "signature", "structure_check", "text_check")
+
+
+def dedup_jobs(jobs: List[Dict]):
+    """
+    같은 이미지 묶음을 쓰는 작업 병합 (한 번만 LLM 요청)
+    
+    step3 content-addressed 저장에서는 같은 crop 이 같은 image_path 를 가지므로
+    반복되는 범례/그림 테이블이 동시에 캐시 miss 로 중복 요청되지 않도록 경로로 비교
+    
+    Returns:
+        (대표 작업 리스트, {id(대표 작업): [중복 작업, ...]})
+    """
+    primaries = {}
+    duplicates = {}
+    unique = []
+    for job in jobs:
+        # 캐시 키와 같은 기준 (이미지 + text-guided 여부)
+        key = (tuple(job['image_paths']), bool(job.get('text_lines')))
+        primary = primaries.get(key)
+        if primary is None:
+            primaries[key] = job
+            unique.append(job)
+        else:
+            duplicates.setdefault(id(primary), []).append(job)
+    
+    merged = sum(len(dups) for dups in duplicates.values())
+    if merged:
+        logger.info(f"🧬 같은 이미지 그룹 {merged}개 병합 ({len(jobs)} -> {len(unique)} 요청)")
+    return unique, duplicates
+
+
+def plan_micro_batches(jobs: List[Dict], parser: LLMTableParser,
+                       cache: Optional[TableMarkdownCache] = None,
+                       batch_size: int = TABLE_MICRO_BATCH,
+                       max_height: int = TABLE_MICRO_BATCH_MAX_HEIGHT) -> List[List[Dict]]:
+    """
+    작업을 제출 단위로 묶음: 작은 테이블 (단일 이미지, max_height 이하, text-layer 없음,
+    단일 이미지 캐시 miss) 은 batch_size 개씩, 나머지는 하나씩
+    (배치 프롬프트 캐시 hit 는 배치 단위에서 조회)
+    
+    Returns:
+        제출 단위 리스트 (jobs 순서 유지, 배치는 마지막에)
+    """
+    if batch_size < 2:
+        return [[job] for job in jobs]
+    
+    # 단일 이미지 프롬프트로 캐시된 작업은 _run_job 에서 같은 설정으로 캐시 hit -> 배치 제외
+    signature = parser.cache_signature()
+    singles, small = [], []
+    for job in jobs:
+        eligible = len(job['image_paths']) == 1 and not job.get('text_lines')
+        if eligible and cache is not None:
+            eligible = not cache.contains(cache.make_key(job['image_paths'], signature))
+        if eligible:
+            try:
+                # 헤더만 읽음 (디코딩 없음)
+                with Image.open(job['image_paths'][0]) as img:
+                    eligible = img.height <= max_height
+            except Exception:
+                eligible = False
+        (small if eligible else singles).append(job)
+    
+    batches = [small[i:i + batch_size] for i in range(0, len(small), batch_size)]
+    # 1개짜리 배치는 일반 요청으로
+    units = [[job] for job in singles] + [b for b in batches if len(b) > 1] + [b for b in batches if len(b) == 1]
+    if small:
+        logger.info(f"📦 micro-batch: 작은 테이블 {len(small)}개 -> {sum(1 for b in batches if len(b) > 1)}개 요청 "
+                    f"(batch={batch_size}, height<={max_height}px)")
+    return units
+
+
+def _run_unit(unit: List[Dict], parsers: List[LLMTableParser], cache: Optional[TableMarkdownCache],
+              stats: Optional[CascadeStats],
+              prefetcher: Optional[TablePayloadPrefetcher] = None) -> List[Tuple[Optional[str], float]]:
+    """제출 단위 실행: 단일 작업은 _run_job, 배치는 _run_batch_timed"""
+    if len(unit) == 1:
+        return [_run_job_timed(unit[0], parsers, cache, stats, prefetcher)]
+    return _run_batch_timed(unit, parsers[-1], cache)
+
+
+def run_table_jobs(jobs: List[Dict], parser, max_in_flight: int = LLM_MAX_IN_FLIGHT,
+                   cache: Optional[TableMarkdownCache] = None,
+                   scheduler: Optional[TableJobScheduler] = None,
+                   micro_batch: int = TABLE_MICRO_BATCH,
+                   prefetch_depth: Optional[int] = TABLE_PREFETCH_DEPTH) -> int:
+    """
+    테이블 그룹 작업을 최대 max_in_flight 개까지 동시에 LLM 에 요청
+    
+    완료되는 순서대로 해당 섹션 JSON 에 기록하므로, 긴 테이블 하나가
+    뒤의 작은 테이블들을 막지 않음
+    
+    Args:
+        parser: LLMTableParser 또는 cascade 용 리스트 (작은 모델 -> 큰 모델 순)
+        scheduler: 있으면 예상 비용이 큰 그룹부터 제출 (Longest-Job-First)
+        micro_batch: 작은 테이블을 한 요청에 묶는 개수 (cascade 에서는 사용 안 함)
+        prefetch_depth: 백그라운드로 미리 준비할 payload 수 (None: in-flight x 2, 0: 사용 안 함)
+    
+    Returns:
+        성공적으로 기록된 그룹 수
+    """
+    if not jobs:
+        return 0
+    
+    parsers = parser if isinstance(parser, list) else [parser]
+    jobs, duplicates = dedup_jobs(jobs)
+    stats = CascadeStats([p.model for p in parsers]) if len(parsers) > 1 else None
+    
+    predicted_makespan = None
+    if scheduler is not None:
+        jobs, predicted_makespan = scheduler.order(jobs, max_in_flight)
+        logger.info(f"📅 LJF 스케줄: 최장 예상 {jobs[0]['estimated_seconds']:.0f}s, "
+                    f"예상 전체 {predicted_makespan:.0f}s (workers={max_in_flight})")
+    
+    # 작은 테이블 micro-batching (cascade 는 tier 별 검증이 필요하므로 제외)
+    units = plan_micro_batches(jobs, parsers[-1], cache, micro_batch if len(parsers) == 1 else 0)
+    
+    # payload prefetch: 제출 순서대로 단일 작업의 payload 를 미리 준비 (캐시 hit 예상 작업은 제외)
+    prefetcher = None
+    if prefetch_depth is None:
+        prefetch_depth = max(1, max_in_flight) * 2
+    if prefetch_depth > 0:
+        def is_cached(job):
+            if cache is None:
+                return False
+            signature = parsers[0].cache_signature(text_guided=bool(job.get('text_lines')))
+            return cache.contains(cache.make_key(job['image_paths'], signature))
+        prefetcher = TablePayloadPrefetcher(parsers[0], prefetch_depth, skip=is_cached)
+        prefetcher.start([unit[0] for unit in units if len(unit) == 1])
+    
+    updated_count = 0
+    failed_count = 0
+    start_time = time.time()
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        futures = {executor.submit(_run_unit, unit, parsers, cache, stats, prefetcher): unit for unit in units}
+        
+        with tqdm(total=len(jobs), desc="Tables", unit="grp") as progress:
+            for future in as_completed(futures):
+                for job, (markdown, latency) in zip(futures[future], future.result()):
+                    if scheduler is not None:
+                        finished = time.time() - start_time
+                        logger.debug(f"  ⏱️  {job['group_title']}: latency est {job['estimated_seconds']:.0f}s / "
+                                     f"actual {latency:.0f}s, finish est {job['estimated_finish']:.0f}s / actual {finished:.0f}s")
+                        # 배치 latency 는 분할 평균이므로 history 에 기록하지 않음
+                        if markdown and not job.get('cached') and not job.get('batched'):
+                            scheduler.record(job, latency)
+                    
+                    # 같은 이미지를 쓰는 중복 그룹에도 같은 결과 기록 (모델/검증 결과 포함)
+                    for dup in duplicates.get(id(job), []):
+                        for field in RESULT_FIELDS:
+                            if field in job:
+                                dup[field] = job[field]
+                            else:
+                                dup.pop(field, None)
+                    for target in [job] + duplicates.get(id(job), []):
+                        if markdown:
+                            logger.info(f"  ✅ 완료! {target['section_id']} [그룹 {target['group_idx']}/{target['group_count']}] {target['group_title']} ({len(markdown)} 문자)")
+                            if write_back_markdown(target, markdown):
+                                updated_count += 1
+                        else:
+                            failed_count += 1
+                            logger.info(f"  ❌ 파싱 결과 없음 (Empty response): {target['section_id']} - {target['group_title']}")
+                            write_back_markdown(target, None)
+                    
+                    elapsed = time.time() - start_time
+                    progress.update(1)
+                    progress.set_postfix(ok=updated_count, fail=failed_count,
+                                         rate=f"{progress.n / elapsed * 60:.1f}/min" if elapsed > 0 else "-")
+    
+    elapsed = max(time.time() - start_time, 1e-6)
+    logger.info(f"⏱️  {len(jobs)}개 그룹 처리: {elapsed:.1f}s "
+                f"({len(jobs) / elapsed * 60:.1f} 그룹/분, {len(units)}개 요청 단위, in-flight={max_in_flight})")
+    if stats is not None:
+        logger.info(stats.report())
+    logger.info(token_estimator.report())
+    if prefetcher is not None:
+        prefetcher.stop()
+        logger.info(prefetcher.report())
+    if scheduler is not None:
+        logger.info(scheduler.report(predicted_makespan, elapsed))
+        scheduler.save()
+    return updated_count
+
+
+def route_fast_path(jobs: List[Dict], router: FitzTableRouter) -> List[Dict]:
+    """
+    fitz fast path 라우팅: 단순 격자 테이블은 바로 기록하고 나머지만 반환 (LLM escalation)
+    
+    fitz Document 는 thread-safe 하지 않으므로 LLM 동시 처리 전에 한 thread 에서 수행
+    
+    Returns:
+        LLM 으로 보낼 작업 리스트
+    """
+    escalated = []
+    for job in jobs:
+        markdown, scores = router.route(job['regions'])
+        if markdown:
+            logger.info(f"  ⚡ fitz fast path: {job['section_id']} - {job['group_title']} "
+                        f"(fill={scores['fill_ratio']}, text={scores['text_coverage']})")
+            if write_back_markdown(job, markdown, source="fitz"):
+                continue
+        else:
+            logger.debug(f"  ↗️  LLM escalation ({scores.get('reason')}): {job['section_id']} - {job['group_title']}")
+        escalated.append(job)
+    
+    logger.info(router.report())
+    return escalated
+
+
+def attach_text_layer(jobs: List[Dict], router: FitzTableRouter):
+    """
+    text-layer guided 모드: 단일 영역 테이블 작업에 PDF 단어/좌표 라인 추가
+    
+    여러 페이지로 합쳐진 그룹은 primary bbox 만 남아 있으므로 제외 (이미지만 사용)
+    """
+    attached = 0
+    for job in jobs:
+        regions = job['regions']
+        if len(regions) != 1 or regions[0].get('merged_count', 1) > 1:
+            continue
+        try:
+            text_lines, pdf_words = router.extract_text_layer(regions[0]['page'], regions[0]['bbox'], dpi=TABLE_DPI)
+        except Exception as e:
+            logger.info(f"  ⚠️  text layer 추출 실패: {job['section_id']} - {job['group_title']}: {e}")
+            continue
+        if text_lines:
+            job['text_lines'] = text_lines
+            job['pdf_words'] = pdf_words
+            attached += 1
+    logger.info(f"📝 Text-layer guided: {attached}/{len(jobs)} 그룹")
+
+
+def attach_verification_context(jobs: List[Dict], router: FitzTableRouter):
+    """cascade 검증용 fitz 헤더 / PDF 단어 추가 (단어는 단일 영역 테이블만)"""
+    for job in jobs:
+        region = job['regions'][0]
+        try:
+            job['fitz_header'] = router.detect_header(region['page'], region['bbox'])
+            if 'pdf_words' not in job and len(job['regions']) == 1 and region.get('merged_count', 1) == 1:
+                _, job['pdf_words'] = router.extract_text_layer(region['page'], region['bbox'], dpi=TABLE_DPI)
+        except Exception as e:
+            logger.info(f"  ⚠️  검증 context 추출 실패: {job['section_id']} - {job['group_title']}: {e}")
+
+
+def parse_section_tables(section_file: Path, image_dir: Path, parser: LLMTableParser,
+                         cache: Optional[TableMarkdownCache] = None):
+    """
+    섹션의 모든 테이블을 그룹화하여 파싱
+    
+    Args:
+        section_file: 섹션 JSON 파일
+        image_dir: 이미지 디렉토리
+        parser: LLMTableParser 인스턴스
+        cache: table_md 캐시 (None 이면 사용 안 함)
+    """
+    jobs = collect_table_jobs(section_file, image_dir, cache)
+    if jobs:
+        logger.info(f"섹션: {jobs[0]['section_id']} - 테이블 그룹 {len(jobs)}개 파싱")
+        run_table_jobs(jobs, parser, cache=cache)
 
 
 def main():
-    """전체 섹션 순차 처리"""
+    """전체 섹션 동시 처리"""
     from common_parameter import OUTPUT_DIR
     
+    arg_parser = argparse.ArgumentParser(description="Step4: 테이블 그룹 LLM 파싱")
+    arg_parser.add_argument("--reparse-failed", action="store_true",
+                            help="구조 검증 실패 (table_md_check.ok=false) 그룹만 다시 파싱 (캐시 미사용)")
+    arg_parser.add_argument("--model", default=None,
+                            help="사용할 모델 (기본: TABLE_MODEL 또는 TABLE_CASCADE_MODELS)")
+    arg_parser.add_argument("--tile-height", type=int, default=None,
+                            help="이 높이(px) 를 넘는 테이블은 타일 분할 (재파싱 시 tiling 변경용)")
+    args = arg_parser.parse_args()
+    
     # 경로 설정
     section_dir = Path(OUTPUT_DIR) / "section_data_v2"
     image_dir = Path(OUTPUT_DIR) / "section_images"
@@ -175,55 +725,76 @@ def main():
     logger.info(f"Target sections: {len(json_files)}")
     
     # LLM 파서 초기화 (한 번만 생성)
+    # TABLE_CASCADE_MODELS 가 있으면 작은 모델 -> 큰 모델 순 cascade
     try:
-        parser = LLMTableParser()
-        logger.info("✅ LLM 파서 초기화 완료\n")
+        if args.model:
+            parser = LLMTableParser(model=args.model)
+            logger.info(f"✅ LLM 파서 초기화 완료 ({args.model})\n")
+        elif TABLE_CASCADE_MODELS:
+            parser = [LLMTableParser(model=m) for m in TABLE_CASCADE_MODELS]
+            logger.info(f"✅ LLM cascade 초기화 완료: {' -> '.join(TABLE_CASCADE_MODELS)}\n")
+        else:
+            parser = LLMTableParser()
+            logger.info("✅ LLM 파서 초기화 완료\n")
     except Exception as e:
         logger.info(f"❌ LLM 파서 초기화 실패: {e}")
         return
-
-    # 순차 처리
-    processed_sections = 0
-    tables_processed = 0
     
+    if args.tile_height:
+        for p in (parser if isinstance(parser, list) else [parser]):
+            p.MAX_HEIGHT_LIMIT = args.tile_height
+            p.TILE_HEIGHT = min(p.TILE_HEIGHT, args.tile_height)
+        logger.info(f"타일 분할 기준: {args.tile_height}px")
+    
+    # table_md 영구 캐시 (이미지 내용 해시 기반)
+    cache = TableMarkdownCache(TABLE_MD_CACHE_PATH)
+
     # 테스트용 필터 (전체 실행 시에는 비워두거나 제거)
     target_sections = []  # 빈 리스트면 필터링 안 함
     
-    for i, section_file in enumerate(json_files, 1): # Changed from section_files to json_files
-        # 섹션 데이터 로드
-        try:
-            with open(section_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
-            logger.info(f"❌ 파일 읽기 실패: {section_file.name} - {e}")
-            continue
-
-        # Section 5 이상은 처리하지 않음 (사용자 요청)
-        # 섹션 ID가 '5'로 시작하거나, 순서상 뒤쪽이면 제외할 수도 있음
-        # 여기서는 ID 기반 필터링
-        # Section 5 이상은 처리하지 않음 (사용자 요청)
-        # 섹션 ID가 '5'로 시작하거나, 순서상 뒤쪽이면 제외할 수도 있음
-        # 여기서는 ID 기반 필터링
-        # section_id = data.get('section_id', '')
-        # if section_id.startswith('5.') or section_id == '5':
-        #     logger.info(f"  ⏩ 섹션 ID '{section_id}'는 건너뜁니다.")
-        #     continue
-            
+    # 1. 전체 섹션에서 파싱 대상 테이블 그룹 수집
+    jobs = []
+    for section_file in json_files:
         # 기존 target_sections 필터링 (파일 이름 기반)
         if target_sections and not any(t in section_file.name for t in target_sections):
             continue
-            
-        # 테이블이 있는 섹션인지 먼저 확인 (불필요한 로딩 방지)
-        # 하지만 parse_section_tables 함수 안에서 로드하므로 여기서는 일단 호출
-        # 진행 상황 표시
-        # logger.info(f"Processing {i}/{len(section_files)}: {section_file.name} ...")
-        
-        parse_section_tables(section_file, image_dir, parser)
-        processed_sections += 1
+        jobs.extend(collect_table_jobs(section_file, image_dir, cache, args.reparse_failed))
+    
+    sections_with_jobs = len({str(job['section_file']) for job in jobs})
+    logger.info(f"파싱 대상 테이블 그룹: {len(jobs)}개 ({sections_with_jobs}개 섹션)"
+                f"{' - 구조 검증 실패 그룹 재파싱' if args.reparse_failed else ''}")
+    
+    # 2. fitz fast path (단순 격자 테이블은 LLM 없이 바로 기록)
+    total_jobs = len(jobs)
+    if (TABLE_FAST_PATH or TABLE_TEXT_GUIDED or TABLE_CASCADE_MODELS) and jobs:
+        router = FitzTableRouter(PDF_PATH)
+        try:
+            # 재파싱 대상은 이미 fast path 에서 escalate 된 그룹
+            if TABLE_FAST_PATH and not args.reparse_failed:
+                jobs = route_fast_path(jobs, router)
+            # text-layer guided 모드: LLM 에 PDF 단어 제공
+            if TABLE_TEXT_GUIDED:
+                attach_text_layer(jobs, router)
+            # cascade 검증용 fitz 헤더 / PDF 단어
+            if isinstance(parser, list):
+                attach_verification_context(jobs, router)
+        finally:
+            router.close()
+    
+    # 3. 동시 처리 (완료 순서대로 섹션 JSON 에 기록)
+    scheduler = TableJobScheduler(Path(OUTPUT_DIR) / "step4_latency_history.json")
+    # 동시 요청 수: Ollama 는 LLM_MAX_IN_FLIGHT, OpenAI 호환 서버는 LLM_BACKEND_CONCURRENCY
+    max_in_flight = (parser[-1] if isinstance(parser, list) else parser).backend.max_concurrency
+    # 재파싱은 캐시 조회 안 함 (같은 이미지의 이전 결과가 그대로 나오지 않도록)
+    updated_groups = run_table_jobs(jobs, parser, max_in_flight, None if args.reparse_failed else cache, scheduler)
+    logger.info(f"💾 캐시: hit {cache.hits}, miss {cache.misses} ({TABLE_MD_CACHE_PATH})")
+    cache.close()
 
     logger.info("\n" + "=" * 80)
     logger.info("🎉 모든 처리 완료!")
-    logger.info(f"총 처리된 섹션 파일: {processed_sections}/{len(json_files)}")
+    fast_groups = total_jobs - len(jobs)
+    logger.info(f"총 기록된 테이블 그룹: {fast_groups + updated_groups}/{total_jobs} "
+                f"(fitz {fast_groups}, LLM {updated_groups} / 섹션 {sections_with_jobs}/{len(json_files)})")
     logger.info("=" * 80)
 
 
@@ -6,11 +6,22 @@ Section JSON을 읽기 쉬운 Markdown으로 변환
 2. 본문 텍스트
 3. 테이블 (LLM 파싱된 table_md 활용)
 4. 그림 정보
+
+증분 변환: section JSON 해시를 manifest 와 비교하여 바뀐 섹션만 (process pool 로) 다시 생성
+INDEX.md 는 section_index.json 이 바뀐 경우에만 재생성 (--force 로 전체 재생성)
+
+--export: 전체 문서를 하나의 Markdown (--export-html 이면 HTML 도) 으로 streaming 출력
+          섹션별 byte offset index (<파일>.index.json) 를 함께 생성
 """
 
+import argparse
+import hashlib
+import html
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 from common_parameter import OUTPUT_DIR, PDF_PATH
 from logger import setup_advanced_logger
 import logging
@@ -19,12 +30,29 @@ logger = setup_advanced_logger(name="step5_markdown_converter", log_dir=OUTPUT_D
 
 
 
+# 변환 결과 형식을 바꾸면 올릴 것 (manifest 의 모든 섹션 재생성)
+CONVERTER_VERSION = "1"
+MANIFEST_NAME = ".step5_manifest.json"
+
+
 def json_to_markdown(json_path: Path, output_dir: Path) -> Path:
     """JSON을 Markdown으로 변환"""
     
     with open(json_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
+    # 파일 저장
+    md_filename = json_path.stem + ".md"
+    md_path = output_dir / md_filename
+    
+    with open(md_path, 'w', encoding='utf-8') as f:
+        f.write(render_section_markdown(data))
+        
+    return md_path
+
+
+def render_section_markdown(data: Dict) -> str:
+    """섹션 JSON 데이터 -> Markdown 문자열"""
     # Markdown 라인 수집
     md_lines = []
     
@@ -93,14 +121,38 @@ def json_to_markdown(json_path: Path, output_dir: Path) -> Path:
             
             md_lines.append("")
 
-    # 파일 저장
-    md_filename = json_path.stem + ".md"
-    md_path = output_dir / md_filename
-    
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(md_lines))
-        
-    return md_path
+    return '\n'.join(md_lines)
+
+
+def file_hash(path: Path) -> str:
+    """파일 내용 sha256 (table_md 는 step4 가 섹션 JSON 에 기록하므로 JSON 해시에 포함됨)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(markdown_dir: Path) -> Dict:
+    manifest_path = markdown_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == CONVERTER_VERSION:
+                return manifest
+            logger.info("ℹ️  변환기 버전 변경 - 전체 재생성")
+        except Exception as e:
+            logger.info(f"⚠️  manifest 로드 실패 (전체 재생성): {e}")
+    return {"version": CONVERTER_VERSION, "sections": {}, "index_hash": None}
+
+
+def save_manifest(markdown_dir: Path, manifest: Dict):
+    manifest_path = markdown_dir / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
 
 
 def create_index_md(index_json_path: Path, output_dir: Path):
@@ -128,9 +180,124 @@ def create_index_md(index_json_path: Path, output_dir: Path):
     logger.info(f"📑 Index created: {output_dir / 'INDEX.md'}")
 
 
+EXPORT_HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="https://cdn.jsdelivr.net/npm/marked/marked.min.js"></script>
+<style>
+body {{ font-family: sans-serif; max-width: 1100px; margin: 0 auto; padding: 1em; }}
+table {{ border-collapse: collapse; }} th, td {{ border: 1px solid #ccc; padding: 4px 8px; }}
+img {{ max-width: 100%; }}
+</style>
+</head>
+<body>
+"""
+EXPORT_HTML_TAIL = """<script>
+document.querySelectorAll('section > script[type="text/markdown"]').forEach(function (el) {
+  var div = document.createElement('div');
+  div.innerHTML = marked.parse(el.textContent);
+  el.replaceWith(div);
+});
+</script>
+</body>
+</html>
+"""
+
+
+class _OffsetWriter:
+    """buffered binary writer + 현재 byte offset"""
+
+    def __init__(self, path: Path, buffer_size: int = 1 << 20):
+        self.f = open(path, 'wb', buffering=buffer_size)
+        self.offset = 0
+
+    def write(self, text: str):
+        data = text.encode('utf-8')
+        self.f.write(data)
+        self.offset += len(data)
+
+    def close(self):
+        self.f.close()
+
+
+def export_consolidated(section_dir: Path, export_dir: Path, with_html: bool = False) -> Optional[Path]:
+    """
+    section_index 순서대로 전체 문서를 하나의 Markdown (선택: HTML) 으로 streaming 출력
+    
+    섹션 하나씩 읽어 변환 후 바로 기록하므로 메모리는 섹션 1개 크기로 제한
+    섹션별 byte 범위 [start, end) 를 <파일>.index.json 에 저장 (seek 후 end-start 만큼 읽으면 해당 섹션)
+    
+    Returns:
+        Markdown 파일 경로 (section_index.json 이 없으면 None)
+    """
+    index_json = section_dir / "section_index.json"
+    if not index_json.exists():
+        logger.info(f"❌ section_index.json 없음: {index_json}")
+        return None
+    with open(index_json, 'r', encoding='utf-8') as f:
+        index_data = json.load(f)
+    
+    export_dir.mkdir(parents=True, exist_ok=True)
+    doc_name = index_data.get('pdf_name') or Path(PDF_PATH).stem
+    md_path = export_dir / "document.md"
+    html_path = export_dir / "document.html"
+    
+    md_out = _OffsetWriter(md_path)
+    html_out = _OffsetWriter(html_path) if with_html else None
+    md_entries, html_entries = [], []
+    try:
+        md_out.write(f"# {doc_name}\n\n")
+        if html_out:
+            html_out.write(EXPORT_HTML_HEAD.format(title=html.escape(doc_name)))
+        
+        for section in index_data.get('sections', []):
+            json_path = section_dir / section['file']
+            if not json_path.exists():
+                logger.info(f"  ⚠️  섹션 파일 없음 (생략): {section['file']}")
+                continue
+            with open(json_path, 'r', encoding='utf-8') as f:
+                markdown = render_section_markdown(json.load(f))
+            entry = {"id": section.get('id', ''), "title": section['title'], "file": section['file']}
+            
+            start = md_out.offset
+            md_out.write(markdown + "\n\n")
+            md_entries.append(dict(entry, start=start, end=md_out.offset))
+            
+            if html_out:
+                anchor = html.escape(Path(section['file']).stem, quote=True)
+                start = html_out.offset
+                # 본문은 브라우저에서 marked 로 렌더링 (</script> 는 이스케이프)
+                body = markdown.replace("</script", "<\\/script")
+                html_out.write(f'<section id="{anchor}">\n<script type="text/markdown">\n'
+                               f'{body}\n</script>\n</section>\n')
+                html_entries.append(dict(entry, start=start, end=html_out.offset))
+        
+        if html_out:
+            html_out.write(EXPORT_HTML_TAIL)
+    finally:
+        md_out.close()
+        if html_out:
+            html_out.close()
+    
+    for path, entries in ((md_path, md_entries), (html_path, html_entries if with_html else None)):
+        if entries is None:
+            continue
+        with open(path.with_name(path.name + ".index.json"), 'w', encoding='utf-8') as f:
+            json.dump({"file": path.name, "sections": entries}, f, indent=1, ensure_ascii=False)
+        logger.info(f"📦 Exported {len(entries)} sections: {path} ({path.stat().st_size / 1024:.0f} KB)")
+    return md_path
+
+
 def main():
-    """전체 변환 실행"""
-   
+    """전체 변환 실행 (증분)"""
+    arg_parser = argparse.ArgumentParser(description="Step5: Section JSON -> Markdown")
+    arg_parser.add_argument("--force", action="store_true", help="manifest 무시하고 전체 재생성")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="변환 process 수")
+    arg_parser.add_argument("--export", action="store_true", help="전체 문서 단일 Markdown 출력 (export/document.md)")
+    arg_parser.add_argument("--export-html", action="store_true", help="--export 와 함께 HTML 도 출력")
+    args = arg_parser.parse_args()
     
     # 경로 설정
     section_dir = Path(OUTPUT_DIR) / "section_data_v2"
@@ -154,15 +321,51 @@ def main():
     
     logger.info(f"Target sections: {len(json_files)}")
     
-    for i, json_file in enumerate(json_files, 1):
-        md_file = json_to_markdown(json_file, markdown_dir)
-        # logger.info(f"[{i}/{len(json_files)}] Generated: {md_file.name}")
+    # 1. 변경 감지 (JSON 해시 vs manifest)
+    manifest = {"version": CONVERTER_VERSION, "sections": {}, "index_hash": None} if args.force \
+        else load_manifest(markdown_dir)
+    previous = manifest["sections"]
+    current = {}
+    changed = []
+    for json_file in json_files:
+        digest = file_hash(json_file)
+        current[json_file.name] = digest
+        md_path = markdown_dir / (json_file.stem + ".md")
+        if previous.get(json_file.name) != digest or not md_path.exists():
+            changed.append(json_file)
+    
+    # 2. 바뀐 섹션만 변환 (process pool)
+    if len(changed) > 1 and args.workers > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(changed))) as executor:
+            list(executor.map(json_to_markdown, changed, [markdown_dir] * len(changed), chunksize=8))
+    else:
+        for json_file in changed:
+            json_to_markdown(json_file, markdown_dir)
+    
+    # 3. 삭제된 섹션의 Markdown 제거 (manifest 에 기록된 것만)
+    removed = [name for name in previous if name not in current]
+    for name in removed:
+        stale = markdown_dir / (Path(name).stem + ".md")
+        if stale.exists():
+            stale.unlink()
         
-    logger.info(f"\n✅ Converted {len(json_files)} sections to Markdown.")
+    logger.info(f"\n✅ Converted {len(changed)} changed sections to Markdown "
+                f"(unchanged {len(json_files) - len(changed)}, removed {len(removed)}).")
     logger.info(f"Output directory: {markdown_dir}")
 
-    # 인덱스 파일 생성
-    create_index_md(section_dir / "section_index.json", markdown_dir)
+    # 4. 인덱스 파일 생성 (section_index.json 이 바뀐 경우만)
+    index_json = section_dir / "section_index.json"
+    index_hash = file_hash(index_json) if index_json.exists() else None
+    if index_hash != manifest.get("index_hash") or not (markdown_dir / "INDEX.md").exists():
+        create_index_md(index_json, markdown_dir)
+    else:
+        logger.info("📑 Index unchanged")
+    
+    save_manifest(markdown_dir, {"version": CONVERTER_VERSION, "sections": current, "index_hash": index_hash})
+    
+    # 5. 단일 파일 export (이미지 경로 ../section_images 가 유지되도록 OUTPUT_DIR/export 에 저장)
+    if args.export or args.export_html:
+        export_consolidated(section_dir, Path(OUTPUT_DIR) / "export", with_html=args.export_html)
     logger.info("End Of Step 5")
 
 if __name__ == '__main__':
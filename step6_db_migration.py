@@ -2,24 +2,134 @@ import sqlite3
 import json
 import os
 import re
+import time
+import hashlib
 from pathlib import Path
 from datetime import datetime
-from common_parameter import OUTPUT_DIR, PDF_PATH
+from common_parameter import OUTPUT_DIR, PDF_PATH, LIBRARY_DB_PATH, LIBRARY_DB_BUSY_TIMEOUT
+from lib_table_cells import parse_table_cells
 from logger import setup_advanced_logger # error 시 Archive/logger.py 사용할 것 
 import logging
 
 logger = setup_advanced_logger(name="step6_db_migration", log_dir=OUTPUT_DIR, log_level=logging.INFO)
 
 # Configuration
-DB_PATH = f"{OUTPUT_DIR}/library.db"
+DB_PATH = LIBRARY_DB_PATH  # shared by all documents by default
 SECTION_DATA_DIR = f"{OUTPUT_DIR}/section_data_v2"
 DOC_NAME = f"{OUTPUT_DIR}.db" 
+BATCH_SIZE = 500  # executemany batch rows
+
+# Bulk load pragmas (WAL: readers are not blocked during the load, writers of
+# other documents wait up to the busy timeout for the per-document transaction)
+BULK_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    f"PRAGMA busy_timeout = {int(LIBRARY_DB_BUSY_TIMEOUT * 1000)}",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",  # 64 MB
+    "PRAGMA temp_store = MEMORY",
+]
+
+# Full-text search (FTS5, external content tables kept in sync by triggers)
+# Query API: lib_library_search.LibrarySearch
+FTS_TABLES = {
+    "sections_fts": ('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS sections_fts USING fts5(
+        title, text_content,
+        content='sections', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2 tokenchars '_'"
+    )''', "sections", ("title", "text_content")),
+    "attachments_fts": ('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS attachments_fts USING fts5(
+        title, markdown_content,
+        content='attachments', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2 tokenchars '_'"
+    )''', "attachments", ("title", "markdown_content")),
+}
+
+
+def _create_fts(cursor):
+    """Create FTS5 tables and sync triggers (rebuild from existing rows when newly created)"""
+    for fts_name, (ddl, base, columns) in FTS_TABLES.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_name,))
+        is_new = cursor.fetchone() is None
+        cursor.execute(ddl)
+        
+        cols = ", ".join(columns)
+        new_vals = ", ".join(f"new.{c}" for c in columns)
+        old_vals = ", ".join(f"old.{c}" for c in columns)
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {base}_fts_ai AFTER INSERT ON {base} BEGIN
+            INSERT INTO {fts_name} (rowid, {cols}) VALUES (new.id, {new_vals});
+        END''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {base}_fts_ad AFTER DELETE ON {base} BEGIN
+            INSERT INTO {fts_name} ({fts_name}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+        END''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {base}_fts_au AFTER UPDATE OF {cols} ON {base} BEGIN
+            INSERT INTO {fts_name} ({fts_name}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+            INSERT INTO {fts_name} (rowid, {cols}) VALUES (new.id, {new_vals});
+        END''')
+        
+        if is_new:
+            # Existing databases: index rows loaded before FTS was added
+            cursor.execute(f"INSERT INTO {fts_name} ({fts_name}) VALUES ('rebuild')")
+
+
+INDEXES = {
+    "idx_sections_document": "CREATE INDEX IF NOT EXISTS idx_sections_document ON sections (document_id, section_index)",
+    # Natural keys (incremental sync matches rows by these instead of reinserting the document)
+    # Their prefixes also serve cross-document lookups: sections (document_id, section_pid)
+    # and attachments (section_id, type)
+    "ux_sections_natural": "CREATE UNIQUE INDEX IF NOT EXISTS ux_sections_natural ON sections (document_id, section_pid, section_index)",
+    "ux_attachments_natural": "CREATE UNIQUE INDEX IF NOT EXISTS ux_attachments_natural ON attachments (section_id, type, unique_id)",
+    # Table cells: field-level lookups (table_cells is WITHOUT ROWID, so every index also
+    # carries (row_id, col_index) and covers "which rows match" without touching the table)
+    "ux_table_rows": "CREATE UNIQUE INDEX IF NOT EXISTS ux_table_rows ON table_rows (attachment_id, row_index)",
+    "idx_table_cells_bytes": "CREATE INDEX IF NOT EXISTS idx_table_cells_bytes ON table_cells (byte_start, byte_end) WHERE byte_start IS NOT NULL",
+    "idx_table_cells_hex": "CREATE INDEX IF NOT EXISTS idx_table_cells_hex ON table_cells (hex_value) WHERE hex_value IS NOT NULL",
+    "idx_table_cells_text": "CREATE INDEX IF NOT EXISTS idx_table_cells_text ON table_cells (text COLLATE NOCASE, header)",
+}
+
+# Replaced by the natural-key indexes above (prefix covers the same lookups)
+OBSOLETE_INDEXES = ["idx_attachments_section"]
+
+# Columns added after the first schema (ALTER TABLE on existing databases)
+ADDED_COLUMNS = {
+    "documents": [("pdf_path", "TEXT"), ("pdf_hash", "TEXT"), ("page_count", "INTEGER"),
+                  ("parsed_at", "TIMESTAMP"), ("synced_at", "TIMESTAMP")],
+    "sections": [("content_hash", "TEXT")],
+    "attachments": [("content_hash", "TEXT")],
+}
+
+
+def _add_missing_columns(cursor):
+    """Add columns introduced after the database was created"""
+    for table, columns in ADDED_COLUMNS.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, col_type in columns:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+
+
+def _content_hash(values) -> str:
+    """Hash of the row content (natural key and row ids excluded)"""
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
 
 
 def init_db():
     """Initialize the SQLite database with the required schema."""
-    conn = sqlite3.connect(DB_PATH)
+    Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=LIBRARY_DB_BUSY_TIMEOUT)
+    conn.isolation_level = None  # explicit transaction control
     cursor = conn.cursor()
+    for pragma in BULK_PRAGMAS:
+        cursor.execute(pragma)
+    
+    # Schema changes in one write transaction so concurrent runs do not race
+    # (e.g. two processes both seeing a missing FTS table and rebuilding it)
+    cursor.execute("BEGIN IMMEDIATE")
     
     # 1. Documents Table
     cursor.execute('''
@@ -27,7 +137,12 @@ def init_db():
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL UNIQUE,
         description TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        pdf_path TEXT,
+        pdf_hash TEXT,          -- sha256 of the source PDF
+        page_count INTEGER,
+        parsed_at TIMESTAMP,    -- when step2 produced the section data
+        synced_at TIMESTAMP     -- last step6 run
     )
     ''')
     
@@ -44,6 +159,7 @@ def init_db():
         end_page INTEGER,
         text_content TEXT,      -- The full text content of the section
         page_range TEXT,        -- "5-8" string representation
+        content_hash TEXT,      -- sha1 of the content columns (incremental sync)
         FOREIGN KEY (document_id) REFERENCES documents (id)
     )
     ''')
@@ -60,103 +176,336 @@ def init_db():
         bbox TEXT,              -- JSON string "[x1, y1, x2, y2]"
         image_path TEXT,
         markdown_content TEXT,  -- LLM parsed markdown for tables
+        content_hash TEXT,      -- sha1 of the content columns (incremental sync)
         FOREIGN KEY (section_id) REFERENCES sections (id)
     )
     ''')
     
-    conn.commit()
+    # 4. Table Rows / Cells (parsed from attachments.markdown_content)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'table_cells'")
+    cells_is_new = cursor.fetchone() is None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS table_rows (
+        id INTEGER PRIMARY KEY,
+        attachment_id INTEGER NOT NULL,
+        row_index INTEGER NOT NULL,  -- 0-based data row (markdown header excluded)
+        row_text TEXT,               -- cells joined with " | "
+        FOREIGN KEY (attachment_id) REFERENCES attachments (id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS table_cells (
+        row_id INTEGER NOT NULL,
+        col_index INTEGER NOT NULL,
+        header TEXT,            -- column header ("Bit 7" for bit-layout tables)
+        text TEXT,              -- cell text without markdown formatting
+        hex_value TEXT,         -- normalized hex ("0x00C0" / "C0h" -> "c0")
+        byte_start INTEGER,     -- Byte/Offset columns: "511:508" -> 508, 511
+        byte_end INTEGER,
+        PRIMARY KEY (row_id, col_index),
+        FOREIGN KEY (row_id) REFERENCES table_rows (id)
+    ) WITHOUT ROWID
+    ''')
+    # Removing (or re-parsing) a table drops its cells; inserts are done in Python
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS attachments_cells_ad AFTER DELETE ON attachments BEGIN
+        DELETE FROM table_cells WHERE row_id IN (SELECT id FROM table_rows WHERE attachment_id = old.id);
+        DELETE FROM table_rows WHERE attachment_id = old.id;
+    END''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS attachments_cells_au AFTER UPDATE OF markdown_content ON attachments BEGIN
+        DELETE FROM table_cells WHERE row_id IN (SELECT id FROM table_rows WHERE attachment_id = old.id);
+        DELETE FROM table_rows WHERE attachment_id = old.id;
+    END''')
+    
+    _add_missing_columns(cursor)
+    for name in OBSOLETE_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    for ddl in INDEXES.values():
+        cursor.execute(ddl)
+    
+    _create_fts(cursor)
+    
+    if cells_is_new:
+        # Existing databases: parse tables loaded before table_cells was added
+        cursor.execute("SELECT id, markdown_content FROM attachments WHERE type = 'table'")
+        _insert_table_cells(cursor, cursor.fetchall())
+    
+    cursor.execute("COMMIT")
     return conn
 
-def migrate_data():
-    """Migrate JSON data to SQLite."""
-    conn = init_db()
-    cursor = conn.cursor()
+
+def _next_id(cursor, table):
+    """
+    Next id to assign explicitly (batched inserts need ids before the rows exist).
+    
+    AUTOINCREMENT tables continue from sqlite_sequence, so ids of deleted rows are never
+    reused (embedding_chunks.ref_id and other external references stay unambiguous).
+    Explicit ids above the sequence advance sqlite_sequence on insert.
+    """
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+    row = cursor.fetchone()
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+    return max(row[0] if row else 0, cursor.fetchone()[0]) + 1
+
+
+def _insert_table_cells(cursor, tables):
+    """
+    Parse table markdown into table_rows / table_cells.
     
-    # 1. Register Document
-    cursor.execute("INSERT OR IGNORE INTO documents (name, description) VALUES (?, ?)", 
-                   (DOC_NAME, "TCG Storage Security Subsystem Class: Opal"))
-    cursor.execute("SELECT id FROM documents WHERE name = ?", (DOC_NAME,))
-    doc_id = cursor.fetchone()[0]
+    Args:
+        tables: [(attachment_id, markdown), ...] (existing cells must already be gone)
     
-    # Clear existing data for this document to avoid duplicates during re-runs
-    cursor.execute("DELETE FROM attachments WHERE section_id IN (SELECT id FROM sections WHERE document_id = ?)", (doc_id,))
-    cursor.execute("DELETE FROM sections WHERE document_id = ?", (doc_id,))
-    conn.commit()
+    Returns:
+        (row count, cell count)
+    """
+    # table_rows ids are only referenced by their own cells (deleted together)
+    next_row_id = _next_id(cursor, "table_rows")
+    row_values = []
+    cell_values = []
+    for attachment_id, markdown in tables:
+        for row_index, (row_text, cells) in enumerate(parse_table_cells(markdown)):
+            row_values.append((next_row_id, attachment_id, row_index, row_text))
+            cell_values.extend((next_row_id, c["col_index"], c["header"], c["text"], c["hex_value"],
+                                c["byte_start"], c["byte_end"]) for c in cells)
+            next_row_id += 1
+    cursor.executemany("INSERT INTO table_rows (id, attachment_id, row_index, row_text) VALUES (?, ?, ?, ?)",
+                       row_values)
+    cursor.executemany('''
+    INSERT INTO table_cells (row_id, col_index, header, text, hex_value, byte_start, byte_end)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', cell_values)
+    return len(row_values), len(cell_values)
+
+
+def document_metadata():
+    """Source PDF metadata for the documents table (None for fields that cannot be read)"""
+    meta = {"pdf_path": PDF_PATH, "pdf_hash": None, "page_count": None, "parsed_at": None}
+    if os.path.exists(PDF_PATH):
+        h = hashlib.sha256()
+        with open(PDF_PATH, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        meta["pdf_hash"] = h.hexdigest()
+        try:
+            import fitz
+            with fitz.open(PDF_PATH) as doc:
+                meta["page_count"] = doc.page_count
+        except Exception as e:
+            logger.warning(f"Could not read page count from {PDF_PATH}: {e}")
+    else:
+        logger.warning(f"PDF not found, document metadata left empty: {PDF_PATH}")
     
-    logger.info(f"Migrating data for Document ID: {doc_id} ({DOC_NAME})...")
+    index_path = Path(SECTION_DATA_DIR) / "section_index.json"
+    if index_path.exists():
+        meta["parsed_at"] = datetime.fromtimestamp(index_path.stat().st_mtime).isoformat(timespec="seconds")
+    return meta
+
+
+def _db_size(path: str) -> int:
+    """DB + WAL file size (bytes)"""
+    return sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+
+
+SQL_INSERT_SECTION = '''
+INSERT INTO sections (id, document_id, section_index, section_pid, title, level, start_page, end_page, text_content, page_range, content_hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_UPDATE_SECTION = '''
+UPDATE sections SET title = ?, level = ?, start_page = ?, end_page = ?, text_content = ?, page_range = ?, content_hash = ?
+WHERE id = ?
+'''
+SQL_INSERT_ATTACHMENT = '''
+INSERT INTO attachments (id, section_id, type, unique_id, title, page_num, bbox, image_path, markdown_content, content_hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_UPDATE_ATTACHMENT = '''
+UPDATE attachments SET title = ?, page_num = ?, bbox = ?, image_path = ?, markdown_content = ?, content_hash = ?
+WHERE id = ?
+'''
+
+
+def _flush(cursor, pending):
+    """Apply buffered row changes with executemany (pending: {statement: [rows]})"""
+    for sql, rows in pending.items():
+        if rows:
+            cursor.executemany(sql, rows)
+            rows.clear()
+
+
+def _attachment_rows(data):
+    """(type, unique_id, content values) for the tables and figures of a section JSON"""
+    content = data.get('content', {})
+    items = [('table', t, t.get('table_id', t.get('id')), t.get('markdown', t.get('table_md')))  # Fallback to 'id' / table_md
+             for t in content.get('tables', [])]
+    items += [('figure', f, f.get('figure_id', f.get('id')), f.get('description'))
+              for f in content.get('figures', [])]
     
-    # 2. Iterate over JSON files
-    json_files = sorted(Path(SECTION_DATA_DIR).glob("*.json"))
+    rows = []
+    seen = set()
+    for idx, (kind, item, unique_id, body) in enumerate(items):
+        unique_id = unique_id or f"{kind}_{item['page']}_{idx}"
+        # Natural key must be unique within the section
+        key, n = unique_id, 2
+        while (kind, key) in seen:
+            key, n = f"{unique_id}#{n}", n + 1
+        seen.add((kind, key))
+        rows.append((kind, key, (
+            item.get('title'),
+            item['page'],
+            json.dumps(item['bbox']),
+            item.get('image_path'),  # Handle missing image_path
+            body,
+        )))
+    return rows
+
+
+def migrate_data():
+    """
+    Sync JSON data into SQLite incrementally.
     
+    Rows are matched by natural key (document + section_pid + section_index for
+    sections, section + type + unique_id for attachments) and compared by content
+    hash: unchanged rows are not touched, changed rows are updated in place (row ids
+    stay stable and the FTS triggers re-index only those rows), new rows are inserted
+    and rows that vanished from the JSON are deleted. Everything runs in one transaction.
+    """
+    start_time = time.time()
+    conn = init_db()
+    cursor = conn.cursor()
+    meta = document_metadata()
+    
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
     count_sections = 0
     count_attachments = 0
     
-    for json_file in json_files:
-        if json_file.name == "section_index.json":
-            continue
-            
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        # [Fix] Access fields directly from root, not data['section']
-        # Structure: {"section_index": ..., "content": {"text": ...}, "pages": {"start": ...}}
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        # 1. Register Document
+        cursor.execute("INSERT OR IGNORE INTO documents (name, description) VALUES (?, ?)", 
+                       (DOC_NAME, Path(PDF_PATH).stem))
+        cursor.execute("SELECT id FROM documents WHERE name = ?", (DOC_NAME,))
+        doc_id = cursor.fetchone()[0]
+        cursor.execute('''
+        UPDATE documents SET pdf_path = ?, pdf_hash = COALESCE(?, pdf_hash), page_count = COALESCE(?, page_count),
+               parsed_at = COALESCE(?, parsed_at), synced_at = ?
+        WHERE id = ?
+        ''', (meta["pdf_path"], meta["pdf_hash"], meta["page_count"], meta["parsed_at"],
+              datetime.now().isoformat(timespec="seconds"), doc_id))
+        
+        logger.info(f"Syncing data for Document ID: {doc_id} ({DOC_NAME})...")
         
+        # Existing rows of this document by natural key
+        cursor.execute("SELECT id, section_pid, section_index, content_hash FROM sections WHERE document_id = ?", (doc_id,))
+        old_sections = {(pid, idx): (row_id, digest) for row_id, pid, idx, digest in cursor.fetchall()}
         cursor.execute('''
-        INSERT INTO sections (document_id, section_index, section_pid, title, level, start_page, end_page, text_content, page_range)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            doc_id,
-            data['section_index'],
-            data['section_id'],
-            data['title'],
-            data['level'],
-            data['pages']['start'],
-            data['pages']['end'],
-            data['content']['text'],
-            f"{data['pages']['start']}-{data['pages']['end']}"
-        ))
+        SELECT a.id, a.section_id, a.type, a.unique_id, a.content_hash
+        FROM attachments a JOIN sections s ON s.id = a.section_id
+        WHERE s.document_id = ?
+        ''', (doc_id,))
+        old_attachments = {(sid, kind, uid): (row_id, digest) for row_id, sid, kind, uid, digest in cursor.fetchall()}
+        
+        # New ids are assigned here so attachments (and table cells) can reference them in the same batch
+        next_section_id = _next_id(cursor, "sections")
+        next_attachment_id = _next_id(cursor, "attachments")
+        changed_tables = []  # (attachment_id, markdown) to (re)parse into table_cells
+        
+        pending = {sql: [] for sql in (SQL_INSERT_SECTION, SQL_UPDATE_SECTION,
+                                       SQL_INSERT_ATTACHMENT, SQL_UPDATE_ATTACHMENT)}
         
-        section_db_id = cursor.lastrowid
-        count_sections += 1
+        # 2. Iterate over JSON files
+        json_files = sorted(Path(SECTION_DATA_DIR).glob("*.json"))
         
-        # Insert Tables
-        for table in data.get('content', {}).get('tables', []):
-            cursor.execute('''
-            INSERT INTO attachments (section_id, type, unique_id, title, page_num, bbox, image_path, markdown_content)
-            VALUES (?, 'table', ?, ?, ?, ?, ?, ?)
-            ''', (
-                section_db_id,
-                table.get('table_id', table.get('id')),  # Fallback to 'id'
-                table.get('title'),
-                table['page'],
-                json.dumps(table['bbox']),
-                table.get('image_path'),                 # Handle missing image_path
-                table.get('markdown', table.get('table_md')) # Fallback to table_md
-            ))
-            count_attachments += 1
+        for json_file in json_files:
+            if json_file.name == "section_index.json":
+                continue
+                
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                
+            # [Fix] Access fields directly from root, not data['section']
+            # Structure: {"section_index": ..., "content": {"text": ...}, "pages": {"start": ...}}
             
-        # Insert Figures
-        for figure in data.get('content', {}).get('figures', []):
-            cursor.execute('''
-            INSERT INTO attachments (section_id, type, unique_id, title, page_num, bbox, image_path, markdown_content)
-            VALUES (?, 'figure', ?, ?, ?, ?, ?, ?)
-            ''', (
-                section_db_id,
-                figure.get('figure_id', figure.get('id')), # Fallback to 'id'
-                figure.get('title'),
-                figure['page'],
-                json.dumps(figure['bbox']),
-                figure.get('image_path'),                  # Handle missing image_path
-                figure.get('description')
-            ))
-            count_attachments += 1
-
-    conn.commit()
+            values = (
+                data['title'],
+                data['level'],
+                data['pages']['start'],
+                data['pages']['end'],
+                data['content']['text'],
+                f"{data['pages']['start']}-{data['pages']['end']}"
+            )
+            digest = _content_hash(values)
+            existing = old_sections.pop((data['section_id'], data['section_index']), None)
+            if existing is None:
+                section_db_id = next_section_id
+                next_section_id += 1
+                pending[SQL_INSERT_SECTION].append(
+                    (section_db_id, doc_id, data['section_index'], data['section_id']) + values + (digest,))
+                stats["inserted"] += 1
+            else:
+                section_db_id = existing[0]
+                if existing[1] != digest:
+                    pending[SQL_UPDATE_SECTION].append(values + (digest, section_db_id))
+                    stats["updated"] += 1
+                else:
+                    stats["unchanged"] += 1
+            count_sections += 1
+            
+            # Tables and Figures
+            for kind, unique_id, att_values in _attachment_rows(data):
+                att_digest = _content_hash(att_values)
+                existing = old_attachments.pop((section_db_id, kind, unique_id), None)
+                if existing is None:
+                    attachment_db_id = next_attachment_id
+                    next_attachment_id += 1
+                    pending[SQL_INSERT_ATTACHMENT].append(
+                        (attachment_db_id, section_db_id, kind, unique_id) + att_values + (att_digest,))
+                    stats["inserted"] += 1
+                elif existing[1] != att_digest:
+                    attachment_db_id = existing[0]
+                    pending[SQL_UPDATE_ATTACHMENT].append(att_values + (att_digest, attachment_db_id))
+                    stats["updated"] += 1
+                else:
+                    stats["unchanged"] += 1
+                    attachment_db_id = None
+                if kind == 'table' and attachment_db_id is not None:
+                    changed_tables.append((attachment_db_id, att_values[-1]))
+                count_attachments += 1
+            
+            if sum(len(rows) for rows in pending.values()) >= BATCH_SIZE:
+                _flush(cursor, pending)
+        
+        _flush(cursor, pending)
+        
+        # 3. Delete rows that vanished from the JSON (attachments before their sections)
+        vanished_attachments = [(row_id,) for row_id, _ in old_attachments.values()]
+        vanished_sections = [(row_id,) for row_id, _ in old_sections.values()]
+        cursor.executemany("DELETE FROM attachments WHERE id = ?", vanished_attachments)
+        cursor.executemany("DELETE FROM attachments WHERE section_id = ?", vanished_sections)
+        cursor.executemany("DELETE FROM sections WHERE id = ?", vanished_sections)
+        stats["deleted"] = len(vanished_attachments) + len(vanished_sections)
+        
+        # 4. Table cells for inserted / changed tables (old cells removed by the triggers)
+        cell_rows, cell_count = _insert_table_cells(cursor, changed_tables)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        conn.close()
+        raise
+    
+    # Copy committed pages back into the main file without waiting for other writers
+    cursor.execute("PRAGMA wal_checkpoint(PASSIVE)")
     conn.close()
+    elapsed = time.time() - start_time
+    
     logger.info(f"Migration Complete!")
     logger.info(f"  - Sections: {count_sections}")
     logger.info(f"  - Attachments: {count_attachments}")
-    logger.info(f"  - Database: {DB_PATH}")
+    logger.info(f"  - Rows: {stats['inserted']} inserted, {stats['updated']} updated, "
+                f"{stats['unchanged']} unchanged, {stats['deleted']} deleted")
+    logger.info(f"  - Table cells: {len(changed_tables)} tables parsed ({cell_rows} rows, {cell_count} cells)")
+    logger.info(f"  - Time: {elapsed:.2f}s")
+    logger.info(f"  - Database: {DB_PATH} ({_db_size(DB_PATH) / 1024:.0f} KB)")
 
 if __name__ == "__main__":
     migrate_data()
@@ -0,0 +1,44 @@
+"""
+Step6b: library DB embedding (vector) 인덱스 갱신
+
+step6 이후 실행. 내용이 바뀐 섹션/테이블만 EMBED_MODEL 로 다시 embedding 하여
+library DB 옆 float32 memmap 파일에 기록 (lib_vector_index.VectorIndex)
+
+사용법:
+    python step6b_vector_index.py                      # 증분 갱신
+    python step6b_vector_index.py --query "erase all user data"   # 갱신 후 검색 확인
+"""
+
+import argparse
+import logging
+
+from common_parameter import OUTPUT_DIR, LIBRARY_DB_PATH, EMBED_MODEL
+from lib_vector_index import VectorIndex
+from logger import setup_advanced_logger
+
+logger = setup_advanced_logger(name="step6b_vector_index", log_dir=OUTPUT_DIR, log_level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the library vector index")
+    parser.add_argument("--query", default=None, help="갱신 후 검색 확인용 질의")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    index = VectorIndex(LIBRARY_DB_PATH)
+    logger.info(f"Updating vector index: {index.vector_path} (model {EMBED_MODEL})")
+    stats = index.update()
+    logger.info("Vector index updated!")
+    logger.info(f"  - Embedded: {stats['embedded_rows']} rows ({stats['chunks']} chunks) in {stats['embed_seconds']}s")
+    logger.info(f"  - Removed: {stats['removed_rows']} rows")
+    logger.info(f"  - Total chunks: {stats['total_chunks']}")
+
+    if args.query:
+        for hit in index.search(args.query, k=args.k):
+            logger.info(f"  [{hit['kind']}] {hit['score']:.3f} {hit['document']} {hit['section_pid'] or '-'} {hit['title']}")
+        logger.info(f"  - Query time: {index.last_query_ms:.2f} ms (vector search only)")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
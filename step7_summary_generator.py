@@ -2,16 +2,20 @@ import os
 import json
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from tqdm import tqdm
-from common_parameter import OUTPUT_DIR
+from common_parameter import OUTPUT_DIR, SUMMARY_MODEL, LLM_DYNAMIC_CONTEXT
 from logger import setup_advanced_logger
+from lib_llm_client import get_backend
+from lib_token_estimator import token_estimator
 
 logger = setup_advanced_logger(name="step7_summary_generator", log_dir=OUTPUT_DIR, log_level=logging.INFO)
 
 # Configuration
 MERGE_DEPTH_THRESHOLD = 2  # Depth > 2 (e.g. 1.1.1) will be merged into parent (1.1)
-SUMMARY_MODEL = "qwen3-vl:32b-instruct-q4_K_M" # Or user configured
+SUMMARY_NUM_CTX = 16000  # Context size (lower bound when LLM_DYNAMIC_CONTEXT)
+SUMMARY_MAX_OUTPUT = 2048  # Tokens reserved for the summary
 
 class SummaryGenerator:
     def __init__(self):
@@ -19,6 +23,7 @@ class SummaryGenerator:
         self.out_dir = Path(OUTPUT_DIR) / "summary_html" / "data"
         self.out_dir.mkdir(parents=True, exist_ok=True)
         self.sections = []
+        self.backend = get_backend()
 
     def load_sections(self):
         """Load all markdown files and parse section info"""
@@ -108,68 +113,65 @@ class SummaryGenerator:
             
         return summary_units
 
-    def generate_summaries(self, summary_units):
-        """Generate LLM summary for each unit"""
-        results = []
-        
-        print(f"Generating summaries for {len(summary_units)} units...")
+    def summarize_unit(self, unit):
+        """Generate LLM summary for one unit"""
+        target = unit['target_section']
+        full_text = unit['full_text']
         
-        for unit in tqdm(summary_units):
-            target = unit['target_section']
-            full_text = unit['full_text']
-            
-            # Skip if text is too short
-            if len(full_text.strip()) < 50:
-                summary = "Content is too short to summarize."
+        # Skip if text is too short
+        if len(full_text.strip()) < 50:
+            summary = "Content is too short to summarize."
+        else:
+            # LLM Call
+            instructions = (
+                f"You are a technical writer summarizing a specification document.\n"
+                f"Summarize the following content (Section {target['id']} {target['title']} and its subsections).\n"
+                f"Keep it concise, focusing on key requirements, definitions, and architectural details.\n"
+                f"Do NOT lose important numerical values or table data.\n"
+                f"Output in Markdown format.\n\n"
+            )
+            options = {"num_ctx": SUMMARY_NUM_CTX}
+            plan = None
+            if LLM_DYNAMIC_CONTEXT:
+                # Fit the content into the context by estimated tokens instead of a fixed character cut
+                budget = SUMMARY_NUM_CTX - SUMMARY_MAX_OUTPUT - token_estimator.text_tokens(instructions) - 64
+                content = token_estimator.fit_text(full_text, budget)
+                prompt = instructions + f"Content:\n{content}" + ("..." if len(content) < len(full_text) else "")
+                plan = token_estimator.plan(prompt, expected_output=SUMMARY_MAX_OUTPUT,
+                                            max_output=SUMMARY_MAX_OUTPUT, min_ctx=SUMMARY_NUM_CTX)
+                options.update(num_ctx=plan["num_ctx"], num_predict=plan["num_predict"])
             else:
-                # LLM Call
-                prompt = (
-                    f"You are a technical writer summarizing a specification document.\n"
-                    f"Summarize the following content (Section {target['id']} {target['title']} and its subsections).\n"
-                    f"Keep it concise, focusing on key requirements, definitions, and architectural details.\n"
-                    f"Do NOT lose important numerical values or table data.\n"
-                    f"Output in Markdown format.\n\n"
-                    f"Content:\n{full_text[:15000]}..." # Limit context size roughly
-                )
+                prompt = instructions + f"Content:\n{full_text[:15000]}..." # Limit context size roughly
+            
+            try:
+                # Backend from LLM_BACKEND (Ollama /api/generate or OpenAI-compatible chat/completions)
+                result = self.backend.generate(SUMMARY_MODEL, prompt, options=options, timeout=300)
+                if plan:
+                    token_estimator.record(plan, result['prompt_tokens'])
+                summary = result['text']
                 
-                try:
-                    # Using the sync _call_api from step1 logic style or just use LLMClient default
-                    # LLMClient in lib_llm_client usually has chat method
-                    # Let's assume simple completion/chat interface
-                    # Adjust this call based on lib_llm_client.py implementation details we saw earlier or standard Ollama
-                    
-                    # Temporarily use requests directly if lib_llm_client isn't perfectly suited or check lib first
-                    # For now, let's try a direct call similar to Qwen test
-                    import requests
-                    url = "http://localhost:11434/api/generate"
-                    payload = {
-                        "model": "qwen2.5:32b", # Default summary model, adjust if needed
-                        "prompt": prompt,
-                        "stream": False,
-                         "options": {"num_ctx": 16000}
-                    }
-                    # Fallback model check?
-                    # Let's use a very basic one or what's available. 
-                    # User mentioned qwen3-vl:8b/32b... maybe qwen2.5-coder or llama3.1?
-                    # Let's assume 'llama3.1' or 'qwen2.5' is available for text summary. 
-                    # If not, use 'qwen3-vl:32b-instruct-q4_K_M' (it can do text too).
-                    payload['model'] = "qwen3-vl:32b-instruct-q4_K_M" 
-                    
-                    resp = requests.post(url, json=payload, timeout=300)
-                    summary = resp.json()['response']
-                    
-                except Exception as e:
-                    logger.error(f"Summary failed for {target['id']}: {e}")
-                    summary = "Summary generation failed."
+            except Exception as e:
+                logger.error(f"Summary failed for {target['id']}: {e}")
+                summary = "Summary generation failed."
 
-            results.append({
-                "id": target['id'],
-                "title": target['title'],
-                "depth": target['depth'],
-                "summary": summary,
-                "original_md_file": target['filename'],
-                "sub_sections": [sub['id'] for sub in unit['sub_sections']]
-            })
+        return {
+            "id": target['id'],
+            "title": target['title'],
+            "depth": target['depth'],
+            "summary": summary,
+            "original_md_file": target['filename'],
+            "sub_sections": [sub['id'] for sub in unit['sub_sections']]
+        }
+
+    def generate_summaries(self, summary_units):
+        """Generate LLM summary for each unit (concurrently on batching servers)"""
+        # Ollama serializes requests per model, so keep it sequential there
+        workers = self.backend.max_concurrency if self.backend.name != "ollama" else 1
+        
+        print(f"Generating summaries for {len(summary_units)} units ({self.backend.name}, workers={workers})...")
+        
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = list(tqdm(executor.map(self.summarize_unit, summary_units), total=len(summary_units)))
             
         return results
 
@@ -185,6 +187,7 @@ class SummaryGenerator:
         units = self.organize_hierarchy_and_merge()
         summaries = self.generate_summaries(units)
         self.save_results(summaries)
+        logger.info(token_estimator.report())
 
 if __name__ == "__main__":
     gen = SummaryGenerator()